@@ -1,10 +1,20 @@
 import streamlit as st
 
 import pandas as pd
-from PIL import Image
 
 
-from bonds import display_fixed_rate_trade_form  # Your custom bond form function
+from bonds import INTERPOLATION_LABELS, display_fixed_rate_trade_form, display_job  # Your custom bond form function
+from app_cache import (
+    job_runner, load_bond_emissions, load_bond_universe, load_csv, load_image, load_trade_blotter,
+    load_yield_curve_store, valuation_cache,
+)
+from curves import INTERPOLATION_METHODS
+from instrumentation import METRICS, configure_logging
+from liquidity import BUCKET_SIZES, liquidity_ladder
+from schedules import SCHEDULE_CACHE
+from universe import MATURED, MATURITY_BUCKETS, PAGE_SIZE
+
+configure_logging()
 
 bond_emissions_file = "bond_emissions.csv"
 # Initialize session state variables
@@ -20,10 +30,10 @@ if "show_bond_emissions" not in st.session_state:
 # Set page configuration
 st.set_page_config(page_title="Treasury Management", layout="wide")
 
-# Load CSV files into Pandas DataFrames
-currencies_df = pd.read_csv("currencies.csv")  # Make sure this file exists
-yield_curves_df = pd.read_csv("yieldCurves.csv")  # Make sure this file exists
-bond_emissions_df = pd.read_csv("bond_emissions.csv")  # Load bond emissions data
+# Load CSV files into Pandas DataFrames (cached across reruns until the files change)
+currencies_df = load_csv("currencies.csv")  # Make sure this file exists
+bond_emissions_df = load_bond_emissions("bond_emissions.csv")  # Load bond emissions data
+yield_curve_store = load_yield_curve_store("yieldCurves.csv")  # Curves indexed by (currency, observation_date)
 
 # CSS for styling buttons and centering the image
 st.markdown(
@@ -67,7 +77,7 @@ st.markdown(
 )
 
 # Display logo
-img = Image.open("logo.PNG")  # Ensure this image exists and is in the correct path
+img = load_image("logo.PNG")  # Ensure this image exists and is in the correct path
 st.markdown('<div class="image-container">', unsafe_allow_html=True)
 st.image(img, width=100)  # Adjust image size if needed
 st.markdown('</div>', unsafe_allow_html=True)
@@ -79,7 +89,7 @@ if st.session_state.get("active_pane") is None:
 # Navigation Buttons
 nav_buttons = st.container()
 with nav_buttons:
-    col1, col2 = st.columns([1, 1])
+    col1, col2, col3, col4 = st.columns([1, 1, 1, 1])
     with col1:
         st.button(
             "Settings",  # Static button text
@@ -94,6 +104,20 @@ with nav_buttons:
             use_container_width=True,
             on_click=lambda: st.session_state.update({"active_pane": "Trade"})
         )
+    with col3:
+        st.button(
+            "Portfolio",
+            key="portfolio",
+            use_container_width=True,
+            on_click=lambda: st.session_state.update({"active_pane": "Portfolio"})
+        )
+    with col4:
+        st.button(
+            "Liquidity",
+            key="liquidity",
+            use_container_width=True,
+            on_click=lambda: st.session_state.update({"active_pane": "Liquidity"})
+        )
 
 # Function to display content for the Settings pane
 def display_settings():
@@ -136,12 +160,11 @@ def display_settings():
             selected_currency_code = currencies_df.loc[
                 currencies_df["currency_name"] == selected_currency, "currency_code"
             ].iloc[0]
-            filtered_curves = yield_curves_df[yield_curves_df["currency"] == selected_currency_code]
-            available_dates = filtered_curves["observation_date"].unique()
+            available_dates = [str(date) for date in yield_curve_store.observation_dates(selected_currency_code)]
             selected_date = st.selectbox("Select Date", available_dates)
             if selected_date:
-                curve_data = filtered_curves[filtered_curves["observation_date"] == selected_date]
-                if not curve_data.empty:
+                if (selected_currency_code, selected_date) in yield_curve_store:
+                    curve_data = yield_curve_store.curve_frame(selected_currency_code, selected_date)
                     transposed_curve_data = curve_data.pivot(
                         index="observation_date", columns="tenor", values="rate"
                     )
@@ -161,7 +184,7 @@ def display_settings():
         st.write("**Bond Emissions:**")
         bond_emissions_file = "bond_emissions.csv"
         try:
-            bond_emissions_df = pd.read_csv(bond_emissions_file)
+            bond_emissions_df = load_bond_emissions(bond_emissions_file)
             st.write("**Bond Emissions Data:**")
             st.dataframe(bond_emissions_df)
         except FileNotFoundError:
@@ -170,32 +193,175 @@ def display_settings():
 # Function to display content for the Trade pane
 def display_trade():
     try:
-        # Filter bonds based on the criteria (Fixed and Nominal Frequency 'At Maturity')
-        fixed_bonds = bond_emissions_df[
-            bond_emissions_df['Reference Rate Code'].isna() 
-        ]
-        
-        # Create a list of bond names (e.g., "Corporate Bond 1", "Gov Bond 2")
-        bond_options = [
-            f"{row['Issue Name']} ({row['ISIN']})" for _, row in fixed_bonds.iterrows()
-        ]
-        
-        # Allow the user to select a bond
-        selected_bond_display = st.selectbox(
-            "Select Bond",
-            bond_options
+        # Indexed once per bond file; maturity buckets are measured from the latest curve date
+        latest_curve_dates = yield_curve_store.observation_dates()[-1:]
+        universe = load_bond_universe(bond_emissions_file, latest_curve_dates[0] if len(latest_curve_dates) else None)
+        if universe.rejected:
+            examples = ", ".join(f"{isin} ({problem})" for isin, problem in list(universe.rejected.items())[:3])
+            st.warning(f"{len(universe.rejected)} bond(s) left out for invalid reference data, e.g. {examples}")
+
+        # Search and filters
+        query = st.text_input("Search Bonds (ISIN, name or issuer)", key="bond_search")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            currency = st.selectbox("Currency", ["All"] + universe.currencies(), key="bond_currency_filter")
+        with col2:
+            issuer = st.selectbox("Issuer", ["All"] + universe.issuers(), key="bond_issuer_filter")
+        with col3:
+            maturity_bucket = st.selectbox(
+                "Remaining Maturity",
+                ["All"] + [name for _, name in MATURITY_BUCKETS] + [MATURED],
+                key="bond_maturity_filter",
+            )
+        with col4:
+            rate_type = st.selectbox("Rate Type", ["All", "Fixed", "Floating"], key="bond_rate_type_filter")
+        matches = universe.search(
+            query,
+            currency=None if currency == "All" else currency,
+            issuer=None if issuer == "All" else issuer,
+            maturity_bucket=None if maturity_bucket == "All" else maturity_bucket,
+            rate_type=None if rate_type == "All" else rate_type,
         )
-        selected_bond_index = bond_options.index(selected_bond_display)
-        selected_bond = fixed_bonds.iloc[selected_bond_index]
+        if len(matches) == 0:
+            st.info("No bonds match the search.")
+            return
+
+        # Only one page of results is sent to the browser
+        page_count = (len(matches) - 1) // PAGE_SIZE + 1
+        page_number = st.number_input(
+            f"Page (of {page_count}, {len(matches)} bonds)", min_value=1, max_value=page_count, value=1, step=1,
+            key="bond_page",
+        ) if page_count > 1 else 1
+        page_isins = list(universe.page(matches, page_number))
+
+        # Allow the user to select a bond; the selection is looked up by ISIN
+        selected_isin = st.selectbox("Select Bond", page_isins, format_func=universe.label)
+        selected_bond = universe.bond(selected_isin)
 
         # Pass the selected bond to the trade form
-        display_fixed_rate_trade_form(selected_bond, yield_curves_df)  # Pass selected bond
+        display_fixed_rate_trade_form(selected_bond, yield_curve_store)  # Pass selected bond
 
     except FileNotFoundError:
         st.warning(f"Bond emissions file `{bond_emissions_file}` not found. Please upload or check the file path.")
 
+# Function to display content for the Portfolio pane
+def display_portfolio():
+    st.header("Portfolio")
+    blotter = load_trade_blotter()
+    if len(blotter) == 0:
+        st.info("No trades booked yet. Book trades from the Trade pane.")
+        return
+
+    curve_dates = [str(date) for date in yield_curve_store.observation_dates()]
+    col1, col2 = st.columns(2)
+    with col1:
+        valuation_date = st.selectbox("Valuation Date", curve_dates[::-1], key="portfolio_date")
+    with col2:
+        interpolation = st.selectbox(
+            "Curve Interpolation",
+            INTERPOLATION_METHODS,
+            format_func=lambda method: INTERPOLATION_LABELS[method],
+            key="portfolio_interpolation",
+        )
+
+    # Only positions whose curve or terms changed since the stored valuation are repriced
+    universe = load_bond_universe(bond_emissions_file, curve_dates[-1] if curve_dates else None)
+    positions, stats = blotter.revalue(universe, yield_curve_store, valuation_date, interpolation)
+    st.caption(
+        f"{stats['repriced']} position(s) repriced, {stats['reused']} reused from stored valuations"
+        + (f", {stats['unpriced']} without a curve or bond data" if stats["unpriced"] else "")
+    )
+
+    st.write("**Totals by Currency:**")
+    st.dataframe(positions.groupby("Currency")[["Cost", "Market Value", "Cash Received", "P&L"]].sum())
+    st.write("**Positions:**")
+    st.dataframe(positions, hide_index=True)
+    st.write("**Recent Trades:**")
+    st.dataframe(blotter.trades(limit=200), hide_index=True)
+
+# Function to display content for the Liquidity pane
+def display_liquidity():
+    st.header("Liquidity Ladder")
+    curve_dates = [str(date) for date in yield_curve_store.observation_dates()]
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        source = st.selectbox("Positions", ["Booked trades", "Bond inventory (one piece each)"], key="liquidity_source")
+    with col2:
+        as_of = st.selectbox("As of", curve_dates[::-1], key="liquidity_date")
+    with col3:
+        granularity = st.selectbox("Buckets", list(BUCKET_SIZES), index=1, key="liquidity_buckets")
+    with col4:
+        count = st.number_input(
+            "Number of Buckets", min_value=1, max_value=600, value=BUCKET_SIZES[granularity][1], step=1,
+            key=f"liquidity_count_{granularity}",
+        )
+
+    universe = load_bond_universe(bond_emissions_file, curve_dates[-1] if curve_dates else None)
+    if source == "Booked trades":
+        positions = load_trade_blotter().positions(as_of)
+        positions = positions[positions["ISIN"].isin(universe.isin) & (positions["Net Pieces"] != 0)]
+        if positions.empty:
+            st.info("No open positions on this date. Book trades from the Trade pane.")
+            return
+        bonds = universe.bonds.take([universe.position(isin) for isin in positions["ISIN"]])
+        pieces = positions["Net Pieces"].to_numpy()
+        book = tuple(zip(positions["ISIN"], pieces.tolist()))
+    else:
+        bonds, pieces, book = universe.bonds, 1, ("inventory", id(universe.bonds))
+
+    # Built as a background job; the same inputs reuse the finished ladder on later reruns
+    key = ("liquidity", book, as_of, granularity, int(count), yield_curve_store.version)
+    job_runner().submit(
+        key, liquidity_ladder, bonds, pieces, yield_curve_store, as_of, granularity, int(count),
+        description="Liquidity ladder",
+    )
+    display_job("liquidity", key, display_liquidity_report)
+
+def display_liquidity_report(result):
+    ladder, unprojected = result
+    report = ladder.to_frame()
+    if report.empty:
+        st.info("No cash flows after the selected date.")
+        return
+    if unprojected:
+        st.warning(f"{len(unprojected)} floating rate note(s) left out: no curve of their currency on this date.")
+    st.write("**Net Gap by Bucket:**")
+    st.bar_chart(report.pivot(index="Bucket", columns="Currency", values="Net Gap"))
+    st.write("**Cumulative Gap:**")
+    st.line_chart(report.pivot(index="Bucket", columns="Currency", values="Cumulative Gap"))
+    st.write("**Gap Report:**")
+    st.dataframe(report, hide_index=True)
+
+# Function to display the optional performance panel in the sidebar
+def display_performance_panel():
+    st.sidebar.write("**Stage Timings** (all sessions of this server)")
+    snapshot = METRICS.snapshot()
+    timings = pd.DataFrame.from_dict(snapshot["timings"], orient="index")
+    if timings.empty:
+        st.sidebar.info("Nothing has been timed yet.")
+    else:
+        timings = timings.rename(columns={
+            "calls": "Calls", "total_seconds": "Total (s)", "mean_seconds": "Mean (s)", "max_seconds": "Max (s)",
+        })
+        st.sidebar.dataframe(timings[["Calls", "Total (s)", "Mean (s)", "Max (s)"]])
+    st.sidebar.write("**Counters**")
+    st.sidebar.dataframe(pd.Series(snapshot["counters"], name="Count", dtype="int64"))
+    st.sidebar.write("**Caches**")
+    st.sidebar.dataframe(pd.DataFrame({
+        "Valuations": valuation_cache().stats(),
+        "Schedules": SCHEDULE_CACHE.stats(),
+    }))
+    st.sidebar.button("Reset Timings", key="reset_metrics", on_click=METRICS.reset)
+
+if st.sidebar.checkbox("Show performance panel", value=False, key="show_performance"):
+    display_performance_panel()
+
 # Determine which pane to display based on the active pane state
 if st.session_state["active_pane"] == "Settings":
     display_settings()
 elif st.session_state["active_pane"] == "Trade":
     display_trade()
+elif st.session_state["active_pane"] == "Portfolio":
+    display_portfolio()
+elif st.session_state["active_pane"] == "Liquidity":
+    display_liquidity()
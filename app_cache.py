@@ -0,0 +1,121 @@
+import os
+
+import streamlit as st
+import pandas as pd
+from PIL import Image
+from blotter import DEFAULT_PATH, TradeBlotter
+from cache import LRUCache
+from curves import YieldCurveStore
+from jobs import JobRunner
+import snapshot
+from universe import BondUniverse
+import storage
+
+
+# Reference data is cached per (path, modification time): editing a file invalidates
+# its entry on the next rerun, and max_entries drops superseded versions.
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def _read_csv(path, modified_time):
+    return pd.read_csv(path)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _yield_curve_store(path, modified_time):
+    return YieldCurveStore(_read_csv(path, modified_time), version=modified_time)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _columnar_curve_store(path, modified_time):
+    return storage.CurveFile(path).store(version=modified_time)
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _columnar_bonds(path, modified_time):
+    return storage.BondFile(path).read()
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _image(path, modified_time):
+    image = Image.open(path)
+    image.load()
+    return image
+
+
+def load_csv(path):
+    """CSV file as a DataFrame, read again only when the file changes. Treat it as read-only."""
+    return _read_csv(path, os.path.getmtime(path))
+
+
+def _columnar_file(path):
+    """Converted counterpart of a CSV file (see storage.py), if pyarrow is there to read it."""
+    columnar_path = storage.columnar_path(path)
+    if storage.available() and os.path.exists(columnar_path):
+        return columnar_path
+    return None
+
+
+def load_yield_curve_store(path):
+    """
+    YieldCurveStore of a yieldCurves.csv file, rebuilt only when the file changes.
+
+    A converted yieldCurves.arrow file is preferred; its curves stay memory mapped.
+    """
+    columnar_path = _columnar_file(path)
+    if columnar_path:
+        return _columnar_curve_store(columnar_path, os.path.getmtime(columnar_path))
+    return _yield_curve_store(path, os.path.getmtime(path))
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _bond_universe(path, modified_time, as_of):
+    return BondUniverse(load_bond_emissions(path), as_of)
+
+
+def load_bond_universe(path, as_of=None):
+    """Searchable BondUniverse of a bond file, rebuilt only when the file (or as_of) changes."""
+    columnar_path = _columnar_file(path)
+    modified_time = os.path.getmtime(columnar_path or path)
+    return _bond_universe(path, modified_time, None if as_of is None else str(as_of))
+
+
+def load_bond_emissions(path):
+    """Bond reference data, from the converted bond_emissions.arrow file when there is one."""
+    columnar_path = _columnar_file(path)
+    if columnar_path:
+        return _columnar_bonds(columnar_path, os.path.getmtime(columnar_path))
+    return load_csv(path)
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _snapshot_store(path, modified_time):
+    return snapshot.SnapshotStore(path)
+
+
+def load_snapshot_store(path=snapshot.DEFAULT_PATH):
+    """End-of-day SnapshotStore (see snapshot.py), reopened when the file is rebuilt; None without a file."""
+    if not os.path.exists(path):
+        return None
+    return _snapshot_store(path, os.path.getmtime(path))
+
+
+def load_image(path):
+    return _image(path, os.path.getmtime(path))
+
+
+@st.cache_resource
+def valuation_cache():
+    """Trade valuation results shared by all sessions, see bonds.value_trade."""
+    return LRUCache(maxsize=1024)
+
+
+@st.cache_resource
+def load_trade_blotter(path=DEFAULT_PATH):
+    """SQLite trade blotter shared by all sessions, see blotter.py."""
+    return TradeBlotter(path)
+
+
+@st.cache_resource
+def job_runner():
+    """Background valuation jobs shared by all sessions, see jobs.py."""
+    return JobRunner(max_workers=2)
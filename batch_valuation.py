@@ -0,0 +1,289 @@
+"""
+Headless end-of-day valuation of a bond inventory.
+
+Example:
+    python batch_valuation.py --bonds bond_emissions.csv --curves yieldCurves.csv \
+        --start 2023-01-01 --end 2023-12-31 --output results.parquet --cash-flows cash_flows.csv
+
+Floating rate notes are valued note by note by FloatingBond in chunks of their own, which
+carry the curve history their past fixings are read from.
+
+With --prices prices.csv (ISIN, Dirty Price per piece or Clean Price in % of nominal, and
+optionally Valuation Date columns), the results also carry the Z-spread of every priced
+bond over its curve. Clean prices get the accrued interest of the valuation date added.
+"""
+import argparse
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+from curves import INTERPOLATION_METHODS, YieldCurveStore
+from portfolio import BondPortfolio
+from pricing import clean_to_dirty
+from valuation import FloatingBond
+from instrumentation import METRICS, configure_logging
+import storage
+
+logger = logging.getLogger(__name__)
+
+
+RESULT_COLUMNS = [
+    "Valuation Date", "ISIN", "Issue Name", "Currency", "NPV", "YTM (%)",
+    "Macaulay Duration", "Modified Duration", "Convexity",
+]
+
+
+def value_chunk(bonds, curves_df, valuation_date, shift=0, include_cash_flows=False, interpolation="linear",
+                prices=None, in_worker=False):
+    """
+    Value one chunk of bonds (a BondTable) for one date; runs in a worker process.
+
+    YTM and durations are solved at the model NPV, since the inventory carries no prices.
+    prices, if given, are dirty prices per piece (NaN where unknown); the Z-spreads of the
+    priced bonds (over the unshifted curve) are solved too. Fixed rate bonds are valued
+    together, floating rate notes one by one.
+    Returns the results, the optional cash flows and, with in_worker (set by the pool
+    submission, whatever the start method), the stage metrics of the chunk.
+    """
+    if in_worker:
+        # Worker processes report the figures of each chunk; the parent merges them
+        METRICS.reset()
+    floating = ~pd.isna(bonds["Reference Rate Code"])
+    outputs = []
+    for rows, value in ((np.flatnonzero(~floating), _value_fixed), (np.flatnonzero(floating), _value_floating)):
+        if len(rows):
+            chunk_prices = None if prices is None else np.asarray(prices, dtype=float)[rows]
+            outputs.append(value(
+                bonds.take(rows), curves_df, valuation_date, shift, include_cash_flows, interpolation, chunk_prices
+            ))
+    results = pd.concat([output[0] for output in outputs], ignore_index=True)
+    cash_flows = pd.concat([output[1] for output in outputs], ignore_index=True) if include_cash_flows else None
+    logger.debug("Valued %d bonds for %s", len(results), valuation_date)
+    return results, cash_flows, METRICS.snapshot() if in_worker else None
+
+
+def _value_fixed(bonds, curves_df, valuation_date, shift, include_cash_flows, interpolation, prices):
+    """Results and cash flows of fixed rate bonds, solved together on one BondPortfolio."""
+    portfolio = BondPortfolio(bonds, curves_df, valuation_date, interpolation=interpolation)
+    npv = portfolio.npv(shift)
+    analytics = portfolio.yield_analytics(npv, shift)
+
+    results = pd.DataFrame({
+        "Valuation Date": valuation_date,
+        "ISIN": portfolio.isin,
+        "Issue Name": bonds["Issue Name"],
+        "Currency": portfolio.currency,
+        "NPV": npv,
+        "YTM (%)": analytics.ytm,
+        "Macaulay Duration": analytics.macaulay_duration,
+        "Modified Duration": analytics.modified_duration,
+        "Convexity": analytics.convexity,
+    })
+    if prices is not None:
+        results["Dirty Price"] = prices
+        results["Z-Spread (%)"] = portfolio.z_spreads(prices).z_spread
+    cash_flows = None
+    if include_cash_flows:
+        cash_flows = portfolio.cash_flow_frame(shift)
+        cash_flows.insert(0, "Valuation Date", valuation_date)
+    return results, cash_flows
+
+
+def _value_floating(bonds, curves_df, valuation_date, shift, include_cash_flows, interpolation, prices):
+    """Results and cash flows of floating rate notes, valued one by one by FloatingBond."""
+    yield_curve_store = YieldCurveStore(curves_df)
+    rows, cash_flows = [], []
+    for position in range(len(bonds)):
+        bond = bonds.row(position)
+        note = FloatingBond(
+            bond, yield_curve_store, valuation_date, bond["Nominal Value Currency"],
+            bond["Principal Payment Frequency"], bond["Coupon Frequency"], interpolation=interpolation,
+        )
+        npv = note.npv(shift)
+        try:
+            analytics = note.yield_analytics(npv, shift)
+            figures = [float(analytics.ytm[0]), float(analytics.macaulay_duration[0]),
+                       float(analytics.modified_duration[0]), float(analytics.convexity[0])]
+        except ValueError:
+            figures = [np.nan] * 4
+        row = [valuation_date, bond["ISIN"], bond["Issue Name"], bond["Nominal Value Currency"], npv, *figures]
+        if prices is not None:
+            try:
+                z_spread = note.z_spread(prices[position]) if np.isfinite(prices[position]) else np.nan
+            except ValueError:
+                z_spread = np.nan
+            row += [prices[position], z_spread]
+        rows.append(row)
+        if include_cash_flows:
+            frame = pd.DataFrame(note.cash_flow(shift))
+            frame.insert(0, "ISIN", bond["ISIN"])
+            frame.insert(0, "Valuation Date", valuation_date)
+            cash_flows.append(frame)
+    columns = RESULT_COLUMNS + (["Dirty Price", "Z-Spread (%)"] if prices is not None else [])
+    return pd.DataFrame(rows, columns=columns), pd.concat(cash_flows, ignore_index=True) if cash_flows else None
+
+
+def valuation_dates(curve_store, date=None, start=None, end=None):
+    """Curve observation dates to value: one date, a range, or the latest available date."""
+    dates = curve_store.observation_dates()
+    if date is not None:
+        return [np.datetime64(pd.Timestamp(date).date(), "D")]
+    if start is None and end is None:
+        return list(dates[-1:])
+    if start is not None:
+        dates = dates[dates >= np.datetime64(pd.Timestamp(start).date(), "D")]
+    if end is not None:
+        dates = dates[dates <= np.datetime64(pd.Timestamp(end).date(), "D")]
+    return list(dates)
+
+
+def plan_jobs(bonds, curves_df, curve_store, dates, chunk_size):
+    """
+    Split the work into (bonds, curves, date) chunks; bonds without a curve are skipped.
+
+    Fixed rate chunks only carry the curves of their date. Floating rate notes get chunks
+    of their own with their currencies' curves up to the date, for their past fixings.
+    """
+    jobs = []
+    skipped = 0
+    # Split the curves by date once; only the curves of a chunk's date are shipped with it
+    observation_dates = pd.to_datetime(curves_df["observation_date"]).dt.date
+    curves_by_date = dict(iter(curves_df.groupby(observation_dates)))
+    maturity_dates = bonds["Maturity Date"]
+    currency = bonds["Nominal Value Currency"]
+    floating = ~pd.isna(bonds["Reference Rate Code"])
+    floating_curves = curves_df[np.isin(curves_df["currency"], np.unique(currency[floating]))]
+    floating_dates = observation_dates[floating_curves.index].to_numpy() if len(floating_curves) else np.array([])
+    for valuation_date in dates:
+        day = pd.Timestamp(valuation_date).date()
+        day_curves = curves_by_date.get(day, curves_df.iloc[:0])
+        currencies = [c for c in set(currency) if (c, valuation_date) in curve_store]
+        has_curve = np.isin(currency, currencies)
+        alive = has_curve & (maturity_dates >= np.datetime64(day, "D"))
+        skipped += int((~has_curve).sum())
+        # Chunks are compact BondTables, cheap to pickle to the workers
+        for kind, curves in ((~floating, day_curves), (floating, None)):
+            live_rows = np.flatnonzero(alive & kind)
+            if len(live_rows) and curves is None:
+                curves = floating_curves[floating_dates <= day]
+            for start in range(0, len(live_rows), chunk_size):
+                jobs.append((bonds.take(live_rows[start:start + chunk_size]), curves, str(day)))
+    return jobs, skipped
+
+
+def chunk_prices(prices_df, bonds, valuation_date):
+    """Dirty prices per piece of a chunk's bonds on a date, NaN where the prices file has none."""
+    if "Valuation Date" in prices_df.columns:
+        day = pd.Timestamp(valuation_date)
+        prices_df = prices_df[pd.to_datetime(prices_df["Valuation Date"]) == day]
+    by_isin = prices_df.drop_duplicates("ISIN", keep="last").set_index("ISIN").reindex(bonds["ISIN"])
+    if "Dirty Price" in by_isin.columns:
+        return by_isin["Dirty Price"].to_numpy(dtype=float)
+    # Clean quotes in % of nominal, converted with the accrued interest of the whole chunk at once
+    _, dirty = clean_to_dirty(bonds, valuation_date, by_isin["Clean Price"].to_numpy(dtype=float))
+    return dirty
+
+
+def write_frame(frame, path):
+    if path.endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def run(bonds_path, curves_path, output, cash_flows_output=None, date=None, start=None, end=None,
+        shift=0, workers=None, chunk_size=2000, interpolation="linear", metrics_output=None, prices_path=None):
+    started = time.perf_counter()
+    bonds_df = storage.read_bond_emissions(bonds_path)
+    # Only load the curves inside the requested dates (pushed down for converted .arrow files);
+    # floating rate notes also need the earlier curves their past coupons were fixed from
+    has_floaters = bonds_df["Reference Rate Code"].notna().any()
+    curves_df = storage.read_yield_curves(
+        curves_path, start=None if has_floaters else date or start, end=date or end
+    ).reset_index(drop=True)
+    curve_store = YieldCurveStore(curves_df)
+
+    # Parse and encode the reference data once here rather than in every chunk
+    bonds, rejected = BondTable.from_frame(bonds_df).valid()
+
+    dates = valuation_dates(curve_store, date, start, end)
+    jobs, skipped = plan_jobs(bonds, curves_df, curve_store, dates, chunk_size)
+    workers = workers or os.cpu_count()
+    include_cash_flows = cash_flows_output is not None
+    prices_df = pd.read_csv(prices_path) if prices_path else None
+    job_prices = [None if prices_df is None else chunk_prices(prices_df, job[0], job[2]) for job in jobs]
+
+    if workers == 1:
+        outputs = [
+            value_chunk(*job, shift, include_cash_flows, interpolation, prices)
+            for job, prices in zip(jobs, job_prices)
+        ]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(value_chunk, *job, shift, include_cash_flows, interpolation, prices, in_worker=True)
+                for job, prices in zip(jobs, job_prices)
+            ]
+            outputs = [future.result() for future in futures]
+    results = [chunk_results for chunk_results, _, _ in outputs]
+    cash_flows = [chunk_cash_flows for _, chunk_cash_flows, _ in outputs]
+    for _, _, chunk_metrics in outputs:
+        if chunk_metrics is not None:
+            METRICS.merge(chunk_metrics)
+
+    results_df = pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=RESULT_COLUMNS)
+    write_frame(results_df, output)
+    if include_cash_flows:
+        cash_flows_df = pd.concat(cash_flows, ignore_index=True) if cash_flows else pd.DataFrame()
+        write_frame(cash_flows_df, cash_flows_output)
+
+    elapsed = time.perf_counter() - started
+    METRICS.record("batch_run", elapsed)
+    METRICS.count("positions_valued", len(results_df))
+    if metrics_output:
+        METRICS.dump(metrics_output)
+    print(
+        f"Valued {len(results_df)} positions over {len(dates)} date(s) with {workers} worker(s) "
+        f"in {elapsed:.2f}s ({len(results_df) / max(elapsed, 1e-9):.0f} valuations/s)"
+    )
+    if skipped:
+        print(f"Skipped {skipped} bond valuation(s) with no yield curve for the valuation date")
+    if rejected:
+        print(f"Skipped {len(rejected)} bond(s) with invalid reference data")
+    return results_df
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Value a bond inventory without the Streamlit app.")
+    parser.add_argument("--bonds", default="bond_emissions.csv", help="bond inventory in bond_emissions.csv format (or converted .arrow)")
+    parser.add_argument("--curves", default="yieldCurves.csv", help="yield curves in yieldCurves.csv format (or converted .arrow)")
+    parser.add_argument("--output", default="valuation_results.csv", help="results file (.csv or .parquet)")
+    parser.add_argument("--cash-flows", help="optional cash flow file (.csv or .parquet)")
+    parser.add_argument("--date", help="valuation date (defaults to the latest curve date)")
+    parser.add_argument("--start", help="first valuation date of a range")
+    parser.add_argument("--end", help="last valuation date of a range")
+    parser.add_argument("--shift", type=float, default=0.0, help="parallel yield curve shift in %%")
+    parser.add_argument("--interpolation", choices=INTERPOLATION_METHODS, default="linear", help="yield curve interpolation")
+    parser.add_argument("--workers", type=int, help="worker processes (defaults to the number of cores)")
+    parser.add_argument("--metrics", help="optional JSON file for stage timings and counters")
+    parser.add_argument("--log-level", help="logging level (defaults to $TREASURY_LOG_LEVEL or WARNING)")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="bonds per work item")
+    parser.add_argument("--prices", help="optional prices (ISIN, Dirty Price per piece or Clean Price in %%[, Valuation Date]) for Z-spreads")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    run(
+        args.bonds, args.curves, args.output,
+        cash_flows_output=args.cash_flows,
+        date=args.date, start=args.start, end=args.end,
+        shift=args.shift, workers=args.workers, chunk_size=args.chunk_size,
+        interpolation=args.interpolation, metrics_output=args.metrics, prices_path=args.prices,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Benchmarks of the valuation engine and the app data loading path on synthetic data.
+
+Results are written as JSON so runs from different versions can be compared:
+    python benchmark.py --bonds 100 1000 10000 --days 250 --output benchmark_results.json
+    python benchmark.py --compare benchmark_results.json --output new_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+from curves import YieldCurveStore
+from portfolio import BondPortfolio
+from schedules import SCHEDULE_CACHE
+from valuation import FixedBond
+import storage
+import synthetic
+
+
+def best_time(function, repeat=3):
+    """Best wall clock time of repeat calls of function, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def live_fixed_bonds(bonds_df, trade_date):
+    """Fixed rate bonds that still have cash flows after trade_date."""
+    fixed = bonds_df[bonds_df["Reference Rate Code"].isna()]
+    return fixed[pd.to_datetime(fixed["Maturity Date"]) > pd.Timestamp(trade_date)].reset_index(drop=True)
+
+
+def fixed_bond_benchmarks(bonds_df, curve_store, trade_date, sample, repeat):
+    """Per call timings of the FixedBond methods over a sample of bonds."""
+    bonds = [row for _, row in bonds_df.head(sample).iterrows()]
+    fixed_bonds = [
+        FixedBond(bond, curve_store, trade_date, bond["Nominal Value Currency"],
+                  bond["Principal Payment Frequency"], bond["Coupon Frequency"])
+        for bond in bonds
+    ]
+    prices = [fixed_bond.npv() for fixed_bond in fixed_bonds]
+
+    def each(method):
+        def run():
+            # Time schedule generation and a fresh solve, not the memoised results
+            SCHEDULE_CACHE.clear()
+            for fixed_bond, price in zip(fixed_bonds, prices):
+                fixed_bond._yield_solution = None
+                method(fixed_bond, price)
+        return run
+
+    benchmarks = {
+        "FixedBond.cash_flow": each(lambda bond, price: bond.cash_flow()),
+        "FixedBond.npv": each(lambda bond, price: bond.npv()),
+        "FixedBond.yield_to_maturity": each(lambda bond, price: bond.yield_to_maturity(price)),
+        "FixedBond.macauley_duration": each(lambda bond, price: bond.macauley_duration(price)),
+    }
+    return {name: (best_time(run, repeat), len(fixed_bonds)) for name, run in benchmarks.items()}
+
+
+def portfolio_benchmarks(bonds_df, curve_store, trade_date, repeat):
+    """Whole universe timings of the vectorised engine."""
+    portfolio = BondPortfolio(bonds_df, curve_store, trade_date)
+    npv = portfolio.npv()
+    return {
+        "BondPortfolio.build": (best_time(lambda: BondPortfolio(bonds_df, curve_store, trade_date), repeat), len(bonds_df)),
+        "BondPortfolio.npv": (best_time(portfolio.npv, repeat), len(bonds_df)),
+        "BondPortfolio.yield_analytics": (best_time(lambda: portfolio.yield_analytics(npv), repeat), len(bonds_df)),
+    }
+
+
+def loading_benchmarks(bonds_path, curves_path, repeat):
+    """Cold timings of the reference data loading done by the app on a cache miss."""
+    results = {
+        "load.bond_emissions_csv": (best_time(lambda: pd.read_csv(bonds_path), repeat), 1),
+        "load.yield_curve_store_csv": (best_time(lambda: YieldCurveStore(pd.read_csv(curves_path)), repeat), 1),
+    }
+    if storage.available():
+        curves_arrow = storage.convert_yield_curves(curves_path)
+        bonds_arrow = storage.convert_bond_emissions(bonds_path)
+        results["load.bond_emissions_arrow"] = (best_time(lambda: storage.BondFile(bonds_arrow).read(), repeat), 1)
+        results["load.yield_curve_store_arrow"] = (best_time(lambda: storage.CurveFile(curves_arrow).store(), repeat), 1)
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes, n_days, sample, repeat=3, seed=0):
+    """Benchmark every universe size; returns the JSON-serialisable report."""
+    records = []
+    for n_bonds in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            bonds_path, curves_path = synthetic.write_dataset(directory, n_bonds, n_days, seed)
+            timings = loading_benchmarks(bonds_path, curves_path, repeat)
+
+            bonds_df = pd.read_csv(bonds_path)
+            curve_store = YieldCurveStore(pd.read_csv(curves_path))
+            trade_date = curve_store.observation_dates()[-1]
+            live_bonds = live_fixed_bonds(bonds_df, trade_date)
+            floating = int(bonds_df["Reference Rate Code"].notna().sum())
+            if floating:
+                print(f"Left out {floating} floating rate note(s): the fixed rate engines are benchmarked")
+            timings.update(fixed_bond_benchmarks(live_bonds, curve_store, trade_date, sample, repeat))
+            timings.update(portfolio_benchmarks(live_bonds, curve_store, trade_date, repeat))
+
+        for name, (seconds, calls) in timings.items():
+            records.append({
+                "benchmark": name,
+                "bonds": n_bonds,
+                "curve_days": n_days,
+                "calls": calls,
+                "seconds": seconds,
+                "seconds_per_call": seconds / max(calls, 1),
+            })
+            print(f"{name:<32} bonds={n_bonds:<8} {seconds:10.4f}s  {seconds / max(calls, 1) * 1e3:10.4f} ms/call")
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "results": records,
+    }
+
+
+def compare(report, previous):
+    """Print the change of every benchmark against an earlier report."""
+    earlier = {(record["benchmark"], record["bonds"]): record["seconds"] for record in previous["results"]}
+    print(f"Compared with revision {previous.get('revision')} ({previous.get('created')}):")
+    for record in report["results"]:
+        before = earlier.get((record["benchmark"], record["bonds"]))
+        if before:
+            print(f"{record['benchmark']:<32} bonds={record['bonds']:<8} {record['seconds'] / before:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the valuation engine on synthetic data.")
+    parser.add_argument("--bonds", type=int, nargs="+", default=[100, 1000, 10000], help="universe sizes to benchmark")
+    parser.add_argument("--days", type=int, default=250, help="curve observation dates per currency")
+    parser.add_argument("--sample", type=int, default=100, help="bonds timed one by one through FixedBond")
+    parser.add_argument("--repeat", type=int, default=3, help="repetitions per benchmark, the best is kept")
+    parser.add_argument("--seed", type=int, default=0, help="random seed of the synthetic data")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="earlier JSON results file to compare against")
+    args = parser.parse_args(argv)
+
+    report = run(args.bonds, args.days, args.sample, args.repeat, args.seed)
+    if args.compare:
+        with open(args.compare) as handle:
+            compare(report, json.load(handle))
+    with open(args.output, "w") as handle:
+        json.dump(report, handle, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Persistent trade blotter with incremental portfolio revaluation, backed by SQLite.
+
+Trades booked from the trade form are kept in a local database (trades.db by default),
+indexed on ISIN, currency and trade date. Valuations are kept per (valuation date,
+interpolation, ISIN) with a fingerprint of the curve and bond terms they came from.
+Revaluing the portfolio reprices only the bonds whose fingerprint changed, i.e. a new or
+edited curve for their (currency, date), or for the past fixing dates of a floater, edited
+terms or booked or cancelled trades. Everything else is read back from the database.
+"""
+import hashlib
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+from curves import to_day
+from instrumentation import METRICS, timed_stage
+from portfolio import BondPortfolio
+from schedules import CashFlowMatrix, PaymentSchedule
+from valuation import FloatingBond, bond_class, fixing_curve_dates
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PATH = "trades.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    trade_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    isin TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    trade_date TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    pieces INTEGER NOT NULL,
+    clean_price REAL NOT NULL,
+    accrued_interest REAL NOT NULL,
+    consideration REAL NOT NULL,
+    booked_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS trades_isin ON trades (isin);
+CREATE INDEX IF NOT EXISTS trades_currency ON trades (currency);
+CREATE INDEX IF NOT EXISTS trades_trade_date ON trades (trade_date);
+CREATE TABLE IF NOT EXISTS valuations (
+    valuation_date TEXT NOT NULL,
+    interpolation TEXT NOT NULL,
+    isin TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    npv REAL,
+    ytm REAL,
+    modified_duration REAL,
+    cash_received REAL,
+    fixing_dates TEXT,
+    trade_dates TEXT,
+    PRIMARY KEY (valuation_date, interpolation, isin)
+);
+"""
+# Stored valuation columns after the key: everything computed for a stale ISIN
+VALUATION_FIELDS = ("fingerprint", "npv", "ytm", "modified_duration", "cash_received", "fixing_dates", "trade_dates")
+
+POSITION_COLUMNS = [
+    "ISIN", "Issue Name", "Currency", "Net Pieces", "Trades", "Cost", "NPV per Piece",
+    "Market Value", "Cash Received", "P&L", "YTM (%)", "Modified Duration",
+]
+
+
+def terms_fingerprint(bond):
+    """Short hash of a bond row's terms (BondRecord or pandas row)."""
+    terms = tuple(str(bond[label]) for label in bond.keys())
+    return hashlib.blake2b(repr(terms).encode(), digest_size=8).hexdigest()
+
+
+def fixing_fingerprint(yield_curve_store, currency, fixing_dates, trade_dates):
+    """
+    Short hash of the curves a floater's stored figures depend on besides the valuation date
+    curve: the curve setting each past fixing (the latest one on or before it, so a curve
+    added in between changes it) and the curves of its trade dates, which stand in for
+    fixings older than every curve.
+    """
+    observation_dates = yield_curve_store.observation_dates(currency)
+    observed = fixing_curve_dates(observation_dates, fixing_dates, np.datetime64("NaT", "D"))
+    days = np.union1d(observed[~np.isnat(observed)], np.intersect1d(trade_dates, observation_dates))
+    curves = [(str(day), yield_curve_store.fingerprint(currency, day)) for day in days]
+    return hashlib.blake2b(repr(curves).encode(), digest_size=8).hexdigest()
+
+
+def _dates(text):
+    return np.array(text.split(), dtype="datetime64[D]") if text else np.array([], dtype="datetime64[D]")
+
+
+def _floating_bond(bond, yield_curve_store, trade_date, interpolation="linear"):
+    return FloatingBond(
+        bond, yield_curve_store, trade_date, bond["Nominal Value Currency"],
+        bond["Principal Payment Frequency"], bond["Coupon Frequency"], interpolation=interpolation,
+    )
+
+
+class TradeBlotter:
+    """
+    Booked trades and stored per piece valuations in one SQLite database.
+
+    pieces and consideration are signed: positive for purchases (pieces bought, cash paid),
+    negative for sales. The connection is shared by the Streamlit sessions of a server, so
+    every statement runs under a lock.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._connection:
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(valuations)")]
+            if columns and columns[3:] != list(VALUATION_FIELDS):
+                # Stored valuations are a cache: a file from an older layout starts a new one
+                self._connection.execute("DROP TABLE valuations")
+            self._connection.executescript(SCHEMA)
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            return pd.read_sql_query(sql, self._connection, params=parameters)
+
+    def book(self, isin, currency, trade_date, direction, pieces, clean_price, accrued_interest, consideration):
+        """Record a trade; returns its trade id."""
+        sign = 1 if direction == "Buy" else -1
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO trades (isin, currency, trade_date, direction, pieces, clean_price, accrued_interest,"
+                " consideration, booked_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    isin, currency, str(to_day(trade_date)), direction, sign * int(pieces), float(clean_price),
+                    float(accrued_interest), sign * abs(float(consideration)),
+                    datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                ),
+            )
+        logger.info("Booked trade %d: %s %d %s", cursor.lastrowid, direction, pieces, isin)
+        return cursor.lastrowid
+
+    def cancel(self, trade_id):
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM trades WHERE trade_id = ?", (int(trade_id),))
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM trades").fetchone()[0]
+
+    def trades(self, isin=None, currency=None, start=None, end=None, limit=None):
+        """Booked trades, most recent trade date first, optionally filtered."""
+        conditions, parameters = [], []
+        for column, operator, value in (("isin", "=", isin), ("currency", "=", currency),
+                                        ("trade_date", ">=", start), ("trade_date", "<=", end)):
+            if value is not None:
+                conditions.append(f"{column} {operator} ?")
+                parameters.append(str(to_day(value)) if column == "trade_date" else value)
+        sql = "SELECT * FROM trades"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY trade_date DESC, trade_id DESC"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, parameters)
+
+    def positions(self, as_of=None, currency=None):
+        """Net pieces, trade count and cost per ISIN of the trades up to as_of."""
+        conditions, parameters = [], []
+        if as_of is not None:
+            conditions.append("trade_date <= ?")
+            parameters.append(str(to_day(as_of)))
+        if currency is not None:
+            conditions.append("currency = ?")
+            parameters.append(currency)
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return self._query(
+            "SELECT isin AS ISIN, currency AS Currency, SUM(pieces) AS [Net Pieces], COUNT(*) AS Trades,"
+            f" SUM(consideration) AS Cost FROM trades{where} GROUP BY isin, currency ORDER BY isin",
+            parameters,
+        )
+
+    def trade_versions(self, as_of=None):
+        """
+        {isin: version} of the trades up to as_of. Trade ids only grow and trades are only
+        booked or cancelled, so the count, sum and last of the ids change with every change.
+        """
+        conditions, parameters = "", ()
+        if as_of is not None:
+            conditions, parameters = " WHERE trade_date <= ?", (str(to_day(as_of)),)
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT isin, COUNT(*), SUM(trade_id), MAX(trade_id) FROM trades{conditions} GROUP BY isin", parameters
+            ).fetchall()
+        return {row[0]: "{}:{}:{}".format(*row[1:]) for row in rows}
+
+    def stored_valuations(self, valuation_date, interpolation):
+        """{isin: (fingerprint, npv, ytm, modified duration, cash received, fixing dates, trade dates)}."""
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT isin, {', '.join(VALUATION_FIELDS)} FROM valuations WHERE valuation_date = ? AND interpolation = ?",
+                (str(to_day(valuation_date)), interpolation),
+            ).fetchall()
+        return {row[0]: row[1:] for row in rows}
+
+    def store_valuations(self, valuation_date, interpolation, rows):
+        """Insert or replace (isin, *VALUATION_FIELDS) rows."""
+        day = str(to_day(valuation_date))
+        with self._lock, self._connection:
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO valuations VALUES ({', '.join('?' * (3 + len(VALUATION_FIELDS)))})",
+                [(day, interpolation, *row) for row in rows],
+            )
+
+    @timed_stage("portfolio_revaluation")
+    def revalue(self, universe, yield_curve_store, valuation_date, interpolation="linear"):
+        """
+        Positions as of valuation_date with their market value, P&L, YTM and duration.
+
+        P&L is market value plus the coupons and principal received since the trades (see
+        cash_received) minus cost. Everything is stored per ISIN under a fingerprint of the
+        valuation date curve, the bond terms, the ISIN's trades and, for floaters, the curves
+        of their past fixings; only ISINs whose fingerprint changed are recomputed (fixed
+        rate bonds together, floaters one by one). Returns the positions and
+        {"repriced": n, "reused": n, "unpriced": n}.
+        """
+        valuation_date = to_day(valuation_date)
+        positions = self.positions(valuation_date)
+        stored = self.stored_valuations(valuation_date, interpolation)
+        versions = self.trade_versions(valuation_date)
+
+        base = {}
+        unpriced = []
+        for isin, currency in zip(positions["ISIN"], positions["Currency"]):
+            if isin not in universe or (currency, valuation_date) not in yield_curve_store:
+                unpriced.append(isin)
+                continue
+            bond = universe.bond(isin)
+            base[isin] = yield_curve_store.fingerprint(currency, valuation_date) + terms_fingerprint(bond) + versions[isin]
+
+        def fingerprint(isin, fixing_dates, trade_dates):
+            bond = universe.bond(isin)
+            if bond_class(bond) is not FloatingBond:
+                return base[isin]
+            currency = bond["Nominal Value Currency"]
+            return base[isin] + fixing_fingerprint(yield_curve_store, currency, _dates(fixing_dates), _dates(trade_dates))
+
+        # The fixing dates of a stored floater are valid while its terms and trades are unchanged
+        stale = [
+            isin for isin in base
+            if isin not in stored or stored[isin][0] != fingerprint(isin, *stored[isin][5:])
+        ]
+        repriced = self._reprice(universe, yield_curve_store, valuation_date, interpolation, stale)
+        for isin, (npv, ytm, duration, received, fixing_dates, trade_dates) in repriced.items():
+            stored[isin] = (fingerprint(isin, fixing_dates, trade_dates), npv, ytm, duration, received, fixing_dates, trade_dates)
+        self.store_valuations(valuation_date, interpolation, [(isin, *stored[isin]) for isin in stale])
+        METRICS.count("positions_repriced", len(stale))
+        METRICS.count("positions_reused", len(base) - len(stale))
+        logger.debug("Repriced %d of %d positions for %s", len(stale), len(positions), valuation_date)
+
+        values = np.array(
+            [stored[isin][1:5] if isin in base else (np.nan,) * 4 for isin in positions["ISIN"]], dtype=float
+        ).reshape(-1, 4)
+        positions["Issue Name"] = [universe.bond(isin)["Issue Name"] if isin in universe else None for isin in positions["ISIN"]]
+        positions["NPV per Piece"] = values[:, 0]
+        positions["Market Value"] = positions["NPV per Piece"] * positions["Net Pieces"]
+        positions["Cash Received"] = values[:, 3]
+        positions["P&L"] = positions["Market Value"] + positions["Cash Received"] - positions["Cost"]
+        positions["YTM (%)"] = values[:, 1]
+        positions["Modified Duration"] = values[:, 2]
+        stats = {"repriced": len(stale), "reused": len(base) - len(stale), "unpriced": len(unpriced)}
+        return positions[POSITION_COLUMNS], stats
+
+    def _trades_of(self, isins, end):
+        """Trades of the given ISINs up to end."""
+        if not isins:
+            return pd.DataFrame(columns=["isin", "trade_date", "pieces"])
+        return self._query(
+            f"SELECT isin, trade_date, pieces FROM trades WHERE trade_date <= ? AND isin IN ({', '.join('?' * len(isins))})",
+            [str(to_day(end)), *isins],
+        )
+
+    def cash_received(self, universe, yield_curve_store, valuation_date, isins, interpolation="linear"):
+        """
+        {isin: (coupons and principal received, past fixing dates, trade dates)} from the
+        trades of isins up to valuation_date; the dates are space separated, for floaters.
+
+        A trade receives the flows paid on or after its trade date (they are in its price)
+        and before valuation_date (later ones are in the NPV), times its signed pieces, so
+        a sale stops the flows of the pieces sold. Fixed rate flows are taken from the
+        schedules of all trades at once; floater coupons are set from their fixing curves
+        and are NaN when a curve is missing.
+        """
+        valuation_date = to_day(valuation_date)
+        trades = self._trades_of(list(isins), valuation_date)
+        received = {isin: [0.0, None, None] for isin in isins}
+        floating = np.array([bond_class(universe.bond(isin)) is FloatingBond for isin in trades["isin"]], dtype=bool)
+
+        fixed = trades[~floating]
+        if len(fixed):
+            schedule = PaymentSchedule.from_frame(universe.bonds.take([universe.position(isin) for isin in fixed["isin"]]))
+            matrix = CashFlowMatrix(schedule, fixed["trade_date"].to_numpy(), fixed["pieces"].to_numpy())
+            paid = matrix.mask & (matrix.payment_dates < valuation_date)
+            amounts = np.where(paid, matrix.coupon + matrix.principal, 0.0).sum(axis=1)
+            for isin, amount in zip(fixed["isin"], amounts):
+                received[isin][0] += amount
+
+        for isin, isin_trades in trades[floating].groupby("isin"):
+            fixing_dates = set()
+            for trade_date, pieces in isin_trades[["trade_date", "pieces"]].itertuples(index=False):
+                floating_bond = _floating_bond(universe.bond(isin), yield_curve_store, trade_date, interpolation)
+                fixing_dates.update(str(day) for day in floating_bond.past_fixing_dates(valuation_date))
+                try:
+                    _, coupons, principal = floating_bond.paid_cash_flows(valuation_date)
+                    received[isin][0] += pieces * float(np.sum(coupons + principal))
+                except ValueError:
+                    received[isin][0] = np.nan
+            received[isin][1] = " ".join(sorted(fixing_dates))
+            received[isin][2] = " ".join(sorted(set(isin_trades["trade_date"])))
+        return {isin: tuple(values) for isin, values in received.items()}
+
+    def _reprice(self, universe, yield_curve_store, valuation_date, interpolation, isins):
+        """
+        {isin: (npv, ytm, modified duration, *cash_received)}: per piece figures solved at the
+        model NPV like the batch engine, then what cash_received reports for the position.
+        """
+        results = {}
+        live = []
+        for isin in isins:
+            bond = universe.bond(isin)
+            if to_day(bond["Maturity Date"]) < valuation_date:
+                results[isin] = (0.0, np.nan, np.nan)
+            elif bond_class(bond) is FloatingBond:
+                floating_bond = _floating_bond(bond, yield_curve_store, valuation_date, interpolation)
+                npv = floating_bond.npv()
+                try:
+                    analytics = floating_bond.yield_analytics(npv)
+                    results[isin] = (npv, float(analytics.ytm[0]), float(analytics.modified_duration[0]))
+                except ValueError:
+                    results[isin] = (npv, np.nan, np.nan)
+            else:
+                live.append(isin)
+
+        if live:
+            rows = [universe.position(isin) for isin in live]
+            portfolio = BondPortfolio(universe.bonds.take(rows), yield_curve_store, valuation_date, interpolation=interpolation)
+            npv = portfolio.npv()
+            analytics = portfolio.yield_analytics(npv)
+            for index, isin in enumerate(live):
+                results[isin] = (float(npv[index]), float(analytics.ytm[index]), float(analytics.modified_duration[index]))
+        received = self.cash_received(universe, yield_curve_store, valuation_date, isins, interpolation)
+        return {isin: (*results[isin], *received[isin]) for isin in isins}
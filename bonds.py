@@ -1,9 +1,227 @@
 import streamlit as st
 import pandas as pd
-from valuation import FixedBond
+from valuation import FloatingBond, bond_class
+from app_cache import job_runner, load_snapshot_store, load_trade_blotter, valuation_cache
+from scenarios import SHIFT_LADDER, npv_ladder
+from sensitivities import bond_sensitivities
+from history import revalue_history
+from curves import INTERPOLATION_METHODS
+from instrumentation import timed_stage
+from jobs import DONE, FAILED
+from pricing import dirty_price
 
-def display_fixed_rate_trade_form(selected_bond, yield_curves_df):
-    st.subheader("Fixed Rate Bond")
+INTERPOLATION_LABELS = {
+    "linear": "Linear on zero rates",
+    "log_linear": "Log-linear on discount factors",
+    "monotone_cubic": "Monotone cubic on zero rates",
+}
+
+# Bond details shown above the trade form: column of the bond row -> display label
+BOND_DETAILS = {
+    "Issue Name": "Issue Name",
+    "ISIN": "ISIN",
+    "Issue Date": "Issue Date",
+    "Maturity Date": "Maturity Date",
+    "Nominal Value (1 unit)": "Nominal Value",
+    "Nominal Value Currency": "Currency",
+    "Fixed Rate/Spread [%]": "Coupon Rate (%)",
+    "Principal Payment Frequency": "Principal Payment Frequency",
+    "Coupon Frequency": "Coupon Frequency",
+    "Day Count Convention": "Day Count Convention",
+    "Business Day Convention": "Business Day Convention",
+}
+
+def bond_terms(selected_bond):
+    """Hashable terms of a bond row (BondRecord or pandas row) for the cache keys."""
+    return tuple(str(selected_bond[label]) for label in selected_bond.keys())
+
+# Seconds between progress refreshes of a running job, and how long a rerun waits for a
+# job before showing its progress (quick jobs render at once, without a progress bar)
+JOB_POLL_SECONDS = 0.5
+JOB_QUICK_WAIT = 0.3
+
+
+def _no_progress(fraction, message=None):
+    pass
+
+def trade_key(selected_bond, yield_curve_store, trade_date, shift, number_of_pieces, price, interpolation="linear"):
+    """Cache and job key of a Solve, with the curve data version and bond terms so edited files are never served stale."""
+    return (
+        selected_bond["ISIN"], str(trade_date), float(shift), int(number_of_pieces), float(price), interpolation,
+        yield_curve_store.version, bond_terms(selected_bond),
+    )
+
+def history_key(selected_bond, yield_curve_store, shift, number_of_pieces, start, end, interpolation="linear"):
+    """Cache and job key of a historical revaluation, like trade_key."""
+    return (
+        "history", selected_bond["ISIN"], str(start), str(end), float(shift), int(number_of_pieces), interpolation,
+        yield_curve_store.version, bond_terms(selected_bond),
+    )
+
+@timed_stage("trade_valuation")
+def value_trade(selected_bond, yield_curve_store, trade_date, shift, number_of_pieces, price, interpolation="linear",
+                progress=_no_progress, results=None):
+    """
+    Value a trade for the Solve button.
+
+    Results are cached across reruns and sessions by trade_key in results, valuation_cache()
+    by default (background jobs get it passed from the script thread, where st.cache_resource
+    runs). progress is called as progress(fraction, message) between the steps, see jobs.Job.report.
+    """
+    key = trade_key(selected_bond, yield_curve_store, trade_date, shift, number_of_pieces, price, interpolation)
+    results = valuation_cache() if results is None else results
+    result = results.get(key)
+    if result is not None:
+        return result
+
+    progress(0.0, "Building cash flows")
+    # FloatingBond for notes with a Reference Rate Code, FixedBond otherwise
+    bond = bond_class(selected_bond)(
+        selected_bond,
+        yield_curve_store,
+        trade_date,
+        selected_bond["Nominal Value Currency"],
+        selected_bond["Principal Payment Frequency"],
+        selected_bond["Coupon Frequency"],
+        number_of_pieces=number_of_pieces,
+        interpolation=interpolation
+    )
+    cf_df = pd.DataFrame(bond.cash_flow(shift))
+    # Convert date columns to ISO format (YYYY-MM-DD)
+    for column in ("Date", "Fixing Date"):
+        if column in cf_df.columns:
+            cf_df[column] = pd.to_datetime(cf_df[column]).dt.strftime('%Y-%m-%d')
+
+    result = {"cash_flows": cf_df}
+    progress(0.2, "Discounting")
+    result["npv"] = bond.npv(shift)
+    progress(0.3, "Shift ladder")
+    result["npv_ladder"] = npv_ladder(bond, SHIFT_LADDER)
+    progress(0.5, "Solving the yield")
+    result["analytics"] = bond.yield_analytics(price)
+    result["z_spread"] = bond.z_spread(price)
+    progress(0.6, "Curve sensitivities")
+    result["sensitivities"] = bond_sensitivities(bond, shift)
+    results.put(key, result)
+    return result
+
+def trade_accrued_interest(selected_bond, yield_curve_store, trade_date):
+    """Accrued interest of one piece at the trade date, see FixedBond.accrued_interest."""
+    bond = bond_class(selected_bond)(
+        selected_bond,
+        yield_curve_store,
+        trade_date,
+        selected_bond["Nominal Value Currency"],
+        selected_bond["Principal Payment Frequency"],
+        selected_bond["Coupon Frequency"],
+    )
+    return bond.accrued_interest()
+
+def value_history(selected_bond, yield_curve_store, shift, number_of_pieces, start, end, interpolation="linear",
+                  progress=_no_progress, results=None):
+    """Historical revaluation of a trade, cached like value_trade."""
+    key = history_key(selected_bond, yield_curve_store, shift, number_of_pieces, start, end, interpolation)
+    results = valuation_cache() if results is None else results
+    return results.get_or_create(
+        key,
+        lambda: revalue_history(
+            selected_bond, yield_curve_store, number_of_pieces, start, end, shift, interpolation, progress=progress
+        ),
+    )
+
+def display_job(name, key, render):
+    """
+    Show the background job under key: a progress bar with a Cancel button while it runs,
+    then render(result), or the error. name ("solve", "history") keeps the widget keys apart.
+    """
+    job = job_runner().get(key)
+    if job is None:
+        return
+    job.wait(JOB_QUICK_WAIT)
+    if job.active:
+        job_progress(name, key)
+    elif job.status == DONE:
+        render(job.result)
+    elif job.status == FAILED:
+        st.error(f"{job.description} failed: {job.message}")
+    else:
+        st.info(f"{job.description} was cancelled.")
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def job_progress(name, key):
+    # Only this fragment reruns while the job is busy; the rest of the page stays interactive
+    job = job_runner().get(key)
+    if job is None or not job.active:
+        st.rerun()  # a full rerun renders the result
+    st.progress(job.progress, text=f"{job.description}: {job.message}")
+    if st.button("Cancel", key=f"cancel_{name}"):
+        job.cancel()
+
+def display_snapshot(snapshot, number_of_pieces, currency):
+    st.write(f"**End-of-Day Figures ({snapshot.observation_date}, at the model price):**")
+    st.table({
+        "NPV": [f"{snapshot.npv * number_of_pieces:.2f} {currency}"],
+        "YTM (%)": [f"{snapshot.ytm:.2f}"],
+        "Macaulay Duration": [f"{snapshot.macaulay_duration:.2f}"],
+        "Modified Duration": [f"{snapshot.modified_duration:.2f}"],
+        "Convexity": [f"{snapshot.convexity:.2f}"],
+    })
+    with st.expander("End-of-Day Cash Flow Ladder"):
+        st.dataframe(snapshot.cash_flows(number_of_pieces))
+
+def display_trade_result(result, selected_bond, trade_date, shift, show_shift_ladder):
+    npv = result["npv"]
+    currency = selected_bond["Nominal Value Currency"]
+    st.write(f"Calculations as of: {trade_date}")
+    st.write("**Calculated Cash Flows:**")
+    st.dataframe(result["cash_flows"])
+
+    # Conditional display of NPV label based on shift value
+    if shift == 0:
+        st.write(f"**Net Present Value (NPV BASE): {npv:.2f} {currency}**")
+    else:
+        st.write(f"**Net Present Value (NPV SCENARIO - shift {shift:.2f}%): {npv:.2f} {currency}**")
+
+    # NPV for every slider position, evaluated in one pass over the cash flows
+    if show_shift_ladder:
+        st.write("**NPV by Parallel Yield Curve Shift:**")
+        st.line_chart(pd.DataFrame({"Shift (%)": SHIFT_LADDER, "NPV": result["npv_ladder"]}).set_index("Shift (%)"))
+
+    # YTM, durations and convexity come from a single yield solve
+    analytics = result["analytics"]
+    st.write(f"**Macaulay Duration: {analytics.macaulay_duration[0]:.2f} years**")
+    st.write(f"**Modified Duration: {analytics.modified_duration[0]:.2f}**")
+    st.write(f"**Convexity: {analytics.convexity[0]:.2f}**")
+    st.write(f"**Yield to Maturity (YTM): {analytics.ytm[0]:.2f}%**")
+    # Constant spread over the zero curve that reproduces the trade price
+    st.write(f"**Z-Spread: {result['z_spread'] * 100:.1f} bp**")
+
+    # Curve sensitivities: every node bump repriced in one pass over the schedule
+    sensitivities = result["sensitivities"]
+    st.write(f"**DV01: {sensitivities.dv01:.2f} {currency}**")
+    st.write(f"**Effective Duration: {sensitivities.effective_duration:.2f} years**")
+    st.write(f"**Effective Convexity: {sensitivities.convexity:.2f}**")
+    st.write("**Key Rate Sensitivities:**")
+    st.table(sensitivities.to_frame())
+
+def display_history(history):
+    if history.empty:
+        st.warning("The bond has no cash flows left on the selected dates.")
+        return
+    history = history.set_index("Date")
+    st.write("**NPV:**")
+    st.line_chart(history["NPV"])
+    st.write("**Yield to Maturity (%):**")
+    st.line_chart(history["YTM (%)"])
+    st.write("**Duration:**")
+    st.line_chart(history[["Macaulay Duration", "Modified Duration"]])
+    st.write("**Daily P&L:**")
+    st.bar_chart(history["Daily P&L"])
+    st.dataframe(history)
+
+def display_fixed_rate_trade_form(selected_bond, yield_curve_store):
+    floating = bond_class(selected_bond) is FloatingBond
+    st.subheader("Floating Rate Note" if floating else "Fixed Rate Bond")
     bond_emissions_file = "bond_emissions.csv"
     try:
         # Initialize session state variables if they do not exist
@@ -13,27 +231,20 @@ def display_fixed_rate_trade_form(selected_bond, yield_curves_df):
             st.session_state["number_of_pieces"] = 1
         if "clean_price" not in st.session_state:
             st.session_state["clean_price"] = 100.0
-        if "accrued_interest" not in st.session_state:
-            st.session_state["accrued_interest"] = 0.0
 
         # Display the selected bond details in table format
         st.write("**Selected Bond Details:**")
-        bond_details_table = pd.DataFrame([selected_bond]).rename(
-            columns={
-                "Issue Name": "Issue Name",
-                "ISIN": "ISIN",
-                "Issue Date":"Issue Date",
-                "Maturity Date": "Maturity Date",
-                "Nominal Value (1 unit)": "Nominal Value",
-                "Nominal Value Currency": "Currency",
-                "Fixed Rate/Spread [%]": "Coupon Rate (%)",
-                "Principal Payment Frequency":"Principal Payment Frequency",
-                "Coupon Frequency":"Coupon Frequency",
-                "Day Count Convention":"Day Count Convention",
-                "Business Day Convention":"Business Day Convention"
-            }
-        )
-        st.table(bond_details_table[["Issue Name", "ISIN","Issue Date", "Maturity Date", "Nominal Value", "Currency", "Coupon Rate (%)", "Principal Payment Frequency", "Coupon Frequency", "Day Count Convention", "Business Day Convention"]])
+        # One row built straight from the record, no per-bond DataFrame round trip
+        details = {label: [selected_bond[column]] for column, label in BOND_DETAILS.items()}
+        for label in ("Issue Date", "Maturity Date"):
+            details[label] = [str(pd.Timestamp(details[label][0]).date())]
+        if floating:
+            # Floaters quote a spread over the reference rate in the coupon column
+            details["Spread (%)"] = details.pop("Coupon Rate (%)")
+            details["Reference Rate"] = [selected_bond["Reference Rate Code"]]
+            details["Fixing Lead Time (days)"] = [selected_bond["Fixing Lead Time (days)"]]
+            details["First Coupon Rate (%)"] = [selected_bond["First Coupon Rate [%]"]]
+        st.table(details)
 
         # Input fields for user parameters
         trade_direction = st.selectbox("Trade Direction", ["Buy", "Sell"], key="trade_direction_input")
@@ -58,25 +269,25 @@ def display_fixed_rate_trade_form(selected_bond, yield_curves_df):
         )
         st.session_state["clean_price"] = clean_price
 
-        accrued_interest = st.number_input(
-            "Accrued Interest (per piece)",
-            min_value=0.0,
-            step=0.01,
-            value=st.session_state["accrued_interest"],
-            key="accrued_interest_input"
-        )
-        st.session_state["accrued_interest"] = accrued_interest
+        # Select trade date (settlement is on the trade date)
+        yield_dates = [str(date) for date in yield_curve_store.observation_dates()]
+        trade_date = st.selectbox("Trade Date", yield_dates)
 
-        # Calculate total price
+        # Accrued interest follows from the schedule and day count at the trade date
         nominal_value = selected_bond["Nominal Value (1 unit)"]
         currency = selected_bond["Nominal Value Currency"]
-        total_price = number_of_pieces * (nominal_value * clean_price / 100 + accrued_interest)
+        try:
+            accrued_interest = trade_accrued_interest(selected_bond, yield_curve_store, trade_date)
+        except ValueError as error:
+            # A floater's running rate is projected from the curve of the trade date
+            st.warning(f"Accrued interest is not available: {error}")
+            accrued_interest = 0.0
+        st.write(f"Accrued Interest (per piece): {accrued_interest:.2f} {currency}")
 
-        st.write(f"**Total Price: {total_price:.2f} {currency}**")
+        # Calculate total (dirty) price; dirty_price takes the accrued interest of the position
+        total_price = float(dirty_price(clean_price, accrued_interest * number_of_pieces, nominal_value, number_of_pieces))
 
-        # Select trade date
-        yield_dates = yield_curves_df["observation_date"].unique()
-        trade_date = st.selectbox("Trade Date", yield_dates)
+        st.write(f"**Total Price: {total_price:.2f} {currency}**")
 
         # Add a slider for yield curve parallel shift
         shift = st.slider(
@@ -86,48 +297,94 @@ def display_fixed_rate_trade_form(selected_bond, yield_curves_df):
             value=0.0,
             step=0.1
         )
+        interpolation = st.selectbox(
+            "Curve Interpolation",
+            INTERPOLATION_METHODS,
+            format_func=lambda method: INTERPOLATION_LABELS[method],
+        )
+        show_shift_ladder = st.checkbox("Chart NPV over the full shift range", value=False)
+
+        direction_multiplier = 1 if trade_direction == "Buy" else -1  # Set multiplier to 1 for "Buy" and -1 for "Sell"
+        adjusted_number_of_pieces = number_of_pieces * direction_multiplier  # Adjust number of pieces
+
+        # Standard end-of-day figures are read from the snapshot file when there is one (see
+        # snapshot.py); custom prices, shifts and interpolations are valued live by Solve
+        snapshots = load_snapshot_store()
+        if snapshots is not None:
+            snapshot = snapshots.lookup(selected_bond, yield_curve_store, trade_date, interpolation)
+            if snapshot is not None:
+                display_snapshot(snapshot, adjusted_number_of_pieces, currency)
 
-        # Solve button to calculate cash flows and NPV
+        # Solve runs as a background job: identical requests share one job, and its
+        # progress and result are found again on later reruns through the session state
+        solve_arguments = (
+            selected_bond,
+            yield_curve_store,
+            trade_date,
+            shift,
+            adjusted_number_of_pieces,
+            total_price * direction_multiplier,
+            interpolation
+        )
+        solve_key = trade_key(*solve_arguments)
         if st.button("Solve"):
-            direction_multiplier = 1 if trade_direction == "Buy" else -1  # Set multiplier to 1 for "Buy" and -1 for "Sell"
-            adjusted_number_of_pieces = number_of_pieces * direction_multiplier  # Adjust number of pieces
+            job_runner().submit(
+                solve_key, value_trade, *solve_arguments,
+                description=f"Solve {selected_bond['ISIN']}", results=valuation_cache(),
+            )
+            st.session_state["solve_job"] = solve_key
+        if st.session_state.get("solve_job") == solve_key:
+            display_job(
+                "solve",
+                solve_key,
+                lambda result: display_trade_result(result, selected_bond, trade_date, shift, show_shift_ladder),
+            )
 
-            # Initialize FixedBond object
-            fixed_bond = FixedBond(
-                selected_bond,
-                yield_curves_df,
+        # Book the trade into the persistent blotter (see the Portfolio pane)
+        if st.button("Book Trade"):
+            trade_id = load_trade_blotter().book(
+                selected_bond["ISIN"],
+                currency,
                 trade_date,
-                selected_bond["Nominal Value Currency"],
-                selected_bond["Principal Payment Frequency"],
-                selected_bond["Coupon Frequency"],
-                number_of_pieces=adjusted_number_of_pieces
+                trade_direction,
+                number_of_pieces,
+                clean_price,
+                accrued_interest,
+                total_price,
             )
+            st.success(f"Booked trade {trade_id}: {trade_direction} {number_of_pieces} x {selected_bond['ISIN']} on {trade_date}")
 
-            # Calculate cash flows and NPV
-            cash_flows = fixed_bond.cash_flow(shift)
-            npv = fixed_bond.npv(shift)
-            st.write(f"Calculations as of: {trade_date}")
-            st.write("**Calculated Cash Flows:**")
-            cf_df = pd.DataFrame(cash_flows)
-            # Convert date column to ISO format (YYYY-MM-DD)
-            if 'Date' in cf_df.columns:
-                cf_df['Date'] = pd.to_datetime(cf_df['Date']).dt.strftime('%Y-%m-%d')
-
-            st.dataframe(cf_df)
-
-            # Conditional display of NPV label based on shift value
-            if shift == 0:
-                st.write(f"**Net Present Value (NPV BASE): {npv:.2f} {selected_bond['Nominal Value Currency']}**")
-            else:
-                st.write(f"**Net Present Value (NPV SCENARIO - shift {shift:.2f}%): {npv:.2f} {selected_bond['Nominal Value Currency']}**")
-
-            # Calculate Macauley Duration
-            duration = fixed_bond.macauley_duration(total_price * direction_multiplier)
-            st.write(f"**Macaulay Duration: {duration:.2f} years**")
-
-            # Calculate Yield to Maturity (YTM)
-            ytm = fixed_bond.yield_to_maturity(total_price * direction_multiplier)
-            st.write(f"**Yield to Maturity (YTM): {ytm:.2f}%**")
+        # Revalue the position on every curve date in a range, in one pass over its schedule
+        st.write("**Historical Revaluation:**")
+        history_dates = yield_curve_store.observation_dates(currency)
+        if floating:
+            st.info("Historical revaluation is available for fixed rate bonds only.")
+        elif len(history_dates):
+            start_date, end_date = st.select_slider(
+                "Revaluation Period",
+                options=[str(date) for date in history_dates],
+                value=(str(history_dates[0]), str(history_dates[-1])),
+            )
+            history_arguments = (
+                selected_bond,
+                yield_curve_store,
+                shift,
+                adjusted_number_of_pieces,
+                start_date,
+                end_date,
+                interpolation,
+            )
+            revaluation_key = history_key(*history_arguments)
+            if st.button("Revalue History"):
+                job_runner().submit(
+                    revaluation_key, value_history, *history_arguments,
+                    description=f"Revaluation of {selected_bond['ISIN']}", results=valuation_cache(),
+                )
+                st.session_state["history_job"] = revaluation_key
+            if st.session_state.get("history_job") == revaluation_key:
+                display_job("history", revaluation_key, display_history)
+        else:
+            st.info(f"No yield curve history available for {currency}.")
 
 
     except FileNotFoundError:
@@ -0,0 +1,237 @@
+import logging
+
+import pandas as pd
+import numpy as np
+from calendars import BUSINESS_DAY_CONVENTIONS
+from daycount import DAY_COUNT_CONVENTIONS
+
+logger = logging.getLogger(__name__)
+
+
+# Fixed code tables for the convention and frequency columns
+COUPON_FREQUENCIES = ("Annual", "Semi-Annual", "Quarterly")
+PRINCIPAL_FREQUENCIES = ("At Maturity", "Annual", "Semi-Annual", "Quarterly", "Monthly")
+CODE_TABLES = {
+    "Coupon Frequency": COUPON_FREQUENCIES,
+    "Principal Payment Frequency": PRINCIPAL_FREQUENCIES,
+    "Business Day Convention": BUSINESS_DAY_CONVENTIONS,
+    "Day Count Convention": DAY_COUNT_CONVENTIONS,
+}
+
+# bond_emissions.csv column -> storage kind. "code" columns use CODE_TABLES, "category"
+# columns get their code table from the data; missing values are code -1.
+COLUMN_KINDS = {
+    "Issuer Code": "category",
+    "ISIN": "text",
+    "Issue Name": "text",
+    "Issuer Headquarters": "category",
+    "Jurisdiction": "category",
+    "Issue Date": "date",
+    "Maturity Date": "date",
+    "Business Day Convention": "code",
+    "Notes": "text",
+    "Nominal Value (1 unit)": "float",
+    "Nominal Value Currency": "category",
+    "Principal Payment Start Date": "date",
+    "Principal Payment Frequency": "code",
+    "Coupon Start Date": "date",
+    "Coupon Frequency": "code",
+    "Reference Rate Code": "category",
+    "Fixing Lead Time (days)": "float",
+    "First Coupon Rate [%]": "float",
+    "Fixed Rate/Spread [%]": "float",
+    "Day Count Convention": "code",
+}
+
+
+def _encode(values, names):
+    """Integer codes of values in names (-1 for missing and unknown values), and the unknown mask."""
+    codes = pd.Index(names, dtype=object).get_indexer(values)
+    unknown = (codes == -1) & pd.notna(values)
+    return codes.astype(np.int8 if len(names) < 127 else np.int32), unknown
+
+
+def _parse_dates(values):
+    """
+    datetime64[D] array of a date column (NaT when missing or unreadable), and the mask of
+    the unreadable ones; each distinct date string is parsed once.
+    """
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return np.asarray(values, dtype="datetime64[D]"), np.zeros(len(values), dtype=bool)
+    codes, uniques = pd.factorize(values)
+    parsed = np.asarray(pd.to_datetime(uniques, errors="coerce"), dtype="datetime64[D]")
+    present = codes >= 0
+    dates = np.full(len(codes), np.datetime64("NaT", "D"))
+    dates[present] = parsed[codes[present]]
+    return dates, present & np.isnat(dates)
+
+
+class BondTable:
+    """
+    Bond reference data as one typed NumPy array per column (struct of arrays).
+
+    Dates are datetime64[D] (NaT when missing), amounts float64, and conventions,
+    frequencies, currencies and other repeated strings small integer codes. Columns are
+    read by their bond_emissions.csv label, decoded back to strings where coded; rows
+    are BondRecord views that behave like the pandas rows FixedBond has always taken.
+
+    A value that cannot be stored (an unknown convention or frequency, an unreadable date
+    or amount) is kept as missing and its row is marked in problems, so one bad row does
+    not fail the whole table; valid() leaves the marked rows out.
+    """
+
+    def __init__(self, columns, code_tables, problems=None):
+        self._columns = columns
+        self._code_tables = code_tables
+        self._positions = None
+        self.problems = np.full(len(self), None, dtype=object) if problems is None else problems
+
+    @classmethod
+    def from_frame(cls, bonds_df):
+        """Build the table from a DataFrame in the bond_emissions.csv layout."""
+        columns = {}
+        code_tables = {}
+        problems = np.full(len(bonds_df), None, dtype=object)
+        for label in bonds_df.columns:
+            kind = COLUMN_KINDS.get(label, "text")
+            values = bonds_df[label]
+            raw = values.to_numpy(dtype=object)
+            if kind == "date":
+                columns[label], bad = _parse_dates(values)
+            elif kind == "float":
+                columns[label] = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+                bad = np.isnan(columns[label]) & pd.notna(raw)
+            elif kind == "text":
+                columns[label], bad = raw, None
+            else:
+                names = CODE_TABLES[label] if kind == "code" else tuple(sorted(values.dropna().astype(str).unique()))
+                columns[label], bad = _encode(raw, names)
+                code_tables[label] = np.array(names + (None,), dtype=object)
+            if bad is not None and bad.any():
+                # Keep the first problem of each row
+                first = bad & pd.isna(problems)
+                problems[first] = [f"Invalid {label}: {value}" for value in raw[first]]
+        return cls(columns, code_tables, problems)
+
+    @classmethod
+    def of(cls, bonds):
+        """Return bonds if already a BondTable, else build one from the DataFrame."""
+        return bonds if isinstance(bonds, BondTable) else cls.from_frame(bonds)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Table of some rows: BondRecords of one table or pandas rows."""
+        if rows and all(isinstance(row, BondRecord) for row in rows) and len({id(row.table) for row in rows}) == 1:
+            return rows[0].table.take([row.position for row in rows])
+        return cls.from_frame(pd.DataFrame([dict(row) for row in rows]))
+
+    def __len__(self):
+        return len(next(iter(self._columns.values()), ()))
+
+    def __contains__(self, label):
+        return label in self._columns
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def codes(self, label):
+        """Raw integer codes of a coded column."""
+        return self._columns[label]
+
+    def column(self, label):
+        """Column values; coded columns are decoded to strings (None when missing)."""
+        values = self._columns[label]
+        if label in self._code_tables:
+            # Code -1 picks the trailing None of the code table
+            return self._code_tables[label][values]
+        return values
+
+    def value(self, label, position):
+        value = self._columns[label][position]
+        if label in self._code_tables:
+            return self._code_tables[label][value]
+        return value
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.column(key)
+        return self.row(key)
+
+    def row(self, position):
+        if not -len(self) <= position < len(self):
+            raise IndexError(f"Row {position} is out of range")
+        return BondRecord(self, position % len(self))
+
+    def take(self, rows):
+        """Table of the given rows (positions, a boolean mask or a slice)."""
+        return BondTable(
+            {label: values[rows] for label, values in self._columns.items()}, self._code_tables, self.problems[rows]
+        )
+
+    def valid(self):
+        """Table of the rows without problems, and {ISIN: problem} of the rows left out."""
+        marked = pd.notna(self.problems)
+        if not marked.any():
+            return self, {}
+        rejected = dict(zip(self._columns["ISIN"][marked], self.problems[marked]))
+        isin, problem = next(iter(rejected.items()))
+        logger.warning("Left out %d bond(s) with invalid reference data, e.g. %s: %s", len(rejected), isin, problem)
+        return self.take(~marked), rejected
+
+    def position(self, isin):
+        """Row position of an ISIN, from a hash index built on first use."""
+        if self._positions is None:
+            self._positions = {isin: position for position, isin in enumerate(self._columns["ISIN"])}
+        return self._positions[isin]
+
+    def to_frame(self):
+        return pd.DataFrame({label: self.column(label) for label in self._columns})
+
+    def nbytes(self):
+        """Approximate memory held by the columns (object columns count their pointers only)."""
+        return sum(values.nbytes for values in self._columns.values())
+
+
+class BondRecord:
+    """
+    One row of a BondTable, read on demand from the columns.
+
+    Supports record["Issue Name"], record.get(label) and dict(record) like a pandas row,
+    so it can be passed wherever a bond_emissions.csv row is expected.
+    """
+
+    __slots__ = ("table", "position")
+
+    def __init__(self, table, position):
+        self.table = table
+        self.position = position
+
+    def __getitem__(self, label):
+        return self.table.value(label, self.position)
+
+    def get(self, label, default=None):
+        if label not in self.table:
+            return default
+        return self[label]
+
+    def keys(self):
+        return self.table.columns
+
+    def __iter__(self):
+        return iter(self.table.columns)
+
+    def __len__(self):
+        return len(self.table.columns)
+
+    def __contains__(self, label):
+        return label in self.table
+
+    def values(self):
+        return [self[label] for label in self.table.columns]
+
+    def items(self):
+        return [(label, self[label]) for label in self.table.columns]
+
+    def __repr__(self):
+        return f"BondRecord({self['ISIN']!r})"
@@ -0,0 +1,126 @@
+import numpy as np
+
+
+# Holidays as fixed (month, day) dates and as day offsets from Easter Sunday, per
+# jurisdiction (the Jurisdiction column of bond_emissions.csv). Unknown jurisdictions
+# fall back to a weekends-only calendar.
+HOLIDAY_RULES = {
+    "TARGET": {
+        "fixed": [(1, 1), (5, 1), (12, 25), (12, 26)],
+        "easter": [-2, 1],
+    },
+    "Germany": {
+        "fixed": [(1, 1), (5, 1), (10, 3), (12, 25), (12, 26)],
+        "easter": [-2, 1, 39, 50],
+    },
+    "Austria": {
+        "fixed": [(1, 1), (1, 6), (5, 1), (8, 15), (10, 26), (11, 1), (12, 8), (12, 25), (12, 26)],
+        "easter": [1, 39, 50, 60],
+    },
+    "Slovakia": {
+        "fixed": [(1, 1), (1, 6), (5, 1), (5, 8), (7, 5), (8, 29), (9, 15), (11, 1), (11, 17),
+                  (12, 24), (12, 25), (12, 26)],
+        "easter": [-2, 1],
+    },
+    "Czech Republic": {
+        "fixed": [(1, 1), (5, 1), (5, 8), (7, 5), (7, 6), (9, 28), (10, 28), (11, 17),
+                  (12, 24), (12, 25), (12, 26)],
+        "easter": [-2, 1],
+    },
+}
+# Years covered by the precomputed holiday sets
+CALENDAR_YEARS = (1950, 2150)
+BUSINESS_DAY_CONVENTIONS = ("Following", "MODFOLLOWING", "Preceding", "MODPRECEDING")
+
+_calendars = {}
+
+
+def easter_sunday(years):
+    """Gregorian Easter Sunday for an array of years (Meeus/Jones/Butcher algorithm)."""
+    a = years % 19
+    b, c = years // 100, years % 100
+    g = (b - (b + 8) // 25 + 1) // 3
+    h = (19 * a + b - b // 4 - g + 15) % 30
+    l = (32 + 2 * (b % 4) + 2 * (c // 4) - h - c % 4) % 7
+    f = h + l - 7 * ((a + 11 * h + 22 * l) // 451) + 114
+    month = f // 31
+    day = f % 31 + 1
+    return _dates(years, month, day)
+
+
+def _dates(years, month, day):
+    months = (years - 1970) * 12 + (month - 1)
+    return months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1).astype("timedelta64[D]")
+
+
+def holidays(jurisdiction, years=CALENDAR_YEARS):
+    """Sorted holiday dates of a jurisdiction between the given years."""
+    rules = HOLIDAY_RULES.get(jurisdiction)
+    if rules is None:
+        return np.array([], dtype="datetime64[D]")
+    all_years = np.arange(years[0], years[1] + 1)
+    fixed = [_dates(all_years, month, np.full(len(all_years), day)) for month, day in rules["fixed"]]
+    easter = easter_sunday(all_years)
+    moveable = [easter + np.timedelta64(offset, "D") for offset in rules["easter"]]
+    return np.unique(np.concatenate(fixed + moveable))
+
+
+def business_day_calendar(jurisdiction=None):
+    """NumPy busdaycalendar of a jurisdiction, built once per process."""
+    if not isinstance(jurisdiction, str):
+        jurisdiction = None
+    calendar = _calendars.get(jurisdiction)
+    if calendar is None:
+        calendar = np.busdaycalendar(holidays=holidays(jurisdiction))
+        _calendars[jurisdiction] = calendar
+    return calendar
+
+
+def _adjust(dates, convention, calendar):
+    # Schedules repeat the same dates across many bonds: when the span of days is smaller
+    # than the number of dates, adjust every day of the span once and look the dates up
+    if dates.size == 0:
+        return dates.copy()
+    first = dates.min()
+    span = int((dates.max() - first).astype(np.int64)) + 1
+    if span < dates.size:
+        return _adjust(first + np.arange(span), convention, calendar)[(dates - first).astype(np.int64)]
+
+    following = np.busday_offset(dates, 0, roll="forward", busdaycal=calendar)
+    preceding = np.busday_offset(dates, 0, roll="backward", busdaycal=calendar)
+    if convention == "Following":
+        return following
+    if convention == "Preceding":
+        return preceding
+    # Modified conventions roll the other way when the first roll leaves the month
+    if convention == "MODFOLLOWING":
+        month_changed = following.astype("datetime64[M]") != dates.astype("datetime64[M]")
+        return np.where(month_changed, preceding, following)
+    if convention == "MODPRECEDING":
+        month_changed = preceding.astype("datetime64[M]") != dates.astype("datetime64[M]")
+        return np.where(month_changed, following, preceding)
+    raise ValueError(f"Unsupported convention: {convention}")
+
+
+def adjust_dates(dates, conventions, jurisdictions=None):
+    """
+    Roll datetime64[D] dates onto business days.
+
+    dates is a (bond x date) or 1-d array; conventions and jurisdictions hold one value per
+    row (or a single value) and the adjustment runs once per distinct pair, not per date.
+    """
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    rows = dates.shape[0] if dates.ndim else 1
+    conventions = np.broadcast_to(np.asarray(conventions, dtype=object), (rows,))
+    if jurisdictions is None:
+        jurisdictions = np.full(rows, None, dtype=object)
+    jurisdictions = np.broadcast_to(np.asarray(jurisdictions, dtype=object), (rows,))
+    # Missing jurisdictions (NaN in the CSV) use the weekends-only calendar
+    jurisdictions = np.array([j if isinstance(j, str) else "" for j in jurisdictions], dtype=object)
+
+    row_dates = dates.reshape(rows, -1)
+    adjusted = np.empty_like(row_dates)
+    for convention, jurisdiction in set(zip(conventions, jurisdictions)):
+        selected = (conventions == convention) & (jurisdictions == jurisdiction)
+        adjusted[selected] = _adjust(row_dates[selected], convention, business_day_calendar(jurisdiction or None))
+    return adjusted.reshape(dates.shape)
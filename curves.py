@@ -0,0 +1,198 @@
+import hashlib
+
+import pandas as pd
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+from instrumentation import METRICS, timed_stage
+
+
+INTERPOLATION_METHODS = ("linear", "log_linear", "monotone_cubic")
+
+
+def to_day(date):
+    """Normalise a date (string, Timestamp, datetime64...) to a numpy datetime64[D] key."""
+    if isinstance(date, np.datetime64):
+        return date.astype("datetime64[D]")
+    return np.datetime64(pd.Timestamp(date).date(), "D")
+
+
+class DiscountCurve:
+    """
+    One yield curve prepared for repeated evaluation.
+
+    Built once per (currency, observation date) from tenors sorted ascending and the
+    annually compounded zero rates at them. Rates are interpolated on the zero rate
+    ("linear", as FixedBond always did), on the log discount factor ("log_linear") or
+    with a monotone cubic (PCHIP) spline on the zero rate ("monotone_cubic"); all methods
+    stay flat beyond the first and last tenor. Shifted and bumped copies reuse the tenors.
+    """
+
+    def __init__(self, tenors, rates, interpolation="linear"):
+        if interpolation not in INTERPOLATION_METHODS:
+            raise ValueError(f"Unsupported interpolation: {interpolation}")
+        self.tenors = tenors
+        self.rates = rates
+        self.interpolation = interpolation
+        self.node_discount_factors = (1 + rates) ** -tenors
+        self._spline = None
+        if interpolation == "monotone_cubic" and len(tenors) > 1:
+            self._spline = PchipInterpolator(tenors, rates, extrapolate=False)
+
+    def __len__(self):
+        return len(self.tenors)
+
+    def zero_rates(self, times):
+        """Zero rates at any array of times (in years)."""
+        times = np.asarray(times, dtype=float)
+        tenors, rates = self.tenors, self.rates
+        if self.interpolation == "linear" or len(tenors) == 1:
+            return np.interp(times, tenors, rates)
+        clipped = np.clip(times, tenors[0], tenors[-1])
+        if self.interpolation == "monotone_cubic":
+            return self._spline(clipped)
+
+        # Log-linear discount factors between the nodes, flat rates outside them
+        log_discount = np.interp(clipped, tenors, np.log(self.node_discount_factors))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            inner = np.expm1(-log_discount / clipped)
+        return np.where(times <= tenors[0], rates[0], np.where(times >= tenors[-1], rates[-1], inner))
+
+    def discount_factors(self, times, shift=0):
+        """Discount factors at times, with rates moved in parallel by shift (in %)."""
+        times = np.asarray(times, dtype=float)
+        return (1 + self.zero_rates(times) + shift / 100) ** -times
+
+    def _with_rates(self, rates):
+        return DiscountCurve(self.tenors, rates, self.interpolation)
+
+    def shifted(self, shift):
+        """Copy of the curve with every rate moved by shift (in %)."""
+        return self._with_rates(self.rates + shift / 100)
+
+    def bumped(self, node, bump):
+        """Copy of the curve with the rate of one node moved by bump (in rate units)."""
+        rates = self.rates.copy()
+        rates[node] += bump
+        return self._with_rates(rates)
+
+
+class YieldCurveStore:
+    """
+    In-memory index of yield curves.
+
+    The curve history is parsed and sorted once into NumPy tenor/rate arrays keyed by
+    (currency, observation_date), so looking a curve up is a dict access no matter how
+    many days and currencies are loaded. version identifies the loaded data (e.g. the
+    file modification time) so results computed from it can be cached safely.
+    """
+
+    def __init__(self, yield_curves_df, version=None):
+        currencies = yield_curves_df["currency"].to_numpy()
+        dates = np.asarray(pd.to_datetime(yield_curves_df["observation_date"]), dtype="datetime64[D]")
+        tenors = yield_curves_df["tenor"].to_numpy(dtype=float)
+        rates = yield_curves_df["rate"].to_numpy(dtype=float)
+
+        # Sort by currency, date and tenor, then cut the arrays into one slice per curve
+        order = np.lexsort((tenors, dates, currencies))
+        self._index(currencies[order], dates[order], tenors[order], rates[order], version)
+
+    @classmethod
+    def from_sorted(cls, currencies, dates, tenors, rates, currency_names=None, version=None):
+        """
+        Build a store from arrays already sorted by currency, date and tenor.
+
+        The curves are slices (views) of tenors and rates, so arrays backed by a memory
+        mapped file stay shared instead of being copied. currencies may hold integer
+        codes into currency_names (e.g. a dictionary encoded Arrow column).
+        """
+        store = cls.__new__(cls)
+        store._index(currencies, dates, tenors, rates, version, currency_names)
+        return store
+
+    def _index(self, currencies, dates, tenors, rates, version, currency_names=None):
+        self.version = version
+        self._curves = {}
+        self._discount_curves = {}
+        self._fingerprints = {}
+        self._dates = {}
+        if len(dates) == 0:
+            return
+        starts = np.flatnonzero(
+            np.r_[True, (currencies[1:] != currencies[:-1]) | (dates[1:] != dates[:-1])]
+        )
+        ends = np.r_[starts[1:], len(dates)]
+
+        for start, end in zip(starts, ends):
+            currency = currencies[start] if currency_names is None else currency_names[currencies[start]]
+            self._curves[(currency, dates[start])] = (tenors[start:end], rates[start:end])
+            self._dates.setdefault(currency, []).append(dates[start])
+        self._dates = {currency: np.array(days, dtype="datetime64[D]") for currency, days in self._dates.items()}
+
+    @classmethod
+    def of(cls, yield_curves):
+        """Return yield_curves if it already is a store, otherwise index the DataFrame."""
+        if isinstance(yield_curves, cls):
+            return yield_curves
+        return cls(yield_curves)
+
+    def __len__(self):
+        return len(self._curves)
+
+    def __contains__(self, key):
+        currency, observation_date = key
+        return (currency, to_day(observation_date)) in self._curves
+
+    def currencies(self):
+        return sorted(self._dates)
+
+    def observation_dates(self, currency=None):
+        """Sorted observation dates for one currency, or for all currencies."""
+        if currency is not None:
+            return self._dates.get(currency, np.array([], dtype="datetime64[D]"))
+        if not self._dates:
+            return np.array([], dtype="datetime64[D]")
+        return np.unique(np.concatenate(list(self._dates.values())))
+
+    def curve(self, currency, observation_date):
+        """Return the (tenors, rates) arrays of a curve, sorted by tenor."""
+        try:
+            return self._curves[(currency, to_day(observation_date))]
+        except KeyError:
+            raise ValueError(f"No yield curve data available for the selected trade date and currency: {currency}")
+
+    @timed_stage("curve_lookup")
+    def discount_curve(self, currency, observation_date, interpolation="linear"):
+        """DiscountCurve of a curve, built on first use and shared by later valuations."""
+        key = (currency, to_day(observation_date), interpolation)
+        discount_curve = self._discount_curves.get(key)
+        if discount_curve is None:
+            tenors, rates = self.curve(currency, observation_date)
+            discount_curve = DiscountCurve(tenors, rates, interpolation)
+            self._discount_curves[key] = discount_curve
+            METRICS.count("discount_curves_built")
+        return discount_curve
+
+    def fingerprint(self, currency, observation_date):
+        """
+        Short hash of a curve's tenors and rates. It changes only when that curve changes, so
+        results stored with it (see blotter.py) stay valid across reloads of other curves.
+        """
+        key = (currency, to_day(observation_date))
+        fingerprint = self._fingerprints.get(key)
+        if fingerprint is None:
+            tenors, rates = self.curve(currency, observation_date)
+            digest = hashlib.blake2b(digest_size=8)
+            digest.update(np.ascontiguousarray(tenors, dtype=float).tobytes())
+            digest.update(np.ascontiguousarray(rates, dtype=float).tobytes())
+            fingerprint = self._fingerprints[key] = digest.hexdigest()
+        return fingerprint
+
+    def curve_frame(self, currency, observation_date):
+        """One curve as a DataFrame with the yieldCurves.csv columns."""
+        tenors, rates = self.curve(currency, observation_date)
+        return pd.DataFrame({
+            "currency": currency,
+            "observation_date": to_day(observation_date),
+            "tenor": tenors,
+            "rate": rates,
+        })
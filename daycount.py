@@ -0,0 +1,109 @@
+import numpy as np
+
+
+DAY_COUNT_CONVENTIONS = ("ACT/360", "30/360", "ACT/365", "30E/360", "30/360 US", "ACT/ACT ISDA", "ACT/ACT ICMA")
+# Denominator of the year fraction for the fixed basis conventions
+YEAR_BASIS = {"ACT/360": 360, "30/360": 360, "ACT/365": 365, "30E/360": 360, "30/360 US": 360}
+
+
+def date_parts(dates):
+    """Split a datetime64[D] array into integer year, month and day arrays."""
+    # Integer civil-from-days conversion, much cheaper than casting to datetime64[Y]/[M]
+    z = dates.astype(np.int64) + 719468
+    era = z // 146097
+    day_of_era = z - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = np.where(shifted_month < 10, shifted_month + 3, shifted_month - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+    return year, month, day
+
+
+def add_months(dates, months):
+    """Move datetime64[D] dates by whole months, clipping the day to the end of the month."""
+    _, _, day = date_parts(dates)
+    target = dates.astype("datetime64[M]") + np.asarray(months).astype("timedelta64[M]")
+    days_in_month = ((target + 1).astype("datetime64[D]") - target.astype("datetime64[D]")).astype(np.int64)
+    return target.astype("datetime64[D]") + (np.minimum(day, days_in_month) - 1).astype("timedelta64[D]")
+
+
+def validate(conventions):
+    unsupported = set(np.ravel(conventions)) - set(DAY_COUNT_CONVENTIONS)
+    if unsupported:
+        raise ValueError(f"Unsupported day count convention: {unsupported.pop()}")
+
+
+def day_counts(start_dates, end_dates, conventions, start_parts=None, end_parts=None):
+    """
+    Days between datetime64[D] arrays; conventions broadcast against the dates.
+
+    30/360 and 30E/360 move every 31st to the 30th; 30/360 US is the bond basis (the end
+    day only becomes 30 when the start day is 30 or 31). The other conventions count
+    actual days. start_parts and end_parts may pass date_parts of the dates already split.
+    """
+    actual = (end_dates - start_dates).astype(np.int64)
+    is_30e = (conventions == "30/360") | (conventions == "30E/360")
+    is_us = conventions == "30/360 US"
+    if not (np.any(is_30e) or np.any(is_us)):
+        return np.broadcast_to(actual, np.broadcast(actual, conventions).shape).copy()
+
+    start_year, start_month, start_day = date_parts(start_dates) if start_parts is None else start_parts
+    end_year, end_month, end_day = date_parts(end_dates) if end_parts is None else end_parts
+    start_day = np.minimum(start_day, 30)
+    end_day_30e = np.minimum(end_day, 30)
+    end_day_us = np.where(start_day == 30, end_day_30e, end_day)
+    days_360 = (end_year - start_year) * 360 + (end_month - start_month) * 30 - start_day
+
+    return np.where(is_30e, days_360 + end_day_30e, np.where(is_us, days_360 + end_day_us, actual))
+
+
+def year_fractions(start_dates, end_dates, conventions, reference_start=None, reference_end=None, frequency=1,
+                   days=None, start_parts=None, end_parts=None):
+    """
+    Year fractions between datetime64[D] arrays; all arguments broadcast together.
+
+    ACT/ACT ISDA splits the days by calendar year (366 day basis in leap years). ACT/ACT ICMA
+    divides by frequency times the days of the reference coupon period, which defaults to
+    the period itself, so a regular coupon period is exactly 1 / frequency. days may pass
+    day counts already computed with day_counts, start_parts and end_parts date_parts.
+    """
+    if days is None:
+        days = day_counts(start_dates, end_dates, conventions, start_parts, end_parts)
+    basis = np.select(
+        [conventions == name for name in YEAR_BASIS],
+        list(YEAR_BASIS.values()),
+        default=360,
+    )
+    fractions = days / basis
+
+    # The ACT/ACT branches are only evaluated when they are used
+    is_isda = conventions == "ACT/ACT ISDA"
+    if np.any(is_isda):
+        # Whole years between the start and end years, plus both broken years
+        start_year = (date_parts(start_dates) if start_parts is None else start_parts)[0]
+        end_year = (date_parts(end_dates) if end_parts is None else end_parts)[0]
+        isda = (
+            (end_year - start_year)
+            + _days_into_year(end_dates, end_year) / _days_in_year(end_year)
+            - _days_into_year(start_dates, start_year) / _days_in_year(start_year)
+        )
+        fractions = np.where(is_isda, isda, fractions)
+
+    is_icma = conventions == "ACT/ACT ICMA"
+    if np.any(is_icma):
+        if reference_start is None:
+            reference_start, reference_end = start_dates, end_dates
+        reference_days = np.maximum((reference_end - reference_start).astype(np.int64), 1)
+        fractions = np.where(is_icma, days / (np.asarray(frequency) * reference_days), fractions)
+    return fractions
+
+
+def _days_in_year(years):
+    return np.where((years % 4 == 0) & ((years % 100 != 0) | (years % 400 == 0)), 366, 365)
+
+
+def _days_into_year(dates, years):
+    first_day = (years - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+    return (dates - first_day).astype(np.int64)
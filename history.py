@@ -0,0 +1,84 @@
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+from curves import YieldCurveStore, to_day
+from schedules import CashFlowMatrix, PaymentSchedule
+from solver import solve_yields
+
+
+HISTORY_COLUMNS = ["Date", "NPV", "YTM (%)", "Macaulay Duration", "Modified Duration", "Daily P&L"]
+# Curve dates between progress reports of revalue_history
+PROGRESS_EVERY = 64
+
+
+def revaluation_dates(yield_curve_store, currency, start=None, end=None):
+    """Observation dates of the currency's curves, optionally limited to [start, end]."""
+    dates = yield_curve_store.observation_dates(currency)
+    if start is not None:
+        dates = dates[dates >= to_day(start)]
+    if end is not None:
+        dates = dates[dates <= to_day(end)]
+    return dates
+
+
+def revalue_history(bond_data, yield_curves, number_of_pieces=1, start=None, end=None, shift=0,
+                    interpolation="linear", progress=None):
+    """
+    NPV, YTM and duration of a position on every curve observation date, plus daily P&L
+    (change in NPV plus the coupons and principal paid since the previous date).
+
+    The payment schedule is generated once and repeated for every date; only the trade
+    date dependent parts (valued flows, days and times to payment) are recomputed, for all
+    dates together on one (date x payment) matrix. As in the batch engine, YTM and durations
+    are solved at the model NPV of each date. Dates after the last payment are left out.
+    progress, if given, is called as progress(fraction, message) while the curves are read
+    (see jobs.Job.report).
+    """
+    yield_curve_store = YieldCurveStore.of(yield_curves)
+    currency = bond_data["Nominal Value Currency"]
+    dates = revaluation_dates(yield_curve_store, currency, start, end)
+
+    schedule = PaymentSchedule.from_frame(BondTable.from_rows([bond_data]))
+    matrix = CashFlowMatrix(schedule.take(np.zeros(len(dates), dtype=int)), dates, number_of_pieces)
+    alive = matrix.mask.any(axis=1)
+    dates = dates[alive]
+    if not len(dates):
+        return pd.DataFrame(columns=HISTORY_COLUMNS)
+
+    mask = matrix.mask[alive]
+    time_to_payment = matrix.time_to_payment[alive]
+    cash_flows = (matrix.coupon + matrix.principal)[alive]
+
+    # Each row is discounted on the curve of its own date
+    rates = np.empty(time_to_payment.shape)
+    for row, observation_date in enumerate(dates):
+        if progress is not None and row % PROGRESS_EVERY == 0:
+            progress(0.9 * row / len(dates), f"Discounting on {observation_date}")
+        curve = yield_curve_store.discount_curve(currency, observation_date, interpolation)
+        rates[row] = curve.zero_rates(time_to_payment[row])
+    discount_factors = (1 + rates + shift / 100) ** time_to_payment
+    npv = np.where(mask, cash_flows / discount_factors, 0.0).sum(axis=1)
+
+    periods_per_year = 2 if bond_data["Coupon Frequency"] == "Semi-Annual" else 1
+    if progress is not None:
+        progress(0.9, "Solving yields")
+    analytics = solve_yields(
+        cash_flows,
+        np.where(mask, matrix.days_from_trade_date[alive], 0),
+        npv,
+        periods_per_year=periods_per_year,
+        shift=shift,
+    )
+    # A flow is still valued on its payment date, so it leaves the NPV on the next curve
+    # date; add it back there so that payment dates do not show up as losses
+    paid = np.where(
+        mask[:-1] & (matrix.payment_dates[alive][:-1] < dates[1:, None]), cash_flows[:-1], 0.0
+    ).sum(axis=1)
+    return pd.DataFrame({
+        "Date": pd.to_datetime(dates),
+        "NPV": npv,
+        "YTM (%)": np.where(analytics.converged, analytics.ytm, np.nan),
+        "Macaulay Duration": analytics.macaulay_duration,
+        "Modified Duration": analytics.modified_duration,
+        "Daily P&L": np.r_[np.nan, np.diff(npv) + paid],
+    })
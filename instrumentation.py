@@ -0,0 +1,100 @@
+"""
+Logging setup and timing/counter hooks for the valuation hot paths.
+
+Stages (curve lookup, schedule generation, discounting, YTM solve) are timed with
+METRICS.timed(stage) and events are counted with METRICS.count(name). The figures are
+shown in the app's performance panel and written by batch_valuation.py --metrics.
+The log level comes from the TREASURY_LOG_LEVEL environment variable (default WARNING).
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+
+def configure_logging(level=None):
+    """Configure the root logger once; level defaults to $TREASURY_LOG_LEVEL or WARNING."""
+    level = level or os.environ.get("TREASURY_LOG_LEVEL", "WARNING")
+    logging.basicConfig(level=level.upper(), format=LOG_FORMAT)
+    logging.getLogger().setLevel(level.upper())
+
+
+class Metrics:
+    """
+    Process wide stage timings and event counters.
+
+    Thread safe, so the Streamlit sessions of one server share a single set of figures.
+    Worker processes keep their own; merge their snapshots into the parent's.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._timings = {}
+            self._counters = {}
+
+    @contextmanager
+    def timed(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started)
+
+    def record(self, stage, seconds, calls=1):
+        with self._lock:
+            timing = self._timings.setdefault(stage, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+            timing["calls"] += calls
+            timing["total_seconds"] += seconds
+            timing["max_seconds"] = max(timing["max_seconds"], seconds)
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + int(amount)
+
+    def snapshot(self):
+        """Copy of the figures: {"timings": {stage: {...}}, "counters": {name: n}}."""
+        with self._lock:
+            timings = {stage: dict(timing) for stage, timing in self._timings.items()}
+            counters = dict(self._counters)
+        for timing in timings.values():
+            timing["mean_seconds"] = timing["total_seconds"] / timing["calls"] if timing["calls"] else 0.0
+        return {"timings": timings, "counters": counters}
+
+    def merge(self, snapshot):
+        """Add the figures of another snapshot (e.g. from a worker process)."""
+        with self._lock:
+            for stage, other in snapshot["timings"].items():
+                timing = self._timings.setdefault(stage, {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0})
+                timing["calls"] += other["calls"]
+                timing["total_seconds"] += other["total_seconds"]
+                timing["max_seconds"] = max(timing["max_seconds"], other["max_seconds"])
+            for name, amount in snapshot["counters"].items():
+                self._counters[name] = self._counters.get(name, 0) + amount
+
+    def dump(self, path):
+        with open(path, "w") as handle:
+            json.dump(self.snapshot(), handle, indent=2)
+
+
+METRICS = Metrics()
+
+
+def timed_stage(stage):
+    """Decorator recording every call of a function under stage in METRICS."""
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with METRICS.timed(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,140 @@
+"""
+Background execution of valuation jobs for the Streamlit app.
+
+Streamlit reruns the script on every widget change, so slow work is submitted here and runs
+on a thread pool instead of inside the rerun. Jobs are keyed by their inputs. Submitting a
+key that is queued, running or finished returns the existing job instead of starting the
+work again. Work functions get a progress callback: calling it reports progress, and raises
+JobCancelled once the job is cancelled, so cancellation takes effect between steps.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from instrumentation import METRICS
+
+logger = logging.getLogger(__name__)
+
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised by Job.report inside a job that has been cancelled."""
+
+
+class Job:
+    """One submitted piece of work, its progress (0 to 1) and its result or error."""
+
+    def __init__(self, key, description=""):
+        self.key = key
+        self.description = description
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.finished_at = None
+        self._cancelled = threading.Event()
+        self._future = None
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def report(self, fraction, message=None):
+        """Progress callback of the work function; raises JobCancelled after cancel()."""
+        if self._cancelled.is_set():
+            raise JobCancelled()
+        self.progress = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def cancel(self):
+        """Stop the job: at once if still queued, at its next progress report otherwise."""
+        self._cancelled.set()
+        if self._future is not None and self._future.cancel():
+            self._finish(CANCELLED, "Cancelled")
+
+    def wait(self, timeout=None):
+        """Block until the job has finished or timeout seconds have passed."""
+        if self._future is not None:
+            wait([self._future], timeout=timeout)
+        return not self.active
+
+    def _finish(self, status, message):
+        self.status = status
+        self.message = message
+        self.finished_at = time.time()
+
+
+class JobRunner:
+    """
+    Thread pool running keyed jobs, shared by all sessions of a server.
+
+    Finished jobs are kept (the max_finished most recent) so a repeated request is answered
+    from the finished job; failed and cancelled jobs are replaced when submitted again.
+    """
+
+    def __init__(self, max_workers=2, max_finished=64):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="valuation-job")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_finished = max_finished
+
+    def submit(self, key, function, *args, description="", **kwargs):
+        """Run function(*args, progress=..., **kwargs) in the background, or join the job with the same key."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status in (QUEUED, RUNNING, DONE):
+                self._jobs.move_to_end(key)
+                METRICS.count("jobs_deduplicated")
+                return job
+            job = Job(key, description)
+            self._jobs[key] = job
+            job._future = self._executor.submit(self._run, job, function, args, kwargs)
+            METRICS.count("jobs_submitted")
+            self._trim()
+        return job
+
+    def _run(self, job, function, args, kwargs):
+        if job._cancelled.is_set():
+            job._finish(CANCELLED, "Cancelled")
+            return
+        job.status = RUNNING
+        job.message = "Running"
+        try:
+            with METRICS.timed("background_job"):
+                job.result = function(*args, progress=job.report, **kwargs)
+            job.progress = 1.0
+            job._finish(DONE, "Done")
+        except JobCancelled:
+            METRICS.count("jobs_cancelled")
+            job._finish(CANCELLED, "Cancelled")
+        except Exception as error:
+            logger.exception("Job %s failed", job.description or job.key)
+            job.error = error
+            job._finish(FAILED, str(error))
+
+    def _trim(self):
+        finished = [key for key, job in self._jobs.items() if not job.active]
+        for key in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[key]
+
+    def get(self, key):
+        with self._lock:
+            return self._jobs.get(key)
+
+    def cancel(self, key):
+        job = self.get(key)
+        if job is not None:
+            job.cancel()
+        return job
+
+    def jobs(self):
+        """All kept jobs, least recently submitted first."""
+        with self._lock:
+            return list(self._jobs.values())
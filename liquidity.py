@@ -0,0 +1,196 @@
+"""
+Liquidity ladder and gap report of a bond book.
+
+Projected (undiscounted) cash in and out per time bucket and currency. Schedules are
+generated chunk by chunk and each chunk is added into per currency NumPy accumulators
+before the next one is built, so peak memory depends on the chunk size, not on the number
+of positions. Fixed rate coupons come from the terms; floating rate coupons are projected
+from the curve of the as of date, note by note.
+
+Example:
+    python liquidity.py --bonds bond_emissions.csv --curves yieldCurves.csv --date 2024-06-28 --buckets Monthly
+"""
+import argparse
+import logging
+
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+from curves import YieldCurveStore, to_day
+from instrumentation import METRICS, configure_logging, timed_stage
+from schedules import CashFlowMatrix
+from valuation import bond_class
+import storage
+
+logger = logging.getLogger(__name__)
+
+
+# Bucket granularity -> calendar offset of one bucket, and the default number of buckets
+BUCKET_SIZES = {
+    "Weekly": (pd.DateOffset(weeks=1), 26),
+    "Monthly": (pd.DateOffset(months=1), 24),
+    "Yearly": (pd.DateOffset(years=1), 30),
+}
+BEYOND = "Beyond"
+
+GAP_COLUMNS = ["Currency", "Bucket", "Start", "End", "Inflows", "Outflows", "Net Gap", "Cumulative Gap"]
+
+
+def bucket_edges(as_of, granularity="Monthly", count=None):
+    """count + 1 bucket edges from as_of; bucket i holds payments in [edge i, edge i + 1)."""
+    if granularity not in BUCKET_SIZES:
+        raise ValueError(f"Unsupported bucket granularity: {granularity}")
+    offset, default_count = BUCKET_SIZES[granularity]
+    start = pd.Timestamp(to_day(as_of))
+    return np.array([start + offset * index for index in range(int(count or default_count) + 1)], dtype="datetime64[D]")
+
+
+class LiquidityLadder:
+    """
+    Running inflow and outflow totals per currency and bucket.
+
+    Payments at or after the last edge go to a final "Beyond" bucket. Amounts are signed:
+    positive amounts are cash received, negative amounts cash paid.
+    """
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype="datetime64[D]")
+        self.inflows = {}
+        self.outflows = {}
+        self.payments = 0
+
+    @property
+    def bucket_count(self):
+        return len(self.edges)  # len(edges) - 1 buckets, plus Beyond
+
+    def _accumulators(self, currency):
+        if currency not in self.inflows:
+            self.inflows[currency] = np.zeros(self.bucket_count)
+            self.outflows[currency] = np.zeros(self.bucket_count)
+        return self.inflows[currency], self.outflows[currency]
+
+    def add(self, currency, payment_dates, amounts):
+        """Add payments of one currency; payments before the first edge are ignored."""
+        payment_dates = np.asarray(payment_dates, dtype="datetime64[D]")
+        amounts = np.asarray(amounts, dtype=float)
+        buckets = np.searchsorted(self.edges, payment_dates, side="right") - 1
+        valued = buckets >= 0
+        buckets, amounts = buckets[valued], amounts[valued]
+        inflows, outflows = self._accumulators(currency)
+        inflows += np.bincount(buckets, weights=np.maximum(amounts, 0.0), minlength=self.bucket_count)
+        outflows += np.bincount(buckets, weights=np.minimum(amounts, 0.0), minlength=self.bucket_count)
+        self.payments += len(amounts)
+
+    def labels(self):
+        return [str(start) for start in self.edges[:-1]] + [BEYOND]
+
+    def to_frame(self):
+        """Gap report: one row per currency and bucket, with the cumulative net gap per currency."""
+        frames = []
+        starts = self.edges
+        ends = np.r_[self.edges[1:] - np.timedelta64(1, "D"), np.datetime64("NaT", "D")]
+        for currency in sorted(self.inflows):
+            net = self.inflows[currency] + self.outflows[currency]
+            frames.append(pd.DataFrame({
+                "Currency": currency,
+                "Bucket": self.labels(),
+                "Start": pd.to_datetime(starts).strftime("%Y-%m-%d"),
+                "End": pd.to_datetime(ends).strftime("%Y-%m-%d"),
+                "Inflows": self.inflows[currency],
+                "Outflows": self.outflows[currency],
+                "Net Gap": net,
+                "Cumulative Gap": np.cumsum(net),
+            }))
+        if not frames:
+            return pd.DataFrame(columns=GAP_COLUMNS)
+        return pd.concat(frames, ignore_index=True)
+
+
+@timed_stage("liquidity_ladder")
+def liquidity_ladder(bonds, pieces, yield_curves, as_of, granularity="Monthly", count=None, chunk_size=2000,
+                     interpolation="linear", progress=None):
+    """
+    Liquidity ladder of a book: bonds (BondTable or DataFrame) held in the signed pieces.
+
+    Returns the LiquidityLadder and the ISINs of the floating rate notes that could not be
+    projected (no curve of their currency on as_of). progress, if given, is called as
+    progress(fraction, message) after every chunk (see jobs.Job.report).
+    """
+    bonds = BondTable.of(bonds)
+    pieces = np.broadcast_to(np.asarray(pieces, dtype=float), (len(bonds),))
+    yield_curve_store = YieldCurveStore.of(yield_curves)
+    as_of = to_day(as_of)
+    ladder = LiquidityLadder(bucket_edges(as_of, granularity, count))
+
+    floating = ~pd.isna(bonds["Reference Rate Code"])
+    live = (bonds["Maturity Date"] >= as_of) & (pieces != 0)
+    fixed_rows = np.flatnonzero(live & ~floating)
+    floating_rows = np.flatnonzero(live & floating)
+    unprojected = []
+
+    total = max(len(fixed_rows) + len(floating_rows), 1)
+    for start in range(0, len(fixed_rows), chunk_size):
+        rows = fixed_rows[start:start + chunk_size]
+        chunk = bonds.take(rows)
+        matrix = CashFlowMatrix.from_frame(chunk, as_of, pieces[rows])
+        amounts = matrix.coupon + matrix.principal
+        currency = chunk["Nominal Value Currency"]
+        for name in np.unique(currency):
+            selected = matrix.mask & (currency == name)[:, None]
+            ladder.add(name, matrix.payment_dates[selected], amounts[selected])
+        if progress is not None:
+            progress((start + len(rows)) / total, f"{start + len(rows)} of {total} positions")
+
+    for done, row in enumerate(floating_rows, start=len(fixed_rows) + 1):
+        bond = bonds.row(row)
+        currency = bond["Nominal Value Currency"]
+        if (currency, as_of) not in yield_curve_store:
+            unprojected.append(bond["ISIN"])
+            continue
+        note = bond_class(bond)(
+            bond, yield_curve_store, as_of, currency, bond["Principal Payment Frequency"], bond["Coupon Frequency"],
+            interpolation=interpolation,
+        )
+        schedule = note.cash_flow_schedule()
+        ladder.add(currency, schedule.payment_dates, (schedule.coupon + schedule.principal) * pieces[row])
+        if progress is not None and done % 100 == 0:
+            progress(done / total, f"{done} of {total} positions")
+
+    METRICS.count("liquidity_payments", ladder.payments)
+    logger.debug("Bucketed %d payments of %d positions", ladder.payments, total)
+    return ladder, unprojected
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Liquidity ladder of a bond inventory, one piece of every bond.")
+    parser.add_argument("--bonds", default="bond_emissions.csv", help="bond inventory in bond_emissions.csv format (or converted .arrow)")
+    parser.add_argument("--curves", default="yieldCurves.csv", help="yield curves in yieldCurves.csv format (or converted .arrow)")
+    parser.add_argument("--date", help="as of date (defaults to the latest curve date)")
+    parser.add_argument("--buckets", choices=list(BUCKET_SIZES), default="Monthly", help="bucket granularity")
+    parser.add_argument("--count", type=int, help="number of buckets before Beyond")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="bonds per schedule chunk")
+    parser.add_argument("--output", help="optional gap report file (.csv or .parquet)")
+    parser.add_argument("--log-level", help="logging level (defaults to $TREASURY_LOG_LEVEL or WARNING)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    bonds, rejected = BondTable.from_frame(storage.read_bond_emissions(args.bonds)).valid()
+    yield_curve_store = YieldCurveStore(storage.read_yield_curves(args.curves))
+    as_of = args.date or yield_curve_store.observation_dates()[-1]
+    ladder, unprojected = liquidity_ladder(bonds, 1, yield_curve_store, as_of, args.buckets, args.count, args.chunk_size)
+    report = ladder.to_frame()
+    if args.output:
+        if args.output.endswith(".parquet"):
+            report.to_parquet(args.output, index=False)
+        else:
+            report.to_csv(args.output, index=False)
+    else:
+        print(report.to_string(index=False))
+    if unprojected:
+        print(f"Skipped {len(unprojected)} floating rate note(s) with no curve on {as_of}")
+    if rejected:
+        print(f"Skipped {len(rejected)} bond(s) with invalid reference data")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Monte Carlo rate scenarios with portfolio VaR and expected shortfall.
+
+The short rate of every currency follows a one factor Hull-White model fitted exactly to
+the stored curve of the valuation date. Mean reversion and volatility are estimated from
+the stored curve history (an AR(1) fit of the short end), and the factors of different
+currencies are correlated like their historical short rate moves. Only the curve at the
+horizon matters for the P&L, so each path draws the factor at the horizon exactly and
+revalues every cash flow on the simulated curve.
+
+Cash flows are summed per (currency, time to payment) first. A path then costs one
+exponential per distinct payment time, however many bonds pay on it. Paths are processed
+in chunks of at most MAX_CHUNK_ELEMENTS (path x payment time) entries, optionally across
+a process pool:
+    python montecarlo.py --bonds bond_emissions.csv --curves yieldCurves.csv --paths 100000 --horizon 10
+"""
+import argparse
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+from curves import INTERPOLATION_METHODS, YieldCurveStore
+from instrumentation import METRICS, configure_logging, timed_stage
+from portfolio import BondPortfolio
+from scenarios import MAX_CHUNK_ELEMENTS
+import storage
+
+logger = logging.getLogger(__name__)
+
+
+# Tenor (in years) of the curve rate used as the short rate when calibrating
+SHORT_RATE_TENOR = 0.25
+# Curve history used for calibration: at most HISTORY_WINDOW dates, at least MIN_HISTORY
+HISTORY_WINDOW = 250
+MIN_HISTORY = 20
+# Parameters used without enough history, in the units of the yieldCurves.csv rate column
+DEFAULT_MEAN_REVERSION = 0.1
+DEFAULT_VOLATILITY = 0.01
+# Lower bound on the mean reversion, keeps the variance terms numerically stable
+MIN_MEAN_REVERSION = 1e-3
+CONFIDENCE_LEVELS = (0.99, 0.975)
+
+
+class HullWhiteModel:
+    """
+    One factor Hull-White short rate model of one currency.
+
+    r(t) = x(t) + alpha(t), with x mean reverting at speed mean_reversion and alpha chosen so
+    that the model reproduces the discount factors of discount_curve. Times are in years on
+    the days/360 basis of the valuation engine.
+    """
+
+    def __init__(self, discount_curve, mean_reversion, volatility):
+        self.discount_curve = discount_curve
+        self.mean_reversion = max(float(mean_reversion), MIN_MEAN_REVERSION)
+        self.volatility = float(volatility)
+
+    @classmethod
+    def calibrate(cls, yield_curve_store, currency, date, interpolation="linear", window=HISTORY_WINDOW):
+        """Model fitted to the curve of date, with parameters estimated from the curves up to date."""
+        dates, rates = short_rate_history(yield_curve_store, currency, date, window)
+        mean_reversion, volatility = estimate_parameters(dates, rates)
+        return cls(yield_curve_store.discount_curve(currency, date, interpolation), mean_reversion, volatility)
+
+    def _b(self, tau):
+        return (1 - np.exp(-self.mean_reversion * tau)) / self.mean_reversion
+
+    def _v(self, tau):
+        """Variance of the integrated factor over tau."""
+        a = self.mean_reversion
+        return self.volatility ** 2 / a ** 2 * (
+            tau + 2 / a * np.exp(-a * tau) - 1 / (2 * a) * np.exp(-2 * a * tau) - 3 / (2 * a)
+        )
+
+    def factor_std(self, horizon):
+        """Standard deviation of the factor x at the horizon."""
+        a = self.mean_reversion
+        return self.volatility * np.sqrt((1 - np.exp(-2 * a * horizon)) / (2 * a))
+
+    def horizon_terms(self, horizon, times):
+        """
+        (B, log_forward) such that the discount factor from the horizon to times, given the
+        factor x at the horizon, is exp(log_forward - B * x). times must be after the horizon.
+        """
+        times = np.asarray(times, dtype=float)
+        log_discount = np.log(self.discount_curve.discount_factors(np.append(times, horizon)))
+        tau = times - horizon
+        log_forward = log_discount[:-1] - log_discount[-1] + 0.5 * (self._v(tau) - self._v(times) + self._v(horizon))
+        return self._b(tau), log_forward
+
+
+def short_rate_history(yield_curve_store, currency, date, window=HISTORY_WINDOW):
+    """Observation dates up to date (the last window of them) and the short rate of each curve."""
+    dates = yield_curve_store.observation_dates(currency)
+    dates = dates[dates <= np.datetime64(pd.Timestamp(date).date(), "D")][-window:]
+    rates = np.array([np.interp(SHORT_RATE_TENOR, *yield_curve_store.curve(currency, day)) for day in dates])
+    return dates, rates
+
+
+def estimate_parameters(dates, rates):
+    """
+    Mean reversion and volatility from an AR(1) fit of a short rate series.
+
+    Falls back to the defaults without MIN_HISTORY observations, and to the default mean
+    reversion when the series does not mean revert.
+    """
+    if len(rates) < MIN_HISTORY:
+        return DEFAULT_MEAN_REVERSION, DEFAULT_VOLATILITY
+    dt = np.mean(np.diff(dates).astype(float)) / 360
+    phi, intercept = np.polyfit(rates[:-1], rates[1:], 1)
+    residual_std = np.std(rates[1:] - (phi * rates[:-1] + intercept), ddof=2)
+    if not 0 < phi < 1:
+        return DEFAULT_MEAN_REVERSION, residual_std / np.sqrt(dt)
+    mean_reversion = max(-np.log(phi) / dt, MIN_MEAN_REVERSION)
+    return mean_reversion, residual_std * np.sqrt(2 * mean_reversion / (1 - phi ** 2))
+
+
+def factor_correlation(yield_curve_store, currencies, date, window=HISTORY_WINDOW):
+    """Correlation of the daily short rate moves of the currencies (identity without enough history)."""
+    histories = [short_rate_history(yield_curve_store, currency, date, window) for currency in currencies]
+    common = histories[0][0]
+    for dates, _ in histories[1:]:
+        common = np.intersect1d(common, dates)
+    if len(currencies) == 1 or len(common) < MIN_HISTORY:
+        return np.eye(len(currencies))
+    moves = np.array([np.diff(rates[np.isin(dates, common)]) for dates, rates in histories])
+    correlation = np.corrcoef(moves)
+    return np.where(np.isfinite(correlation), correlation, np.eye(len(currencies)))
+
+
+def cash_flow_buckets(position):
+    """
+    Cash flows of a BondPortfolio or of a list of FixedBonds, summed per currency and time to
+    payment: {currency: (times, amounts)}. Amounts include the number of pieces.
+    """
+    if isinstance(position, BondPortfolio):
+        mask = position.mask
+        currencies = np.broadcast_to(position.currency[:, None], mask.shape)[mask]
+        times = position.time_to_payment[mask]
+        amounts = (position.coupon + position.principal)[mask]
+    else:
+        schedules = [bond.cash_flow_schedule() for bond in position]
+        currencies = np.concatenate([np.full(len(schedule), bond.currency_code, dtype=object)
+                                     for bond, schedule in zip(position, schedules)])
+        times = np.concatenate([schedule.time_to_payment for schedule in schedules])
+        amounts = np.concatenate([schedule.total * bond.number_of_pieces for bond, schedule in zip(position, schedules)])
+
+    buckets = {}
+    for currency in np.unique(currencies):
+        rows = currencies == currency
+        bucket_times, inverse = np.unique(times[rows], return_inverse=True)
+        buckets[currency] = (bucket_times, np.bincount(inverse, weights=amounts[rows]))
+    return buckets
+
+
+class SimulationResult:
+    """Base value and simulated horizon P&L of a portfolio, with VaR and expected shortfall."""
+
+    def __init__(self, base_value, pnl, horizon_days, parameters):
+        self.base_value = base_value
+        self.pnl = pnl
+        self.horizon_days = horizon_days
+        self.parameters = parameters
+
+    def _tail(self, confidence):
+        losses = np.sort(self.pnl)
+        return losses[:max(int(np.ceil(len(losses) * (1 - confidence))), 1)]
+
+    def var(self, confidence=0.99):
+        """Value at risk: the loss exceeded on (1 - confidence) of the paths, as a positive number."""
+        return -float(self._tail(confidence)[-1])
+
+    def expected_shortfall(self, confidence=0.99):
+        """Mean loss over the worst (1 - confidence) of the paths, as a positive number."""
+        return -float(self._tail(confidence).mean())
+
+    def summary(self, confidence_levels=CONFIDENCE_LEVELS):
+        return pd.DataFrame({
+            "Confidence": confidence_levels,
+            "VaR": [self.var(level) for level in confidence_levels],
+            "Expected Shortfall": [self.expected_shortfall(level) for level in confidence_levels],
+        })
+
+
+def simulate_chunk(terms, cholesky, factor_std, received, n_paths, seed):
+    """
+    Portfolio value at the horizon on n_paths paths; runs in a worker process.
+
+    terms holds one (amounts, B, log_forward) triple per currency, in the order of the
+    rows of cholesky and factor_std.
+    """
+    rng = np.random.default_rng(seed)
+    factors = rng.standard_normal((n_paths, len(terms))) @ cholesky.T * factor_std
+    values = np.full(n_paths, received)
+    for column, (amounts, b, log_forward) in enumerate(terms):
+        values += np.exp(log_forward[None, :] - factors[:, column, None] * b[None, :]) @ amounts
+    return values
+
+
+@timed_stage("monte_carlo")
+def simulate(position, n_paths=10000, horizon_days=10, seed=0, workers=1, window=HISTORY_WINDOW,
+             chunk_elements=MAX_CHUNK_ELEMENTS):
+    """
+    Simulate the horizon P&L of a BondPortfolio (or a list of FixedBonds on one trade date).
+
+    The models are calibrated to the position's curve store, trade date and interpolation.
+    Cash flows paid before the horizon count at face value. Results do not depend on
+    workers: every chunk draws from its own seed spawned from seed.
+    """
+    first = position if isinstance(position, BondPortfolio) else position[0]
+    store, trade_date, interpolation = first.yield_curve_store, first.trade_date, first.interpolation
+    horizon = horizon_days / 360
+    buckets = cash_flow_buckets(position)
+    currencies = sorted(buckets)
+
+    models = {currency: HullWhiteModel.calibrate(store, currency, trade_date, interpolation, window) for currency in currencies}
+    cholesky = np.linalg.cholesky(factor_correlation(store, currencies, trade_date, window) + 1e-12 * np.eye(len(currencies)))
+    factor_std = np.array([models[currency].factor_std(horizon) for currency in currencies])
+
+    base_value = 0.0
+    received = 0.0
+    terms = []
+    for currency in currencies:
+        times, amounts = buckets[currency]
+        model = models[currency]
+        base_value += float(amounts @ model.discount_curve.discount_factors(times))
+        later = times > horizon
+        received += float(amounts[~later].sum())
+        terms.append((amounts[later],) + model.horizon_terms(horizon, times[later]))
+
+    # Bounded (path x payment time) blocks, each with its own random stream
+    payment_times = max(max((len(amounts) for amounts, _, _ in terms), default=1), 1)
+    chunk_paths = max(chunk_elements // payment_times, 1)
+    sizes = [min(chunk_paths, n_paths - start) for start in range(0, n_paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(terms, cholesky, factor_std, received, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+
+    if workers == 1:
+        values = [simulate_chunk(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            values = list(executor.map(simulate_chunk, *zip(*jobs)))
+    METRICS.count("monte_carlo_paths", n_paths)
+    logger.debug("Simulated %d paths in %d chunks of up to %d paths", n_paths, len(jobs), chunk_paths)
+
+    parameters = pd.DataFrame({
+        "Currency": currencies,
+        "Mean Reversion": [models[currency].mean_reversion for currency in currencies],
+        "Volatility": [models[currency].volatility for currency in currencies],
+    })
+    return SimulationResult(base_value, np.concatenate(values) - base_value, horizon_days, parameters)
+
+
+def run(bonds_path, curves_path, date=None, n_paths=10000, horizon_days=10, confidence_levels=CONFIDENCE_LEVELS,
+        seed=0, workers=None, interpolation="linear", pnl_output=None):
+    """VaR and expected shortfall of one piece of every live fixed rate bond of the inventory."""
+    curves_df = storage.read_yield_curves(curves_path, end=date)
+    curve_store = YieldCurveStore(curves_df)
+    trade_date = np.datetime64(pd.Timestamp(date).date(), "D") if date else curve_store.observation_dates()[-1]
+
+    bonds_df = storage.read_bond_emissions(bonds_path)
+    # Scenario curves reprice the fixed rate engine only; floaters are reported, not simulated
+    floating = int(bonds_df["Reference Rate Code"].notna().sum())
+    bonds, rejected = BondTable.from_frame(bonds_df[bonds_df["Reference Rate Code"].isna()]).valid()
+    currencies = [currency for currency in curve_store.currencies() if (currency, trade_date) in curve_store]
+    live = np.isin(bonds["Nominal Value Currency"], currencies) & (bonds["Maturity Date"] > trade_date)
+    portfolio = BondPortfolio(bonds.take(live), curve_store, trade_date, interpolation=interpolation)
+
+    result = simulate(portfolio, n_paths, horizon_days, seed, workers or os.cpu_count())
+    print(f"{int(live.sum())} bonds, {n_paths} paths, {horizon_days} day horizon from {trade_date}")
+    if floating:
+        print(f"Left out {floating} floating rate note(s): the simulation covers fixed rate bonds only")
+    if rejected:
+        print(f"Left out {len(rejected)} bond(s) with invalid reference data")
+    print(result.parameters.to_string(index=False))
+    print(f"Base value: {result.base_value:.2f}")
+    print(result.summary(confidence_levels).to_string(index=False))
+    if pnl_output:
+        pd.DataFrame({"P&L": result.pnl}).to_csv(pnl_output, index=False)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Monte Carlo VaR and expected shortfall of the bond inventory.")
+    parser.add_argument("--bonds", default="bond_emissions.csv", help="bond inventory in bond_emissions.csv format (or converted .arrow)")
+    parser.add_argument("--curves", default="yieldCurves.csv", help="yield curves in yieldCurves.csv format (or converted .arrow)")
+    parser.add_argument("--date", help="valuation date (defaults to the latest curve date)")
+    parser.add_argument("--paths", type=int, default=10000, help="number of simulated paths")
+    parser.add_argument("--horizon", type=int, default=10, help="horizon in days")
+    parser.add_argument("--confidence", type=float, nargs="+", default=list(CONFIDENCE_LEVELS), help="confidence levels")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--workers", type=int, help="worker processes (defaults to the number of cores)")
+    parser.add_argument("--interpolation", choices=INTERPOLATION_METHODS, default="linear", help="yield curve interpolation")
+    parser.add_argument("--pnl-output", help="optional CSV file of the simulated P&L")
+    parser.add_argument("--log-level", help="logging level (defaults to $TREASURY_LOG_LEVEL or WARNING)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    run(
+        args.bonds, args.curves, date=args.date, n_paths=args.paths, horizon_days=args.horizon,
+        confidence_levels=args.confidence, seed=args.seed, workers=args.workers,
+        interpolation=args.interpolation, pnl_output=args.pnl_output,
+    )
+
+
+if __name__ == "__main__":
+    main()
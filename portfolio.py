@@ -0,0 +1,106 @@
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+from curves import YieldCurveStore
+from schedules import CashFlowMatrix
+from solver import SpreadSolution, solve_spreads, solve_yields
+from instrumentation import timed_stage
+
+
+class BondPortfolio:
+    """
+    Vectorised valuation of many fixed rate bonds for one trade date.
+
+    Cash flows are laid out on a padded (bond x payment) matrix and valued with
+    NumPy array operations; the numbers match FixedBond.cash_flow and FixedBond.npv.
+    bonds_df is a BondTable or a DataFrame in the bond_emissions.csv layout.
+    """
+
+    def __init__(self, bonds_df, yield_curves_df, trade_date, number_of_pieces=1, interpolation="linear"):
+        bonds_df = BondTable.of(bonds_df)
+        self.isin = bonds_df["ISIN"]
+        self.currency = bonds_df["Nominal Value Currency"]
+        self.trade_date = np.datetime64(pd.to_datetime(trade_date), "D")
+        self.yield_curve_store = YieldCurveStore.of(yield_curves_df)
+        self.interpolation = interpolation
+        # YTM compounds semi-annually for semi-annual coupons, annually otherwise (as FixedBond)
+        self.periods_per_year = np.where(bonds_df["Coupon Frequency"] == "Semi-Annual", 2, 1)
+
+        self.schedule = CashFlowMatrix.from_frame(bonds_df, self.trade_date, number_of_pieces)
+        self.payment_dates = self.schedule.payment_dates
+        self.mask = self.schedule.mask
+        self.length_of_period = self.schedule.length_of_period
+        self.days_from_trade_date = self.schedule.days_from_trade_date
+        self.time_to_payment = self.schedule.time_to_payment
+        self.coupon = self.schedule.coupon
+        self.principal = self.schedule.principal
+        self.remaining_principal = self.schedule.remaining_principal
+
+        self.rate = self._interpolate_rates()
+
+    @timed_stage("discounting")
+    def _interpolate_rates(self):
+        rates = np.zeros(self.time_to_payment.shape)
+        for currency in np.unique(self.currency):
+            curve = self.yield_curve_store.discount_curve(currency, self.trade_date, self.interpolation)
+            rows = self.currency == currency
+            rates[rows] = curve.zero_rates(self.time_to_payment[rows])
+        return rates
+
+    @timed_stage("discounting")
+    def discount_factors(self, shift=0):
+        return (1 + self.rate + shift / 100) ** self.time_to_payment
+
+    def cash_flows(self, shift=0):
+        """Cash flow matrices with the same fields as FixedBond.cash_flow, zero outside the mask."""
+        discount_factors = self.discount_factors(shift)
+        return {
+            "Date": self.payment_dates,
+            "Coupon Payment": self.coupon,
+            "Principal Repayment": self.principal,
+            "Length of Period": self.length_of_period,
+            "Days from trade date": self.days_from_trade_date,
+            "Remaining Principal": self.remaining_principal,
+            "Interpolated Rate": self.rate + shift / 100,
+            "Discounted Interest": np.where(self.mask, self.coupon / discount_factors, 0.0),
+            "Discounted Principal": np.where(self.mask, self.principal / discount_factors, 0.0),
+        }
+
+    def npv(self, shift=0):
+        """NPV of every bond in the portfolio."""
+        discounted = (self.coupon + self.principal) / self.discount_factors(shift)
+        return np.where(self.mask, discounted, 0.0).sum(axis=1)
+
+    def yield_analytics(self, prices, shift=0):
+        """YTM, durations and convexity of every bond for the given prices, solved together."""
+        return solve_yields(
+            self.coupon + self.principal,
+            np.where(self.mask, self.days_from_trade_date, 0),
+            prices,
+            periods_per_year=self.periods_per_year,
+            shift=shift,
+        )
+
+    def z_spreads(self, prices):
+        """
+        Z-spread (in %) of every bond over its curve for the given dirty prices, solved together
+        on the discount times and rates already computed. Bonds priced NaN get a NaN spread.
+        """
+        prices = np.broadcast_to(np.asarray(prices, dtype=float), (len(self.coupon),))
+        priced = np.flatnonzero(np.isfinite(prices))
+        solution = solve_spreads(
+            (self.coupon + self.principal)[priced], self.time_to_payment[priced], self.rate[priced], prices[priced]
+        )
+        z_spread = np.full(len(prices), np.nan)
+        converged = np.zeros(len(prices), dtype=bool)
+        iterations = np.zeros(len(prices), dtype=np.int64)
+        z_spread[priced], converged[priced], iterations[priced] = solution.z_spread, solution.converged, solution.iterations
+        return SpreadSolution(z_spread, iterations, converged)
+
+    def cash_flow_frame(self, shift=0):
+        """Long format DataFrame of all valued cash flows, one row per (ISIN, Date)."""
+        cash_flows = self.cash_flows(shift)
+        rows, _ = np.nonzero(self.mask)
+        frame = pd.DataFrame({name: values[self.mask] for name, values in cash_flows.items()})
+        frame.insert(0, "ISIN", self.isin[rows])
+        return frame
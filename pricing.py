@@ -0,0 +1,88 @@
+"""
+Accrued interest and clean/dirty price conversion on arrays of bonds.
+
+Clean prices are quoted in % of the nominal value; dirty prices and accrued interest are
+amounts in the bond currency for the given number of pieces. The settlement date is the
+trade date, as everywhere in the app. A coupon paid on the settlement date is still valued
+(see CashFlowMatrix), so it counts as fully accrued and the clean price does not jump on
+payment dates.
+"""
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+from daycount import year_fractions
+from instrumentation import timed_stage
+from schedules import PaymentSchedule, to_day_array
+
+
+def accrual_ratio(accrual_start, settlement_dates, payment_dates, conventions):
+    """
+    Share of each accrual period elapsed at settlement under its day count convention,
+    0 before the period starts; all arguments broadcast together.
+    """
+    # The period itself is the ACT/ACT ICMA reference, so stub periods accrue pro rata
+    elapsed = year_fractions(accrual_start, settlement_dates, conventions, accrual_start, payment_dates)
+    period = year_fractions(accrual_start, payment_dates, conventions, accrual_start, payment_dates)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = np.where(period > 0, elapsed / period, 0.0)
+    return np.clip(ratio, 0.0, 1.0)
+
+
+@timed_stage("accrued_interest")
+def accrued_interest(bonds, settlement_dates, number_of_pieces=1, schedule=None):
+    """
+    Accrued interest of many bonds at one settlement date or one date per bond.
+
+    bonds is a BondTable or DataFrame in the bond_emissions.csv layout; schedule may pass
+    its PaymentSchedule when the caller has one already. The running coupon period is the
+    first one paid on or after settlement, accrued from its start (previous payment or
+    issue date) under the bond's day count convention. Floating rate notes get NaN: their
+    running rate comes from a fixing, see FixedBond.accrued_interest.
+    """
+    bonds = BondTable.of(bonds)
+    schedule = PaymentSchedule.from_frame(bonds) if schedule is None else schedule
+    settlement_dates = np.broadcast_to(to_day_array(np.atleast_1d(settlement_dates)), (len(bonds),))
+
+    # Only the running period is needed, not the whole cash flow matrix
+    rows = np.arange(len(bonds))
+    valued = schedule.in_schedule & (schedule.payment_dates >= settlement_dates[:, None])
+    first = np.argmax(valued, axis=1)
+    running = valued[rows, first]
+    ratio = accrual_ratio(
+        schedule.accrual_start[rows, first],
+        settlement_dates,
+        schedule.payment_dates[rows, first],
+        schedule.day_count_convention,
+    )
+    # The whole notional is outstanding over the first valued period, as in CashFlowMatrix
+    notional = np.asarray(number_of_pieces, dtype=float) * schedule.nominal_value
+    coupon = notional * schedule.coupon_rate / 100 * schedule.accrual_fraction[rows, first]
+    accrued = np.where(running, coupon * ratio, 0.0)
+    if "Reference Rate Code" in bonds:
+        accrued = np.where(pd.isna(bonds["Reference Rate Code"]), accrued, np.nan)
+    return accrued
+
+
+def dirty_price(clean_price, accrued, nominal_value, number_of_pieces=1):
+    """Dirty amount of a position from its clean price in % of nominal."""
+    return np.asarray(number_of_pieces) * np.asarray(nominal_value) * np.asarray(clean_price) / 100 + accrued
+
+
+def clean_price(dirty, accrued, nominal_value, number_of_pieces=1):
+    """Clean price in % of nominal of a position from its dirty amount."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.asarray(dirty) - accrued) * 100 / (np.asarray(number_of_pieces) * np.asarray(nominal_value))
+
+
+def clean_to_dirty(bonds, settlement_dates, clean_prices, number_of_pieces=1):
+    """Accrued interest and dirty amounts of many positions at once, from clean prices in %."""
+    bonds = BondTable.of(bonds)
+    accrued = accrued_interest(bonds, settlement_dates, number_of_pieces)
+    return accrued, dirty_price(clean_prices, accrued, bonds["Nominal Value (1 unit)"], number_of_pieces)
+
+
+def dirty_to_clean(bonds, settlement_dates, dirty_prices, number_of_pieces=1):
+    """Accrued interest and clean prices in % of many positions at once, from dirty amounts."""
+    bonds = BondTable.of(bonds)
+    accrued = accrued_interest(bonds, settlement_dates, number_of_pieces)
+    return accrued, clean_price(dirty_prices, accrued, bonds["Nominal Value (1 unit)"], number_of_pieces)
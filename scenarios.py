@@ -0,0 +1,66 @@
+import numpy as np
+from portfolio import BondPortfolio
+from valuation import FloatingBond
+
+
+# The range offered by the shift slider in the trade form: -5% to +5% in 0.1% steps
+SHIFT_LADDER = np.round(np.linspace(-5.0, 5.0, 101), 1)
+
+# Upper bound on (bonds x shifts x payments) elements evaluated at once for a portfolio
+MAX_CHUNK_ELEMENTS = 4_000_000
+
+
+def npv_profile(cash_flows, rates, time_to_payment, shifts):
+    """
+    NPV under each parallel shift in one broadcasted computation.
+
+    cash_flows, rates and time_to_payment have shape (..., payments); shifts are in %
+    like the shift argument of FixedBond.npv. Returns an array of shape (..., shifts).
+    """
+    shifts = np.asarray(shifts, dtype=float)
+    growth = 1 + rates[..., None, :] + shifts[:, None] / 100
+    return np.sum(cash_flows[..., None, :] / growth ** time_to_payment[..., None, :], axis=-1)
+
+
+def fixed_bond_npv_ladder(fixed_bond, shifts=SHIFT_LADDER):
+    """NPV of a FixedBond for every shift in shifts, same numbers as fixed_bond.npv(shift)."""
+    schedule, rates, _ = fixed_bond.discounted_cash_flows()
+    cash_flows = schedule.total * fixed_bond.number_of_pieces
+    return npv_profile(cash_flows, rates, schedule.time_to_payment, shifts)
+
+
+def floating_bond_npv_ladder(floating_bond, shifts=SHIFT_LADDER):
+    """NPV of a FloatingBond for every shift in shifts; coupons are re-projected under each shift."""
+    schedule, rates, _ = floating_bond.discounted_cash_flows()
+    _, start_times, _ = floating_bond.fixings()
+    start_rates = floating_bond.discount_curve().zero_rates(start_times)
+    moves = np.asarray(shifts, dtype=float)[:, None] / 100
+    _, coupons = floating_bond.projected_coupons(start_rates + moves, rates + moves)
+    cash_flows = (coupons + schedule.principal) * floating_bond.number_of_pieces
+    return np.sum(cash_flows / (1 + rates + moves) ** schedule.time_to_payment, axis=1)
+
+
+def portfolio_npv_ladder(portfolio, shifts=SHIFT_LADDER):
+    """(bond x shift) NPV matrix of a BondPortfolio, evaluated in bounded chunks of bonds."""
+    shifts = np.asarray(shifts, dtype=float)
+    cash_flows = portfolio.coupon + portfolio.principal
+    n_bonds, n_payments = cash_flows.shape
+    chunk = max(MAX_CHUNK_ELEMENTS // max(n_payments * len(shifts), 1), 1)
+
+    ladder = np.empty((n_bonds, len(shifts)))
+    for start in range(0, n_bonds, chunk):
+        rows = slice(start, start + chunk)
+        # Padding has zero cash flow, so it adds nothing to the sums
+        ladder[rows] = npv_profile(
+            cash_flows[rows], portfolio.rate[rows], portfolio.time_to_payment[rows], shifts
+        )
+    return ladder
+
+
+def npv_ladder(position, shifts=SHIFT_LADDER):
+    """NPV-vs-shift array for a FixedBond or FloatingBond, or a (bond x shift) matrix for a BondPortfolio."""
+    if isinstance(position, BondPortfolio):
+        return portfolio_npv_ladder(position, shifts)
+    if isinstance(position, FloatingBond):
+        return floating_bond_npv_ladder(position, shifts)
+    return fixed_bond_npv_ladder(position, shifts)
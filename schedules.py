@@ -0,0 +1,324 @@
+import pandas as pd
+import numpy as np
+from collections import namedtuple
+from cache import LRUCache
+from instrumentation import METRICS, timed_stage
+from calendars import BUSINESS_DAY_CONVENTIONS, adjust_dates
+from curves import to_day
+from daycount import add_months, date_parts, day_counts, validate, year_fractions
+
+
+# Months between two unadjusted coupon dates for each supported coupon frequency
+COUPON_FREQUENCY_MONTHS = {"Annual": 12, "Semi-Annual": 6, "Quarterly": 3}
+# Principal frequencies that amortise in equal instalments (see FixedBond.cash_flow)
+AMORTISING_FREQUENCIES = ("Annual", "Semi-Annual", "Quarterly", "Monthly")
+
+
+def to_day_array(values):
+    """Convert dates (strings, Timestamps, a Series...) to a datetime64[D] array."""
+    if isinstance(values, np.ndarray) and values.dtype == "datetime64[D]":
+        return values
+    return np.asarray(pd.to_datetime(values), dtype="datetime64[ns]").astype("datetime64[D]")
+
+
+def build_payment_dates(emission_dates, maturity_dates, coupon_frequencies, business_day_conventions,
+                        jurisdictions=None):
+    """
+    Generate the payment dates of many bonds at once, following FixedBond.generate_dates.
+
+    Coupon dates are rolled with the holiday calendar of each bond's jurisdiction
+    (weekends only when it is missing or unknown, see calendars.py). Returns a
+    (bond x payment) datetime64[D] matrix padded with the maturity date and the
+    number of real payments per bond.
+    """
+    payment_dates, payment_count, _ = _schedule_dates(
+        emission_dates, maturity_dates, coupon_frequencies, business_day_conventions, jurisdictions
+    )
+    return payment_dates, payment_count
+
+
+def _schedule_dates(emission_dates, maturity_dates, coupon_frequencies, business_day_conventions,
+                    jurisdictions=None):
+    """build_payment_dates, also returning the number of regular (non stub) coupon dates."""
+    unsupported = set(coupon_frequencies) - set(COUPON_FREQUENCY_MONTHS)
+    if unsupported:
+        raise ValueError(f"Unsupported coupon frequency: {unsupported.pop()}")
+    unsupported = set(business_day_conventions) - set(BUSINESS_DAY_CONVENTIONS)
+    if unsupported:
+        raise ValueError(f"Unsupported convention: {unsupported.pop()}")
+
+    step = np.array([COUPON_FREQUENCY_MONTHS[f] for f in coupon_frequencies], dtype=np.int64)
+    emission_year, emission_month, emission_day = date_parts(emission_dates)
+    emission_month = (emission_year - 1970) * 12 + emission_month - 1
+
+    # Upper bound of unadjusted dates strictly before maturity
+    months_to_maturity = maturity_dates.astype("datetime64[M]").astype(np.int64) - emission_month
+    max_periods = max(int((months_to_maturity // step).max(initial=0)) + 1, 1)
+    periods = np.arange(1, max_periods + 1)
+
+    # Dates are rolled on from the previous unadjusted date, so a short month clips
+    # the day for every later period as well (pd.DateOffset behaviour). Months are
+    # counted from 1970-01 and turned into days through a table of month starts,
+    # which is cheaper than casting the whole matrix between datetime64 units
+    months = emission_month[:, None] + periods[None, :] * step[:, None]
+    first_month = int(months.min(initial=0))
+    month_starts = np.arange(first_month, int(months.max(initial=0)) + 2).astype("datetime64[M]").astype("datetime64[D]")
+    months -= first_month
+    start_of_month = month_starts[months]
+    days_in_month = (month_starts[months + 1] - start_of_month).astype(np.int64)
+    day = np.minimum(emission_day[:, None], np.minimum.accumulate(days_in_month, axis=1))
+    unadjusted = start_of_month + (day - 1).astype("timedelta64[D]")
+
+    valid = unadjusted < maturity_dates[:, None]
+    unadjusted = np.where(valid, unadjusted, maturity_dates[:, None])
+
+    # Roll onto business days
+    adjusted = adjust_dates(unadjusted, business_day_conventions, jurisdictions)
+    valid &= adjusted <= maturity_dates[:, None]
+
+    # Valid dates form a prefix of each row; the maturity date always closes the schedule
+    regular_payments = valid.sum(axis=1)
+    maturity_included = (valid & (adjusted == maturity_dates[:, None])).any(axis=1)
+    payment_count = regular_payments + ~maturity_included
+
+    payment_dates = np.empty((len(maturity_dates), max_periods + 1), dtype="datetime64[D]")
+    payment_dates[:, :max_periods] = np.where(valid, adjusted, maturity_dates[:, None])
+    payment_dates[:, max_periods] = maturity_dates
+
+    return payment_dates, payment_count, regular_payments
+
+
+# Bond terms that determine a cash flow schedule; hashable so it can key the schedule cache
+ScheduleTerms = namedtuple("ScheduleTerms", [
+    "issue_date",
+    "maturity_date",
+    "coupon_rate",
+    "nominal_value",
+    "coupon_frequency",
+    "principal_payment_frequency",
+    "business_day_convention",
+    "day_count_convention",
+    "jurisdiction",
+], defaults=(None,))
+
+# Memoised single bond schedules keyed by (ISIN, ScheduleTerms, trade date)
+SCHEDULE_CACHE = LRUCache(maxsize=4096)
+
+
+class PaymentSchedule:
+    """
+    Trade independent part of the schedules of many bonds, on a padded (bond x payment) matrix.
+
+    Payment dates, accrual periods and coupon fractions depend only on the bond terms,
+    so they are generated once and valued for any number of trade dates by CashFlowMatrix.
+    """
+
+    @timed_stage("schedule_generation")
+    def __init__(self, emission_date, maturity_date, coupon_rate, nominal_value, coupon_frequency,
+                 principal_frequency, business_day_convention, day_count_convention, jurisdiction=None):
+        validate(day_count_convention)
+        unsupported = set(principal_frequency) - set(AMORTISING_FREQUENCIES) - {"At Maturity"}
+        if unsupported:
+            raise ValueError(f"Unsupported principal payment frequency: {unsupported.pop()}")
+
+        METRICS.count("schedules_generated", len(maturity_date))
+        self.emission_date = emission_date
+        self.maturity_date = maturity_date
+        self.coupon_rate = coupon_rate
+        self.nominal_value = nominal_value
+        self.day_count_convention = day_count_convention
+        self.amortising = np.isin(principal_frequency, AMORTISING_FREQUENCIES)
+
+        self.payment_dates, self.payment_count, regular_payments = _schedule_dates(
+            emission_date, maturity_date, coupon_frequency, business_day_convention, jurisdiction
+        )
+        columns = np.arange(self.payment_dates.shape[1])
+        self.in_schedule = columns[None, :] < self.payment_count[:, None]
+        self.is_maturity = self.in_schedule & (self.payment_dates == maturity_date[:, None])
+
+        # Date parts of the matrix are split once and shared by every day count below and
+        # the day counts from the trade date in CashFlowMatrix
+        self.payment_date_parts = date_parts(self.payment_dates)
+        emission_parts = date_parts(emission_date)
+        previous_parts = tuple(
+            np.concatenate([emission[:, None], payment[:, :-1]], axis=1)
+            for emission, payment in zip(emission_parts, self.payment_date_parts)
+        )
+
+        # Accrual periods run from the previous payment date (issue date for the first one)
+        previous_dates = np.concatenate([emission_date[:, None], self.payment_dates[:, :-1]], axis=1)
+        self.accrual_start = previous_dates
+        conventions = day_count_convention[:, None]
+        self.length_of_period = day_counts(
+            previous_dates, self.payment_dates, conventions, previous_parts, self.payment_date_parts
+        )
+
+        # A final period closed by a maturity off the coupon cycle is a short stub; ACT/ACT ICMA
+        # measures it against the full coupon period that it is part of
+        reference_end = self.payment_dates
+        months = np.array([COUPON_FREQUENCY_MONTHS[f] for f in coupon_frequency], dtype=np.int64)[:, None]
+        if np.any(day_count_convention == "ACT/ACT ICMA"):
+            stub = columns[None, :] == regular_payments[:, None]
+            reference_end = np.where(stub, add_months(previous_dates, months), self.payment_dates)
+        self.accrual_fraction = year_fractions(
+            previous_dates, self.payment_dates, conventions, previous_dates, reference_end, 12 / months,
+            days=self.length_of_period, start_parts=previous_parts, end_parts=self.payment_date_parts,
+        )
+
+    def __len__(self):
+        return len(self.payment_count)
+
+    @classmethod
+    def from_frame(cls, bonds_df):
+        """Build the schedules from a BondTable or rows in the bond_emissions.csv format."""
+        return cls(
+            to_day_array(bonds_df["Issue Date"]),
+            to_day_array(bonds_df["Maturity Date"]),
+            np.asarray(bonds_df["Fixed Rate/Spread [%]"], dtype=float),
+            np.asarray(bonds_df["Nominal Value (1 unit)"], dtype=float),
+            np.asarray(bonds_df["Coupon Frequency"], dtype=object),
+            np.asarray(bonds_df["Principal Payment Frequency"], dtype=object),
+            np.asarray(bonds_df["Business Day Convention"], dtype=object),
+            np.asarray(bonds_df["Day Count Convention"], dtype=object),
+            np.asarray(bonds_df["Jurisdiction"], dtype=object) if "Jurisdiction" in bonds_df else None,
+        )
+
+    @classmethod
+    def from_terms(cls, terms):
+        """Build the schedules from a list of ScheduleTerms."""
+        columns = list(zip(*terms))
+        return cls(
+            np.array(columns[0], dtype="datetime64[D]"),
+            np.array(columns[1], dtype="datetime64[D]"),
+            np.array(columns[2], dtype=float),
+            np.array(columns[3], dtype=float),
+            np.array(columns[4], dtype=object),
+            np.array(columns[5], dtype=object),
+            np.array(columns[6], dtype=object),
+            np.array(columns[7], dtype=object),
+            np.array(columns[8], dtype=object),
+        )
+
+    def take(self, rows):
+        """Schedules of the given rows (rows may repeat) without generating any dates again."""
+        taken = PaymentSchedule.__new__(PaymentSchedule)
+        for name, values in vars(self).items():
+            setattr(taken, name, tuple(part[rows] for part in values) if isinstance(values, tuple) else values[rows])
+        return taken
+
+
+class CashFlowMatrix:
+    """
+    Curve independent cash flows of many bonds on a padded (bond x payment) matrix.
+
+    Coupons and principal depend only on the bond terms and the trade date, so they are
+    computed once here and reused by every discounting, scenario and yield calculation.
+    trade_date is one date for all rows or one date per row. Entries outside mask are padding.
+    """
+
+    @timed_stage("schedule_generation")
+    def __init__(self, schedule, trade_date, number_of_pieces=1):
+        self.schedule = schedule
+        self.payment_dates = schedule.payment_dates
+        self.payment_count = schedule.payment_count
+        self.length_of_period = schedule.length_of_period
+        self.accrual_start = schedule.accrual_start
+        self.accrual_fraction = schedule.accrual_fraction
+        if np.ndim(trade_date) == 0:
+            self.trade_date = np.datetime64(pd.to_datetime(trade_date), "D")
+            trade_dates = self.trade_date
+        else:
+            self.trade_date = to_day_array(trade_date)
+            trade_dates = self.trade_date[:, None]
+
+        # Only cash flows on or after the trade date are valued
+        self.mask = schedule.in_schedule & (self.payment_dates >= trade_dates)
+        self.days_from_trade_date = day_counts(
+            trade_dates, self.payment_dates, schedule.day_count_convention[:, None], end_parts=schedule.payment_date_parts
+        )
+        self.time_to_payment = self.days_from_trade_date / 360
+
+        # Principal: equal instalments for amortising bonds, remaining balance at maturity
+        nominal_value = schedule.nominal_value
+        notional = np.broadcast_to(np.asarray(number_of_pieces, dtype=float), nominal_value.shape) * nominal_value
+        instalment = np.where(schedule.amortising, notional / self.payment_count, 0.0)
+        scheduled = np.where(self.mask & ~schedule.is_maturity, instalment[:, None], 0.0)
+        remaining_before = notional[:, None] - (np.cumsum(scheduled, axis=1) - scheduled)
+        self.principal = np.where(self.mask & schedule.is_maturity, remaining_before, scheduled)
+        self.remaining_principal = np.where(self.mask, remaining_before - self.principal, 0.0)
+        self.coupon = np.where(
+            self.mask,
+            remaining_before * (schedule.coupon_rate[:, None] / 100) * schedule.accrual_fraction,
+            0.0,
+        )
+
+    @classmethod
+    def from_frame(cls, bonds_df, trade_date, number_of_pieces=1):
+        """Build the matrix from rows in the bond_emissions.csv format."""
+        return cls(PaymentSchedule.from_frame(bonds_df), trade_date, number_of_pieces)
+
+    @classmethod
+    def from_terms(cls, terms, trade_date, number_of_pieces=1):
+        """Build the matrix from a list of ScheduleTerms."""
+        return cls(PaymentSchedule.from_terms(terms), trade_date, number_of_pieces)
+
+    def row(self, index):
+        """Compact CashFlowSchedule of one bond (valued cash flows only)."""
+        mask = self.mask[index]
+        return CashFlowSchedule(
+            payment_dates=self.payment_dates[index][mask],
+            accrual_start=self.accrual_start[index][mask],
+            length_of_period=self.length_of_period[index][mask],
+            accrual_fraction=self.accrual_fraction[index][mask],
+            days_from_trade_date=self.days_from_trade_date[index][mask],
+            coupon=self.coupon[index][mask],
+            principal=self.principal[index][mask],
+            remaining_principal=self.remaining_principal[index][mask],
+        )
+
+
+class CashFlowSchedule:
+    """Cash flows of one bond on or after the trade date, as arrays."""
+
+    def __init__(self, payment_dates, accrual_start, length_of_period, accrual_fraction, days_from_trade_date, coupon,
+                 principal, remaining_principal):
+        self.payment_dates = payment_dates
+        self.accrual_start = accrual_start
+        self.length_of_period = length_of_period
+        self.accrual_fraction = accrual_fraction
+        self.days_from_trade_date = days_from_trade_date
+        self.time_to_payment = days_from_trade_date / 360
+        self.coupon = coupon
+        self.principal = principal
+        self.remaining_principal = remaining_principal
+        # Schedules are shared through the cache, so keep them read-only
+        for values in vars(self).values():
+            values.setflags(write=False)
+
+    def __len__(self):
+        return len(self.payment_dates)
+
+    @property
+    def total(self):
+        return self.coupon + self.principal
+
+    def with_coupon(self, coupon):
+        """Copy with other coupon amounts (e.g. projected floating coupons), sharing the rest."""
+        return CashFlowSchedule(
+            self.payment_dates, self.accrual_start, self.length_of_period, self.accrual_fraction,
+            self.days_from_trade_date, coupon, self.principal, self.remaining_principal,
+        )
+
+
+def bond_schedule(isin, terms, trade_date):
+    """
+    Cash flow schedule of one bond for one piece, memoised in SCHEDULE_CACHE.
+
+    Multiply the amounts by the number of pieces held; the schedule does not depend
+    on the curve or the shift, so every valuation of the same trade reuses it.
+    """
+    trade_date = to_day(trade_date)
+    return SCHEDULE_CACHE.get_or_create(
+        (isin, terms, trade_date),
+        lambda: CashFlowMatrix.from_terms([terms], trade_date).row(0),
+    )
@@ -0,0 +1,97 @@
+import pandas as pd
+import numpy as np
+from valuation import FloatingBond
+
+
+# One basis point in the units of the yieldCurves.csv rate column
+BUMP_SIZE = 0.0001
+
+
+class CurveSensitivities:
+    """
+    DV01, effective duration and convexity from parallel bumps, plus key-rate DV01 and
+    key-rate duration for every node of the curve. DV01 figures are the value change for
+    a one basis point fall in rates.
+    """
+
+    def __init__(self, npv, tenors, parallel_up, parallel_down, key_rate_npv, bump):
+        self.npv = npv
+        self.tenors = tenors
+        self.bump = bump
+        self.dv01 = (parallel_down - parallel_up) / 2
+        self.effective_duration = (parallel_down - parallel_up) / (2 * npv * bump)
+        self.convexity = (parallel_up + parallel_down - 2 * npv) / (npv * bump ** 2)
+        self.key_rate_dv01 = npv - key_rate_npv
+        self.key_rate_durations = (npv - key_rate_npv) / (npv * bump)
+
+    def to_frame(self):
+        return pd.DataFrame({
+            "Tenor (years)": self.tenors,
+            "Key Rate DV01": self.key_rate_dv01,
+            "Key Rate Duration": self.key_rate_durations,
+        })
+
+
+def scenario_rate_moves(curve, times, rates, bump):
+    """
+    Rate moves at times for the scenario rows: base, parallel up, parallel down, then one row
+    per bumped node. rates are the curve's zero rates at times.
+    """
+    key_rate_moves = [curve.bumped(node, bump).zero_rates(times) - rates for node in range(len(curve))]
+    return np.vstack([
+        np.zeros((1, len(rates))),
+        np.full((1, len(rates)), bump),
+        np.full((1, len(rates)), -bump),
+        np.reshape(key_rate_moves, (len(curve), len(rates))),
+    ])
+
+
+def fixed_bond_sensitivities(fixed_bond, shift=0, bump=BUMP_SIZE):
+    """
+    Curve sensitivities of a FixedBond.
+
+    The base curve, both parallel bumps and a bump of every node are repriced in one
+    vectorised pass over the cached schedule and its discount times. Node bumps are
+    bumped copies of the bond's DiscountCurve, so they follow its interpolation.
+    """
+    schedule, rates, _ = fixed_bond.discounted_cash_flows(shift)
+    curve = fixed_bond.discount_curve()
+    time_to_payment = schedule.time_to_payment
+    cash_flows = schedule.total * fixed_bond.number_of_pieces
+
+    rate_moves = scenario_rate_moves(curve, time_to_payment, rates, bump)
+    scenario_rates = rates[None, :] + shift / 100 + rate_moves
+    npvs = np.sum(cash_flows / (1 + scenario_rates) ** time_to_payment, axis=1)
+
+    return CurveSensitivities(npvs[0], curve.tenors, npvs[1], npvs[2], npvs[3:], bump)
+
+
+def floating_bond_sensitivities(floating_bond, shift=0, bump=BUMP_SIZE):
+    """
+    Curve sensitivities of a FloatingBond.
+
+    As for a FixedBond, but every scenario also re-projects the coupons that are not fixed
+    yet, from the same bumped curve at the period starts and ends.
+    """
+    schedule, rates, _ = floating_bond.discounted_cash_flows(shift)
+    curve = floating_bond.discount_curve()
+    _, start_times, _ = floating_bond.fixings()
+    start_rates = curve.zero_rates(start_times)
+    payments = len(rates)
+
+    rate_moves = scenario_rate_moves(
+        curve, np.concatenate([start_times, schedule.time_to_payment]), np.concatenate([start_rates, rates]), bump
+    )
+    scenario_rates = rates[None, :] + shift / 100 + rate_moves[:, payments:]
+    _, coupons = floating_bond.projected_coupons(start_rates[None, :] + shift / 100 + rate_moves[:, :payments], scenario_rates)
+    cash_flows = (coupons + schedule.principal) * floating_bond.number_of_pieces
+    npvs = np.sum(cash_flows / (1 + scenario_rates) ** schedule.time_to_payment, axis=1)
+
+    return CurveSensitivities(npvs[0], curve.tenors, npvs[1], npvs[2], npvs[3:], bump)
+
+
+def bond_sensitivities(bond, shift=0, bump=BUMP_SIZE):
+    """Curve sensitivities of a FixedBond or FloatingBond."""
+    if isinstance(bond, FloatingBond):
+        return floating_bond_sensitivities(bond, shift, bump)
+    return fixed_bond_sensitivities(bond, shift, bump)
@@ -0,0 +1,288 @@
+"""
+Materialized end-of-day analytics snapshots.
+
+Precomputes, for every fixed rate bond and every curve observation date, the per piece
+NPV, YTM, durations, convexity and cash flow ladder of the standard end-of-day valuation
+(no shift, YTM solved at the model NPV as in the batch engine) and stores them in one
+SQLite file keyed by (ISIN, observation_date):
+
+    python snapshot.py --bonds bond_emissions.csv --curves yieldCurves.csv --output snapshots.db
+
+The Trade pane reads single rows on demand. A row is only served while the curve and the
+bond terms it was computed from are unchanged (checked against stored fingerprints); any
+other input (custom price, shift or interpolation) is valued live by FixedBond.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+import numpy as np
+from blotter import terms_fingerprint
+from bondtable import BondTable
+from cache import LRUCache
+from curves import INTERPOLATION_METHODS, YieldCurveStore, to_day
+from instrumentation import METRICS, configure_logging, timed_stage
+from portfolio import BondPortfolio
+import storage
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_PATH = "snapshots.db"
+
+# Ladders are stored as one float64 blob per row: coupon, principal and present value of
+# each remaining payment, in that order. The remaining principal follows from the nominal.
+LADDER_FIELDS = ("Coupon Payment", "Principal Repayment", "Present Value")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bonds (
+    isin TEXT PRIMARY KEY,
+    terms TEXT NOT NULL,
+    nominal_value REAL NOT NULL,
+    payment_dates BLOB NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS curves (
+    currency TEXT NOT NULL,
+    observation_date TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    PRIMARY KEY (currency, observation_date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS snapshots (
+    isin TEXT NOT NULL,
+    observation_date TEXT NOT NULL,
+    npv REAL NOT NULL,
+    ytm REAL,
+    macaulay_duration REAL,
+    modified_duration REAL,
+    convexity REAL,
+    ladder BLOB NOT NULL,
+    PRIMARY KEY (isin, observation_date)
+) WITHOUT ROWID;
+"""
+
+
+class Snapshot:
+    """End-of-day figures of one bond on one date, per piece."""
+
+    __slots__ = ("isin", "observation_date", "npv", "ytm", "macaulay_duration", "modified_duration",
+                 "convexity", "nominal_value", "payment_dates", "ladder")
+
+    def __init__(self, isin, observation_date, npv, ytm, macaulay_duration, modified_duration, convexity,
+                 nominal_value, payment_dates, ladder):
+        self.isin = isin
+        self.observation_date = observation_date
+        self.npv = npv
+        self.ytm = ytm
+        self.macaulay_duration = macaulay_duration
+        self.modified_duration = modified_duration
+        self.convexity = convexity
+        self.nominal_value = nominal_value
+        self.payment_dates = payment_dates
+        self.ladder = ladder
+
+    def cash_flows(self, number_of_pieces=1):
+        """Cash flow ladder of a position as a DataFrame, payment dates in ISO format."""
+        frame = pd.DataFrame(self.ladder * number_of_pieces, columns=list(LADDER_FIELDS))
+        frame.insert(0, "Date", pd.to_datetime(self.payment_dates).strftime("%Y-%m-%d"))
+        # The whole nominal is outstanding before the first remaining payment
+        remaining = self.nominal_value * number_of_pieces - frame["Principal Repayment"].cumsum()
+        frame.insert(3, "Remaining Principal", remaining)
+        return frame
+
+
+def _blob(values, dtype):
+    return np.ascontiguousarray(values, dtype=dtype).tobytes()
+
+
+@timed_stage("snapshot_build")
+def build(bonds_df, yield_curves, path=DEFAULT_PATH, dates=None, interpolation="linear", chunk_size=2000):
+    """
+    Value every fixed rate bond on every curve date (or the given dates) and write the
+    snapshot file, replacing any previous one. Returns the number of snapshots written, the
+    number of floating rate notes left out and the number of bonds with invalid reference data.
+    """
+    yield_curve_store = YieldCurveStore.of(yield_curves)
+    # Floating rate notes are valued live: their coupons are not fixed by the terms
+    floating = int(bonds_df["Reference Rate Code"].notna().sum())
+    bonds, rejected = BondTable.from_frame(bonds_df[bonds_df["Reference Rate Code"].isna()]).valid()
+    dates = yield_curve_store.observation_dates() if dates is None else [to_day(date) for date in dates]
+    currency = bonds["Nominal Value Currency"]
+    maturity_dates = bonds["Maturity Date"]
+
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    written = 0
+    known = set()
+    try:
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.executemany("INSERT INTO meta VALUES (?, ?)", [
+                ("interpolation", interpolation),
+                ("built_at", datetime.now(timezone.utc).isoformat(timespec="seconds")),
+            ])
+        for observation_date in dates:
+            day = str(observation_date)
+            currencies = [name for name in set(currency) if (name, observation_date) in yield_curve_store]
+            alive = np.flatnonzero(np.isin(currency, currencies) & (maturity_dates >= observation_date))
+            with connection:
+                connection.executemany("INSERT INTO curves VALUES (?, ?, ?)", [
+                    (name, day, yield_curve_store.fingerprint(name, observation_date)) for name in currencies
+                ])
+                for start in range(0, len(alive), chunk_size):
+                    chunk = bonds.take(alive[start:start + chunk_size])
+                    rows, new_bonds = _snapshot_rows(chunk, yield_curve_store, observation_date, interpolation, known)
+                    connection.executemany("INSERT INTO bonds VALUES (?, ?, ?, ?)", new_bonds)
+                    connection.executemany("INSERT INTO snapshots VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                    written += len(rows)
+            logger.debug("Stored %d snapshots for %s", len(alive), day)
+        connection.execute("VACUUM")
+    finally:
+        connection.close()
+    METRICS.count("snapshots_written", written)
+    return written, floating, len(rejected)
+
+
+def _snapshot_rows(chunk, yield_curve_store, observation_date, interpolation, known):
+    """Snapshot rows of one chunk, plus the bond rows of ISINs not stored yet (added to known)."""
+    portfolio = BondPortfolio(chunk, yield_curve_store, observation_date, interpolation=interpolation)
+    npv = portfolio.npv()
+    analytics = portfolio.yield_analytics(npv)
+    cash_flows = portfolio.cash_flows()
+    present_values = cash_flows["Discounted Interest"] + cash_flows["Discounted Principal"]
+    ladders = np.stack([portfolio.coupon, portfolio.principal, present_values], axis=-1)
+    in_schedule = portfolio.schedule.schedule.in_schedule
+    nominal_value = chunk["Nominal Value (1 unit)"]
+    day = str(observation_date)
+
+    rows, new_bonds = [], []
+    for index, isin in enumerate(portfolio.isin):
+        if isin not in known:
+            known.add(isin)
+            payment_days = portfolio.payment_dates[index][in_schedule[index]].astype(np.int32)
+            new_bonds.append((
+                isin, terms_fingerprint(chunk.row(index)), float(nominal_value[index]), _blob(payment_days, "<i4"),
+            ))
+        converged = bool(analytics.converged[index])
+        rows.append((
+            isin, day, float(npv[index]),
+            float(analytics.ytm[index]) if converged else None,
+            float(analytics.macaulay_duration[index]) if converged else None,
+            float(analytics.modified_duration[index]) if converged else None,
+            float(analytics.convexity[index]) if converged else None,
+            # Remaining payments are a suffix of the schedule stored in bonds
+            _blob(ladders[index][portfolio.mask[index]], "<f8"),
+        ))
+    return rows, new_bonds
+
+
+class SnapshotStore:
+    """
+    Read side of a snapshot file, shared by the Streamlit sessions of a server.
+
+    Rows are read one at a time when asked for and kept in a small LRU cache; nothing is
+    loaded up front.
+    """
+
+    def __init__(self, path=DEFAULT_PATH, cache_size=512):
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        self._rows = LRUCache(maxsize=cache_size)
+        with self._lock:
+            self.meta = dict(self._connection.execute("SELECT key, value FROM meta").fetchall())
+        self.interpolation = self.meta.get("interpolation", "linear")
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+
+    def _fetch(self, isin, day):
+        with self._lock:
+            bond = self._connection.execute(
+                "SELECT terms, nominal_value, payment_dates FROM bonds WHERE isin = ?", (isin,)
+            ).fetchone()
+            row = self._connection.execute(
+                "SELECT npv, ytm, macaulay_duration, modified_duration, convexity, ladder FROM snapshots"
+                " WHERE isin = ? AND observation_date = ?",
+                (isin, day),
+            ).fetchone()
+        if bond is None or row is None:
+            return None
+        ladder = np.frombuffer(row[5], dtype="<f8").reshape(-1, len(LADDER_FIELDS))
+        schedule = np.frombuffer(bond[2], dtype="<i4").astype("datetime64[D]")
+        payment_dates = schedule[len(schedule) - len(ladder):]
+        snapshot = Snapshot(isin, day, *[np.nan if value is None else value for value in row[:5]], bond[1], payment_dates, ladder)
+        return bond[0], snapshot
+
+    def curve_fingerprint(self, currency, observation_date):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fingerprint FROM curves WHERE currency = ? AND observation_date = ?",
+                (currency, str(to_day(observation_date))),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def lookup(self, bond, yield_curve_store, observation_date, interpolation="linear"):
+        """
+        Snapshot of a bond row on a date, or None when there is none or it is stale: other
+        interpolation, or a curve or bond terms that changed since the file was built.
+        """
+        if interpolation != self.interpolation:
+            return None
+        day = str(to_day(observation_date))
+        currency = bond["Nominal Value Currency"]
+        if (currency, to_day(day)) not in yield_curve_store:
+            return None
+        if self.curve_fingerprint(currency, day) != yield_curve_store.fingerprint(currency, day):
+            METRICS.count("snapshots_stale")
+            return None
+        found = self._rows.get_or_create((bond["ISIN"], day), lambda: self._fetch(bond["ISIN"], day))
+        if found is None:
+            return None
+        terms, snapshot = found
+        if terms != terms_fingerprint(bond):
+            METRICS.count("snapshots_stale")
+            return None
+        METRICS.count("snapshots_served")
+        return snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Precompute end-of-day snapshots for the Trade pane.")
+    parser.add_argument("--bonds", default="bond_emissions.csv", help="bond inventory in bond_emissions.csv format (or converted .arrow)")
+    parser.add_argument("--curves", default="yieldCurves.csv", help="yield curves in yieldCurves.csv format (or converted .arrow)")
+    parser.add_argument("--output", default=DEFAULT_PATH, help="snapshot file")
+    parser.add_argument("--start", help="first curve date (defaults to the earliest)")
+    parser.add_argument("--end", help="last curve date (defaults to the latest)")
+    parser.add_argument("--interpolation", choices=INTERPOLATION_METHODS, default="linear", help="yield curve interpolation")
+    parser.add_argument("--chunk-size", type=int, default=2000, help="bonds valued together")
+    parser.add_argument("--log-level", help="logging level (defaults to $TREASURY_LOG_LEVEL or WARNING)")
+    args = parser.parse_args(argv)
+    configure_logging(args.log_level)
+
+    started = time.perf_counter()
+    bonds_df = storage.read_bond_emissions(args.bonds)
+    curves_df = storage.read_yield_curves(args.curves, start=args.start, end=args.end)
+    written, floating, rejected = build(bonds_df, curves_df, args.output, interpolation=args.interpolation, chunk_size=args.chunk_size)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Wrote {written} snapshots to {args.output} ({os.path.getsize(args.output) / 1e6:.1f} MB) in {elapsed:.2f}s"
+    )
+    if floating:
+        print(f"Left out {floating} floating rate note(s), which the Trade pane values live")
+    if rejected:
+        print(f"Left out {rejected} bond(s) with invalid reference data")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+import logging
+
+import numpy as np
+import scipy.optimize as opt
+from instrumentation import METRICS, timed_stage
+
+logger = logging.getLogger(__name__)
+
+
+# Bracket for the per-period discount rate used when Newton does not converge
+BRACKET = (-0.99, 10.0)
+
+
+class YieldSolution:
+    """
+    Yield to maturity and yield based risk figures of one or many bonds.
+
+    All attributes are arrays with one entry per bond: ytm in % per annum (as returned
+    by FixedBond.yield_to_maturity), durations in years and convexity in years squared.
+    """
+
+    def __init__(self, ytm, macaulay_duration, modified_duration, convexity, iterations, converged):
+        self.ytm = ytm
+        self.macaulay_duration = macaulay_duration
+        self.modified_duration = modified_duration
+        self.convexity = convexity
+        self.iterations = iterations
+        self.converged = converged
+
+
+class SpreadSolution:
+    """
+    Z-spreads of one or many bonds: z_spread in % per annum (the units of a parallel curve
+    shift), with the iteration count and convergence flag of each bond.
+    """
+
+    def __init__(self, z_spread, iterations, converged):
+        self.z_spread = z_spread
+        self.iterations = iterations
+        self.converged = converged
+
+
+def _price_and_derivative(rate, cash_flows, periods):
+    """Price at a per-period rate and its analytic derivative d(price)/d(rate)."""
+    discounted = cash_flows * (1 + rate[:, None]) ** -periods
+    price = discounted.sum(axis=1)
+    derivative = -(periods * discounted).sum(axis=1) / (1 + rate)
+    return price, derivative
+
+
+def _bracketed_rate(cash_flows, periods, target_price):
+    """Brent's method fallback for a single bond; NaN when the bracket holds no root."""
+    def price_error(rate):
+        return np.sum(cash_flows * (1 + rate) ** -periods) - target_price
+
+    try:
+        return opt.brentq(price_error, *BRACKET, xtol=1e-14)
+    except ValueError:
+        return np.nan
+
+
+@timed_stage("ytm_solve")
+def solve_yields(cash_flows, days_from_trade_date, prices, periods_per_year=1, shift=0, tol=1e-12, max_iter=50):
+    """
+    Solve the yield to maturity of many bonds in lockstep.
+
+    cash_flows and days_from_trade_date are (bond x payment) arrays, padded with zero
+    cash flows; prices has one target price per bond. Yields compound periods_per_year
+    times a year over a 360 day year, and shift (in %) is added to the per-period rate,
+    matching FixedBond.yield_to_maturity. Newton's method uses the analytic price
+    derivative; bonds that do not converge fall back to Brent's method.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    days = np.atleast_2d(np.asarray(days_from_trade_date, dtype=float))
+    prices = np.atleast_1d(np.asarray(prices, dtype=float))
+    periods_per_year = np.broadcast_to(np.asarray(periods_per_year, dtype=float), prices.shape)
+    periods = days * periods_per_year[:, None] / 360
+
+    # Start from the rate that grows the price into the undiscounted cash flows over their mean life
+    total = cash_flows.sum(axis=1)
+    mean_life = np.where(total != 0, (periods * cash_flows).sum(axis=1) / np.where(total != 0, total, 1), 1)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        rate = (total / prices) ** (1 / np.maximum(mean_life, 1e-6)) - 1
+    rate = np.where(np.isfinite(rate), np.clip(rate, BRACKET[0], BRACKET[1]), 0.05)
+
+    iterations = np.zeros(len(prices), dtype=np.int64)
+    converged = np.zeros(len(prices), dtype=bool)
+    active = np.arange(len(prices))
+    for _ in range(max_iter):
+        price, derivative = _price_and_derivative(rate[active], cash_flows[active], periods[active])
+        error = price - prices[active]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = error / derivative
+        new_rate = rate[active] - step
+        usable = np.isfinite(new_rate) & (new_rate > -1)
+        rate[active] = np.where(usable, new_rate, rate[active])
+        iterations[active] += 1
+
+        done = usable & ((np.abs(step) < tol) | (np.abs(error) <= tol * np.abs(prices[active])))
+        converged[active[done]] = True
+        active = active[~done & usable]
+        if len(active) == 0:
+            break
+
+    # Bracketed fallback for the bonds Newton did not settle
+    fallbacks = np.flatnonzero(~converged)
+    for i in fallbacks:
+        rate[i] = _bracketed_rate(cash_flows[i], periods[i], prices[i])
+        converged[i] = np.isfinite(rate[i])
+
+    METRICS.count("ytm_bonds_solved", len(prices))
+    METRICS.count("ytm_newton_iterations", iterations.sum())
+    METRICS.count("ytm_brent_fallbacks", len(fallbacks))
+    METRICS.count("ytm_not_converged", (~converged).sum())
+    logger.debug(
+        "Solved %d yields: %d Newton iterations, %d Brent fallbacks, %d not converged",
+        len(prices), iterations.sum(), len(fallbacks), (~converged).sum(),
+    )
+
+    ytm = (rate * 100 - shift) * periods_per_year
+
+    # Risk figures at the yield itself (without the shift), as in FixedBond.macauley_duration
+    period_rate = ytm / periods_per_year / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discounted = cash_flows * (1 + period_rate[:, None]) ** -periods
+        value = discounted.sum(axis=1)
+        macaulay = (periods * discounted).sum(axis=1) / value / periods_per_year
+        convexity = (
+            (periods * (periods + 1) * discounted).sum(axis=1)
+            / value / (1 + period_rate) ** 2 / periods_per_year ** 2
+        )
+    modified = macaulay / (1 + period_rate)
+
+    return YieldSolution(ytm, macaulay, modified, convexity, iterations, converged)
+
+
+def _spread_price_and_derivative(spread, cash_flows, time_to_payment, rates):
+    """Price at a spread over the curve and its analytic derivative d(price)/d(spread)."""
+    base = 1 + rates + spread[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # Padding entries carry no cash flow and may have any time or rate
+        discounted = np.where(cash_flows != 0, cash_flows * base ** -time_to_payment, 0.0)
+        derivative = np.where(cash_flows != 0, -time_to_payment * discounted / base, 0.0)
+    return discounted.sum(axis=1), derivative.sum(axis=1)
+
+
+def _bracketed_spread(cash_flows, time_to_payment, rates, target_price, lower):
+    """Brent's method fallback for a single bond; NaN when the bracket holds no root."""
+    paid = cash_flows != 0
+
+    def price_error(spread):
+        return np.sum(cash_flows[paid] * (1 + rates[paid] + spread) ** -time_to_payment[paid]) - target_price
+
+    try:
+        return opt.brentq(price_error, lower, BRACKET[1], xtol=1e-14)
+    except ValueError:
+        return np.nan
+
+
+@timed_stage("z_spread_solve")
+def solve_spreads(cash_flows, time_to_payment, rates, prices, tol=1e-12, max_iter=50):
+    """
+    Solve the Z-spread of many bonds in lockstep.
+
+    The Z-spread is the constant spread s added to every zero rate, as a shift is in
+    FixedBond.npv, for which sum(cash_flows / (1 + rates + s / 100) ** time_to_payment)
+    equals the price. cash_flows, time_to_payment and rates are (bond x payment) arrays
+    padded with zero cash flows; they are computed once by the caller and only the spread
+    is iterated. Newton's method uses the analytic derivative; bonds that do not converge
+    fall back to Brent's method. Bonds with cash flows paid today only have no Z-spread (NaN).
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    time_to_payment = np.atleast_2d(np.asarray(time_to_payment, dtype=float))
+    rates = np.atleast_2d(np.asarray(rates, dtype=float))
+    prices = np.atleast_1d(np.asarray(prices, dtype=float))
+
+    # 1 + rate + spread must stay positive on every paid cash flow
+    lower = -np.where(cash_flows != 0, 1 + rates, np.inf).min(axis=1, initial=np.inf) + 1e-9
+    # A bond whose only cash flows are paid today has the same price at every spread
+    determined = ((cash_flows != 0) & (time_to_payment > 0)).any(axis=1)
+    spread = np.where(determined, 0.0, np.nan)
+    iterations = np.zeros(len(prices), dtype=np.int64)
+    converged = np.zeros(len(prices), dtype=bool)
+    active = np.flatnonzero(determined)
+    for _ in range(max_iter):
+        price, derivative = _spread_price_and_derivative(
+            spread[active], cash_flows[active], time_to_payment[active], rates[active]
+        )
+        error = price - prices[active]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = error / derivative
+        new_spread = spread[active] - step
+        usable = np.isfinite(new_spread) & (new_spread > lower[active])
+        spread[active] = np.where(usable, new_spread, spread[active])
+        iterations[active] += 1
+
+        done = usable & ((np.abs(step) < tol) | (np.abs(error) <= tol * np.abs(prices[active])))
+        converged[active[done]] = True
+        active = active[~done & usable]
+        if len(active) == 0:
+            break
+
+    # Bracketed fallback for the bonds Newton did not settle
+    fallbacks = np.flatnonzero(~converged & determined)
+    for i in fallbacks:
+        spread[i] = _bracketed_spread(cash_flows[i], time_to_payment[i], rates[i], prices[i], lower[i])
+        converged[i] = np.isfinite(spread[i])
+
+    METRICS.count("z_spread_bonds_solved", len(prices))
+    METRICS.count("z_spread_newton_iterations", iterations.sum())
+    METRICS.count("z_spread_brent_fallbacks", len(fallbacks))
+    METRICS.count("z_spread_not_converged", (~converged).sum())
+    logger.debug(
+        "Solved %d Z-spreads: %d Newton iterations, %d Brent fallbacks, %d not converged",
+        len(prices), iterations.sum(), len(fallbacks), (~converged).sum(),
+    )
+    return SpreadSolution(spread * 100, iterations, converged)
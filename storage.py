@@ -0,0 +1,222 @@
+"""
+Columnar storage backend for yield curves and bond reference data.
+
+The CSV files are converted once into uncompressed Arrow IPC files, sorted so that
+currency and observation date filters become binary searches over the memory mapped
+columns. Memory mapped files are shared through the OS page cache, so several Streamlit
+sessions (or batch workers) reading the same file do not each hold a private copy.
+
+Convert the CSV files with:
+    python storage.py convert --curves yieldCurves.csv --bonds bond_emissions.csv
+
+pyarrow is optional; without it everything keeps working from the CSV files.
+"""
+import argparse
+import os
+
+import pandas as pd
+import numpy as np
+from curves import YieldCurveStore
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+
+COLUMNAR_SUFFIX = ".arrow"
+BOND_DATE_COLUMNS = ("Issue Date", "Maturity Date", "Principal Payment Start Date", "Coupon Start Date")
+
+
+def available():
+    return pa is not None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The columnar storage backend needs pyarrow: pip install pyarrow")
+
+
+def columnar_path(csv_path):
+    """Path of the converted file that belongs to a CSV file."""
+    return os.path.splitext(csv_path)[0] + COLUMNAR_SUFFIX
+
+
+def _write_ipc(table, path):
+    # One record batch keeps every column contiguous in the mapped file
+    table = table.combine_chunks()
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=max(table.num_rows, 1))
+
+
+def _read_ipc(path):
+    """Zero-copy Table over a memory mapped IPC file."""
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def convert_yield_curves(csv_path, arrow_path=None):
+    """Convert a yieldCurves.csv file, sorted by currency, observation date and tenor."""
+    _require_pyarrow()
+    arrow_path = arrow_path or columnar_path(csv_path)
+    curves = pd.read_csv(csv_path)
+    curves["observation_date"] = pd.to_datetime(curves["observation_date"]).dt.date
+    curves = curves.sort_values(["currency", "observation_date", "tenor"], ignore_index=True)
+
+    table = pa.table({
+        # Dictionary codes follow the sort order, so they can be binary searched
+        "currency": pa.array(curves["currency"], pa.string()).dictionary_encode(),
+        "observation_date": pa.array(curves["observation_date"], pa.date32()),
+        "tenor": pa.array(curves["tenor"], pa.float64()),
+        "rate": pa.array(curves["rate"], pa.float64()),
+    })
+    _write_ipc(table, arrow_path)
+    return arrow_path
+
+
+def convert_bond_emissions(csv_path, arrow_path=None):
+    """Convert a bond_emissions.csv file, with typed date columns."""
+    _require_pyarrow()
+    arrow_path = arrow_path or columnar_path(csv_path)
+    bonds = pd.read_csv(csv_path)
+    for column in BOND_DATE_COLUMNS:
+        if column in bonds.columns:
+            bonds[column] = pd.to_datetime(bonds[column])
+    _write_ipc(pa.Table.from_pandas(bonds, preserve_index=False), arrow_path)
+    return arrow_path
+
+
+class CurveFile:
+    """Memory mapped yield curve file with currency and observation date pushdown."""
+
+    def __init__(self, path):
+        _require_pyarrow()
+        self.path = path
+        self.table = _read_ipc(path)
+        currency = self.table.column("currency").combine_chunks()
+        self.currency_names = currency.dictionary.to_pylist()
+        self._currency_codes = currency.indices.to_numpy()
+        self._days = self.table.column("observation_date").combine_chunks().cast(pa.int32()).to_numpy()
+
+    def _row_ranges(self, currency=None, start=None, end=None):
+        """(first, last + 1) row ranges matching the filters, one per currency."""
+        if currency is None:
+            currencies = self.currency_names
+        elif currency in self.currency_names:
+            currencies = [currency]
+        else:
+            currencies = []
+
+        ranges = []
+        for name in currencies:
+            code = self.currency_names.index(name)
+            first = np.searchsorted(self._currency_codes, code, side="left")
+            last = np.searchsorted(self._currency_codes, code, side="right")
+            # Dates are sorted within a currency
+            days = self._days[first:last]
+            lower = np.searchsorted(days, _epoch_day(start), side="left") if start is not None else 0
+            upper = np.searchsorted(days, _epoch_day(end), side="right") if end is not None else len(days)
+            if upper > lower:
+                ranges.append((int(first + lower), int(first + upper)))
+        return ranges
+
+    def read(self, currency=None, start=None, end=None):
+        """Curves as a DataFrame in the yieldCurves.csv layout; only matching rows are materialised."""
+        ranges = self._row_ranges(currency, start, end)
+        if not ranges:
+            return self.table.slice(0, 0).to_pandas(date_as_object=False).astype({"currency": str})
+        table = pa.concat_tables([self.table.slice(first, last - first) for first, last in ranges])
+        frame = table.to_pandas(date_as_object=False)
+        frame["currency"] = frame["currency"].astype(str)
+        return frame
+
+    def store(self, currency=None, start=None, end=None, version=None):
+        """
+        YieldCurveStore over the matching curves.
+
+        With no date filter (or a single currency) the tenor and rate arrays are views of
+        the mapped file; otherwise only the matching rows are copied.
+        """
+        tenors = self.table.column("tenor").chunk(0).to_numpy()
+        rates = self.table.column("rate").chunk(0).to_numpy()
+        ranges = self._row_ranges(currency, start, end)
+        if start is None and end is None and ranges:
+            # Whole currencies are adjacent in the file, so one slice covers them all
+            ranges = [(ranges[0][0], ranges[-1][1])]
+        if len(ranges) == 1:
+            rows = slice(*ranges[0])
+        else:
+            rows = np.concatenate([np.arange(first, last) for first, last in ranges] or [np.arange(0)])
+        return YieldCurveStore.from_sorted(
+            self._currency_codes[rows],
+            self._days[rows].astype("datetime64[D]"),
+            tenors[rows],
+            rates[rows],
+            currency_names=self.currency_names,
+            version=version,
+        )
+
+
+class BondFile:
+    """Memory mapped bond reference data with currency and ISIN pushdown."""
+
+    def __init__(self, path):
+        _require_pyarrow()
+        self.path = path
+        self.table = _read_ipc(path)
+
+    def read(self, currency=None, isins=None):
+        """Bonds as a DataFrame in the bond_emissions.csv layout; only matching rows are materialised."""
+        table = self.table
+        if currency is not None:
+            table = table.filter(pc.equal(table["Nominal Value Currency"], currency))
+        if isins is not None:
+            table = table.filter(pc.is_in(table["ISIN"], value_set=pa.array(list(isins), pa.string())))
+        return table.to_pandas(date_as_object=False)
+
+
+def _epoch_day(date):
+    return np.datetime64(pd.Timestamp(date).date(), "D").astype(np.int64)
+
+
+def read_yield_curves(path, currency=None, start=None, end=None):
+    """Yield curves from a CSV or converted file; filters are pushed down for converted files."""
+    if path.endswith(COLUMNAR_SUFFIX):
+        return CurveFile(path).read(currency, start, end)
+    curves = pd.read_csv(path)
+    dates = pd.to_datetime(curves["observation_date"])
+    keep = np.ones(len(curves), dtype=bool)
+    if currency is not None:
+        keep &= curves["currency"] == currency
+    if start is not None:
+        keep &= dates >= pd.Timestamp(start)
+    if end is not None:
+        keep &= dates <= pd.Timestamp(end)
+    return curves[keep]
+
+
+def read_bond_emissions(path, currency=None):
+    """Bond reference data from a CSV or converted file."""
+    if path.endswith(COLUMNAR_SUFFIX):
+        return BondFile(path).read(currency)
+    bonds = pd.read_csv(path)
+    if currency is not None:
+        bonds = bonds[bonds["Nominal Value Currency"] == currency]
+    return bonds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Columnar storage for yield curves and bond reference data.")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    convert = subcommands.add_parser("convert", help="convert CSV files to memory mappable Arrow files")
+    convert.add_argument("--curves", default="yieldCurves.csv", help="yield curve CSV file")
+    convert.add_argument("--bonds", default="bond_emissions.csv", help="bond emissions CSV file")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        print(f"Wrote {convert_yield_curves(args.curves)}")
+        print(f"Wrote {convert_bond_emissions(args.bonds)}")
+
+
+if __name__ == "__main__":
+    main()
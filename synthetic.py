@@ -0,0 +1,127 @@
+"""
+Synthetic bond universes and curve histories for benchmarks and load testing.
+
+The frames use the bond_emissions.csv and yieldCurves.csv layouts, so they can be written
+next to each other and loaded by the app or batch_valuation.py unchanged:
+    python synthetic.py --bonds 10000 --days 250 --output-dir synthetic
+"""
+import argparse
+import os
+
+import pandas as pd
+import numpy as np
+from calendars import BUSINESS_DAY_CONVENTIONS
+from daycount import DAY_COUNT_CONVENTIONS
+
+
+BOND_COLUMNS = [
+    "Issuer Code", "ISIN", "Issue Name", "Issuer Headquarters", "Jurisdiction", "Issue Date",
+    "Maturity Date", "Business Day Convention", "Notes", "Nominal Value (1 unit)",
+    "Nominal Value Currency", "Principal Payment Start Date", "Principal Payment Frequency",
+    "Coupon Start Date", "Coupon Frequency", "Reference Rate Code", "Fixing Lead Time (days)",
+    "First Coupon Rate [%]", "Fixed Rate/Spread [%]", "Day Count Convention",
+]
+# Tenors (in years) and base zero rates of the generated curves, per currency
+CURVE_TENORS = np.array([0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 7.0, 10.0, 15.0, 20.0, 30.0])
+BASE_RATES = {"EUR": 0.03, "CZK": 0.045}
+REFERENCE_RATES = {"EUR": "EURIBOR6M", "CZK": "PRIBOR6M"}
+HEADQUARTERS = {"Germany": "Munich", "Austria": "Vienna", "Slovakia": "Bratislava", "Czech Republic": "Prague"}
+CSV_DATE_FORMAT = "%m/%d/%Y"
+
+
+def synthetic_bonds(n_bonds, seed=0, floating_share=0.1, start="2010-01-01", end="2023-12-31"):
+    """
+    n_bonds random bonds in the bond_emissions.csv layout.
+
+    Issue dates fall between start and end, maturities one to thirty years later, and
+    frequencies, conventions, jurisdictions and currencies vary across the universe.
+    floating_share of the bonds carry a Reference Rate Code.
+    """
+    rng = np.random.default_rng(seed)
+    first_day = np.datetime64(start, "D")
+    issue = first_day + rng.integers(0, (np.datetime64(end, "D") - first_day).astype(int), n_bonds)
+    maturity = issue + rng.integers(365, 30 * 365, n_bonds)
+    currency = rng.choice(list(BASE_RATES), n_bonds, p=[0.7, 0.3])
+    floating = rng.random(n_bonds) < floating_share
+    jurisdiction = rng.choice(list(HEADQUARTERS), n_bonds)
+    issuer = rng.integers(0, max(n_bonds // 20, 1), n_bonds)
+    principal_frequency = rng.choice(["At Maturity", "Annual", "Semi-Annual", "Quarterly"], n_bonds, p=[0.7, 0.1, 0.1, 0.1])
+    reference = np.array([REFERENCE_RATES[c] for c in currency], dtype=object)
+
+    issue_text = pd.to_datetime(issue).strftime(CSV_DATE_FORMAT)
+    maturity_text = pd.to_datetime(maturity).strftime(CSV_DATE_FORMAT)
+    bonds = pd.DataFrame({
+        "Issuer Code": [f"ISS{code:05d}" for code in issuer],
+        "ISIN": [f"XS{index:010d}" for index in range(n_bonds)],
+        "Issue Name": [f"Synthetic {'Floater' if is_floating else 'Bond'} {index}" for index, is_floating in enumerate(floating)],
+        "Issuer Headquarters": [HEADQUARTERS[name] for name in jurisdiction],
+        "Jurisdiction": jurisdiction,
+        "Issue Date": issue_text,
+        "Maturity Date": maturity_text,
+        "Business Day Convention": rng.choice(BUSINESS_DAY_CONVENTIONS, n_bonds),
+        "Notes": "",
+        "Nominal Value (1 unit)": rng.choice([1000, 10000, 100000], n_bonds),
+        "Nominal Value Currency": currency,
+        "Principal Payment Start Date": np.where(principal_frequency == "At Maturity", maturity_text, issue_text),
+        "Principal Payment Frequency": principal_frequency,
+        "Coupon Start Date": issue_text,
+        "Coupon Frequency": rng.choice(["Annual", "Semi-Annual", "Quarterly"], n_bonds),
+        "Reference Rate Code": np.where(floating, reference, None),
+        "Fixing Lead Time (days)": np.where(floating, 2, 0),
+        "First Coupon Rate [%]": np.where(floating, rng.uniform(0.5, 6, n_bonds).round(3), np.nan),
+        # Coupon rate for fixed bonds, spread over the reference rate for floaters
+        "Fixed Rate/Spread [%]": np.where(floating, rng.uniform(0, 2, n_bonds), rng.uniform(0, 8, n_bonds)).round(3),
+        "Day Count Convention": rng.choice(DAY_COUNT_CONVENTIONS, n_bonds),
+    })
+    return bonds[BOND_COLUMNS]
+
+
+def synthetic_curves(n_days, seed=0, end="2023-12-31"):
+    """
+    n_days business days of curves per currency, ending at end, in the yieldCurves.csv layout.
+
+    Each curve is an upward sloping base curve moved by a random walk in level and slope.
+    """
+    rng = np.random.default_rng(seed)
+    last_day = np.busday_offset(np.datetime64(end, "D"), 0, roll="backward")
+    dates = np.busday_offset(last_day, np.arange(-n_days + 1, 1), roll="backward")
+    slope_shape = np.log1p(CURVE_TENORS) / np.log1p(CURVE_TENORS[-1])
+
+    frames = []
+    for currency, base_rate in BASE_RATES.items():
+        level = base_rate + np.cumsum(rng.normal(0, 0.0004, n_days))
+        slope = 0.01 + np.cumsum(rng.normal(0, 0.0002, n_days))
+        rates = level[:, None] + slope[:, None] * slope_shape[None, :]
+        frames.append(pd.DataFrame({
+            "currency": currency,
+            "observation_date": np.repeat(dates, len(CURVE_TENORS)).astype(str),
+            "tenor": np.tile(CURVE_TENORS, n_days),
+            "rate": np.maximum(rates, -0.01).ravel().round(6),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def write_dataset(output_dir, n_bonds, n_days, seed=0):
+    """Write bond_emissions.csv and yieldCurves.csv files into output_dir; returns their paths."""
+    os.makedirs(output_dir, exist_ok=True)
+    bonds_path = os.path.join(output_dir, "bond_emissions.csv")
+    curves_path = os.path.join(output_dir, "yieldCurves.csv")
+    synthetic_bonds(n_bonds, seed).to_csv(bonds_path, index=False)
+    synthetic_curves(n_days, seed).to_csv(curves_path, index=False)
+    return bonds_path, curves_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic bond universe and curve history.")
+    parser.add_argument("--bonds", type=int, default=10000, help="number of bonds")
+    parser.add_argument("--days", type=int, default=250, help="number of curve observation dates")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output-dir", default="synthetic", help="directory for the CSV files")
+    args = parser.parse_args(argv)
+
+    for path in write_dataset(args.output_dir, args.bonds, args.days, args.seed):
+        print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+
+import pandas as pd
+import numpy as np
+import pytest
+
+# The modules live flat at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bondtable import BondTable
+from curves import YieldCurveStore
+from synthetic import BOND_COLUMNS, synthetic_bonds, synthetic_curves
+from valuation import bond_class
+
+
+@pytest.fixture(scope="session")
+def curves_df():
+    return synthetic_curves(30, seed=1)
+
+
+@pytest.fixture(scope="session")
+def curve_store(curves_df):
+    return YieldCurveStore(curves_df)
+
+
+@pytest.fixture(scope="session")
+def trade_date(curve_store):
+    return curve_store.observation_dates()[-1]
+
+
+@pytest.fixture(scope="session")
+def fixed_bonds(trade_date):
+    """Fixed rate bonds of every convention, frequency and jurisdiction still alive at the trade date."""
+    bonds = BondTable.from_frame(synthetic_bonds(200, seed=2, floating_share=0))
+    return bonds.take(bonds["Maturity Date"] > trade_date)
+
+
+@pytest.fixture(scope="session")
+def fixed_records(fixed_bonds):
+    return [fixed_bonds.row(position) for position in range(len(fixed_bonds))]
+
+
+@pytest.fixture(scope="session")
+def make_bond(curve_store, trade_date):
+    """Build the FixedBond or FloatingBond of a BondRecord, as the trade form does."""
+    def make(record, number_of_pieces=1, date=trade_date, store=curve_store):
+        return bond_class(record)(
+            record, store, date, record["Nominal Value Currency"], record["Principal Payment Frequency"],
+            record["Coupon Frequency"], number_of_pieces,
+        )
+    return make
+
+
+def bond_row(**terms):
+    """One bond in the bond_emissions.csv layout; unspecified columns are missing."""
+    row = dict.fromkeys(BOND_COLUMNS)
+    row.update(terms)
+    return BondTable.from_frame(pd.DataFrame([row], columns=BOND_COLUMNS)).row(0)
+
+
+@pytest.fixture
+def end_of_month_floater():
+    """Semi-annual 30/360 floater issued on Dec 31, whose schedule closes with a zero length period."""
+    return bond_row(
+        **{
+            "Issuer Code": "ABC123",
+            "ISIN": "XS0000000001",
+            "Issue Name": "End of Month Floater",
+            "Jurisdiction": "Germany",
+            "Issue Date": "12/31/2023",
+            "Maturity Date": "12/31/2030",
+            "Business Day Convention": "Following",
+            "Nominal Value (1 unit)": 1000,
+            "Nominal Value Currency": "EUR",
+            "Principal Payment Frequency": "At Maturity",
+            "Coupon Frequency": "Semi-Annual",
+            "Reference Rate Code": "EURIBOR6M",
+            "Fixing Lead Time (days)": 2,
+            "First Coupon Rate [%]": np.nan,
+            "Fixed Rate/Spread [%]": 0.5,
+            "Day Count Convention": "30/360",
+        }
+    )
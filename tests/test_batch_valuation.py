@@ -0,0 +1,26 @@
+import pandas as pd
+
+import batch_valuation
+from synthetic import write_dataset
+
+
+def test_output_does_not_depend_on_worker_count(tmp_path):
+    bonds_path, curves_path = write_dataset(str(tmp_path / "data"), n_bonds=300, n_days=3, seed=4)
+    outputs = {}
+    for workers in (1, 2):
+        output = tmp_path / f"results_{workers}.csv"
+        cash_flows = tmp_path / f"cash_flows_{workers}.csv"
+        batch_valuation.run(
+            bonds_path, curves_path, str(output), cash_flows_output=str(cash_flows), start="2023-01-01",
+            workers=workers, chunk_size=64,
+        )
+        outputs[workers] = (output.read_bytes(), cash_flows.read_bytes())
+
+    assert outputs[1] == outputs[2]
+    results = pd.read_csv(tmp_path / "results_1.csv")
+    bonds = pd.read_csv(bonds_path)
+    floating = set(bonds.loc[bonds["Reference Rate Code"].notna(), "ISIN"])
+    # Floating rate notes are valued alongside the fixed rate bonds
+    assert floating & set(results["ISIN"])
+    assert results["NPV"].notna().all()
+    assert results["Valuation Date"].nunique() == 3
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from portfolio import BondPortfolio
+
+
+@pytest.fixture(scope="module")
+def portfolio(fixed_bonds, curve_store, trade_date):
+    return BondPortfolio(fixed_bonds, curve_store, trade_date, number_of_pieces=2)
+
+
+def test_npv_matches_fixed_bond(portfolio, fixed_records, make_bond):
+    expected = [make_bond(record, number_of_pieces=2).npv(0.3) for record in fixed_records]
+    np.testing.assert_allclose(portfolio.npv(0.3), expected, rtol=1e-12)
+
+
+def test_yield_analytics_match_fixed_bond(portfolio, fixed_records, make_bond):
+    prices = portfolio.npv() * 0.97
+    solution = portfolio.yield_analytics(prices)
+    for position, record in enumerate(fixed_records):
+        bond = make_bond(record, number_of_pieces=2)
+        assert solution.ytm[position] == pytest.approx(bond.yield_to_maturity(prices[position]), rel=1e-9)
+        assert solution.modified_duration[position] == pytest.approx(
+            bond.modified_duration(prices[position]), rel=1e-9
+        )
+
+
+def test_z_spread_round_trip(portfolio, fixed_records, make_bond):
+    prices = portfolio.npv() * 1.02
+    solution = portfolio.z_spreads(prices)
+    assert solution.converged.all()
+    # Discounting at the spread reproduces the prices, bond by bond
+    np.testing.assert_allclose(portfolio.npv(solution.z_spread[:, None]), prices, rtol=1e-9)
+
+    bond = make_bond(fixed_records[0], number_of_pieces=2)
+    z_spread = bond.z_spread(prices[0])
+    assert z_spread == pytest.approx(solution.z_spread[0], abs=1e-9)
+    assert bond.npv(z_spread) == pytest.approx(prices[0], rel=1e-9)
+
+
+def test_unpriced_bonds_get_no_z_spread(portfolio):
+    prices = portfolio.npv()
+    prices[::2] = np.nan
+    solution = portfolio.z_spreads(prices)
+    assert np.isnan(solution.z_spread[::2]).all()
+    np.testing.assert_allclose(solution.z_spread[1::2], 0.0, atol=1e-9)
@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+
+from pricing import accrued_interest, clean_to_dirty, dirty_to_clean
+
+
+def test_accrued_interest_matches_fixed_bond(fixed_bonds, fixed_records, make_bond, trade_date):
+    expected = [make_bond(record, number_of_pieces=3).accrued_interest() for record in fixed_records]
+    np.testing.assert_allclose(accrued_interest(fixed_bonds, trade_date, 3), expected, rtol=1e-12)
+
+
+def test_accrued_interest_per_bond_dates_match_single_dates(fixed_bonds, trade_date):
+    settlement_dates = trade_date - np.arange(len(fixed_bonds)) % 400
+    accrued = accrued_interest(fixed_bonds, settlement_dates)
+    for position, settlement_date in enumerate(settlement_dates):
+        single = accrued_interest(fixed_bonds.take([position]), settlement_date)
+        assert accrued[position] == pytest.approx(single[0], rel=1e-12)
+
+
+def test_clean_and_dirty_prices_round_trip(fixed_bonds, trade_date):
+    clean_prices = np.linspace(90, 110, len(fixed_bonds))
+    accrued, dirty = clean_to_dirty(fixed_bonds, trade_date, clean_prices, number_of_pieces=2)
+    accrued_again, clean = dirty_to_clean(fixed_bonds, trade_date, dirty, number_of_pieces=2)
+    np.testing.assert_allclose(accrued_again, accrued)
+    np.testing.assert_allclose(clean, clean_prices, rtol=1e-12)
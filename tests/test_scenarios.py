@@ -0,0 +1,30 @@
+import numpy as np
+
+from bondtable import BondTable
+from portfolio import BondPortfolio
+from scenarios import npv_ladder
+from synthetic import synthetic_bonds
+
+SHIFTS = np.array([-2.0, -0.5, 0.0, 0.7, 3.0])
+
+
+def test_fixed_bond_ladder_matches_npv(fixed_records, make_bond):
+    bond = make_bond(fixed_records[0], number_of_pieces=4)
+    np.testing.assert_allclose(npv_ladder(bond, SHIFTS), [bond.npv(shift) for shift in SHIFTS], rtol=1e-12)
+
+
+def test_floating_bond_ladder_matches_npv(make_bond, trade_date):
+    floaters = BondTable.from_frame(synthetic_bonds(40, seed=5, floating_share=1))
+    floaters = floaters.take(floaters["Maturity Date"] > trade_date)
+    for position in range(min(len(floaters), 5)):
+        bond = make_bond(floaters.row(position), number_of_pieces=2)
+        # Coupons are projected again under every shift
+        np.testing.assert_allclose(npv_ladder(bond, SHIFTS), [bond.npv(shift) for shift in SHIFTS], rtol=1e-12)
+
+
+def test_portfolio_ladder_matches_npv(fixed_bonds, curve_store, trade_date):
+    portfolio = BondPortfolio(fixed_bonds, curve_store, trade_date)
+    ladder = npv_ladder(portfolio, SHIFTS)
+    assert ladder.shape == (len(fixed_bonds), len(SHIFTS))
+    for column, shift in enumerate(SHIFTS):
+        np.testing.assert_allclose(ladder[:, column], portfolio.npv(shift), rtol=1e-12)
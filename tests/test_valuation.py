@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from curves import YieldCurveStore
+from synthetic import synthetic_curves
+from valuation import FloatingBond, forward_rates
+
+
+@pytest.fixture(scope="module")
+def curve_history():
+    """Curves from before the floater's issue date to after its first coupon."""
+    return YieldCurveStore(synthetic_curves(200, seed=3, end="2024-09-30"))
+
+
+def test_forward_rates_of_zero_length_periods_are_zero():
+    rates = forward_rates(np.array([0.5, 1.0]), np.array([1.0, 1.0]), 0.03, 0.03, np.array([0.5, 0.0]))
+    assert rates[0] == pytest.approx(2 * (1.03 ** 0.5 - 1))
+    assert rates[1] == 0.0
+
+
+def test_end_of_month_floater_has_finite_values(end_of_month_floater, make_bond, curve_history):
+    bond = make_bond(end_of_month_floater, number_of_pieces=2, date="2024-09-30", store=curve_history)
+    assert isinstance(bond, FloatingBond)
+    schedule = bond.schedule()
+    # 12/30/2030 to the 12/31/2030 maturity is no time at all under 30/360
+    assert schedule.accrual_fraction[-1] == 0.0
+
+    coupon_rates, coupons = bond._projection()
+    assert np.isfinite(coupon_rates).all()
+    assert coupons[-1] == 0.0
+    npv = bond.npv()
+    assert np.isfinite(npv)
+
+    z_spread = bond.z_spread(npv * 0.99)
+    assert np.isfinite(z_spread) and z_spread > 0
+
+    dates, paid_coupons, principal = bond.paid_cash_flows("2025-09-30")
+    assert len(dates) == 2
+    assert np.isfinite(paid_coupons).all() and (paid_coupons > 0).all()
+    assert (principal == 0).all()
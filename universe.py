@@ -0,0 +1,110 @@
+import pandas as pd
+import numpy as np
+from bondtable import BondTable
+
+
+# Remaining life buckets (upper bound in years, label) for the maturity filter
+MATURITY_BUCKETS = [(1, "Up to 1Y"), (3, "1Y-3Y"), (5, "3Y-5Y"), (10, "5Y-10Y"), (np.inf, "Over 10Y")]
+MATURED = "Matured"
+PAGE_SIZE = 50
+
+
+class BondUniverse:
+    """
+    Searchable index over the bond reference data.
+
+    Built once per bond file: an ISIN hash index for O(1) selection, an ISIN-sorted array
+    for prefix search, lower-cased name and issuer columns for substring search, and
+    precomputed currency, issuer, maturity bucket and rate type columns for filtering.
+    as_of is the date the remaining life of the maturity buckets is measured from. The
+    reference data itself is held as a BondTable; bond() returns BondRecord rows. Rows
+    with invalid reference data are left out and listed in rejected ({ISIN: problem}).
+    """
+
+    def __init__(self, bonds_df, as_of=None):
+        self.bonds, self.rejected = BondTable.of(bonds_df).valid()
+        self.isin = pd.Series(self.bonds["ISIN"], dtype=object).astype(str).to_numpy()
+        self._positions = {isin: position for position, isin in enumerate(self.isin)}
+
+        # Prefix search on ISIN is a binary search over the sorted codes
+        self._isin_order = np.argsort(self.isin, kind="stable")
+        self._sorted_isin = self.isin[self._isin_order]
+
+        names = pd.Series(self.bonds["Issue Name"], dtype=object).astype(str)
+        issuers = pd.Series(self.bonds["Issuer Code"], dtype=object).astype(str)
+        headquarters = pd.Series(self.bonds["Issuer Headquarters"], dtype=object).fillna("").astype(str)
+        self._names = names.str.lower()
+        self._issuers = (issuers + " " + headquarters).str.lower()
+        self.currency = self.bonds["Nominal Value Currency"].astype(str).astype(object)
+        self.issuer = issuers.to_numpy()
+        self.rate_type = np.where(pd.isna(self.bonds["Reference Rate Code"]), "Fixed", "Floating")
+        self.labels = (names + " (" + self.isin + ")").to_numpy()
+
+        as_of = np.datetime64(pd.Timestamp.today().normalize() if as_of is None else pd.Timestamp(as_of), "D")
+        years_left = (self.bonds["Maturity Date"] - as_of).astype(float) / 365.25
+        bounds = np.array([bound for bound, _ in MATURITY_BUCKETS])
+        names = np.array([name for _, name in MATURITY_BUCKETS] + [MATURED], dtype=object)
+        self.maturity_bucket = np.where(
+            years_left < 0, MATURED, names[np.minimum(np.searchsorted(bounds, years_left), len(bounds) - 1)]
+        )
+
+    def __len__(self):
+        return len(self.isin)
+
+    def __contains__(self, isin):
+        return isin in self._positions
+
+    def position(self, isin):
+        """Row position of an ISIN; raises KeyError for an unknown ISIN."""
+        return self._positions[isin]
+
+    def bond(self, isin):
+        """Reference data row of an ISIN, as a BondRecord."""
+        return self.bonds.row(self.position(isin))
+
+    def label(self, isin):
+        return self.labels[self.position(isin)]
+
+    def currencies(self):
+        return sorted(set(self.currency))
+
+    def issuers(self):
+        return sorted(set(self.issuer))
+
+    def _isin_prefix(self, prefix):
+        lower = np.searchsorted(self._sorted_isin, prefix, side="left")
+        upper = np.searchsorted(self._sorted_isin, prefix + "\uffff", side="left")
+        mask = np.zeros(len(self), dtype=bool)
+        mask[self._isin_order[lower:upper]] = True
+        return mask
+
+    def search(self, query="", currency=None, issuer=None, maturity_bucket=None, rate_type=None):
+        """
+        Row positions of the bonds matching every given filter, in file order.
+
+        query matches an ISIN prefix (case insensitive) or a substring of the issue name
+        or the issuer code and headquarters.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if currency is not None:
+            mask &= self.currency == currency
+        if issuer is not None:
+            mask &= self.issuer == issuer
+        if maturity_bucket is not None:
+            mask &= self.maturity_bucket == maturity_bucket
+        if rate_type is not None:
+            mask &= self.rate_type == rate_type
+
+        query = query.strip()
+        if query:
+            text = query.lower()
+            matches = self._isin_prefix(query.upper())
+            matches |= self._names.str.contains(text, regex=False).to_numpy()
+            matches |= self._issuers.str.contains(text, regex=False).to_numpy()
+            mask &= matches
+        return np.flatnonzero(mask)
+
+    def page(self, positions, page_number, page_size=PAGE_SIZE):
+        """ISINs on one page (numbered from 1) of search results."""
+        start = (page_number - 1) * page_size
+        return self.isin[positions[start:start + page_size]]
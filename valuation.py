@@ -1,312 +1,336 @@
 import pandas as pd
-from datetime import datetime
 import numpy as np
-import scipy.optimize as opt
+import logging
+from curves import YieldCurveStore, to_day
+from solver import solve_spreads, solve_yields
+from calendars import adjust_dates, business_day_calendar
+from instrumentation import METRICS
+from daycount import validate
+from schedules import ScheduleTerms, bond_schedule, build_payment_dates, day_counts, to_day_array
+from pricing import accrual_ratio
+
+logger = logging.getLogger(__name__)
 
 
 class FixedBond:
-    def __init__(self, bond_data, yield_curves_df, trade_date, currency_code, principal_payment_frequency="At Maturity", coupon_frequency="Annual", number_of_pieces=1):
+    def __init__(self, bond_data, yield_curves_df, trade_date, currency_code, principal_payment_frequency="At Maturity", coupon_frequency="Annual", number_of_pieces=1, interpolation="linear"):
         self.issue_name = bond_data["Issue Name"]
         self.isin = bond_data["ISIN"]
         #emission = pd.read_csv("bond_emissions.csv")
         #emission = emission[emission.ISIN == self.isin]
-        self.maturity_date = pd.to_datetime(bond_data["Maturity Date"])
+        # datetime64[D]; BondRecord dates already are, so rows of a BondTable skip pandas parsing
+        self.maturity_date = to_day(bond_data["Maturity Date"])
         self.nominal_value = bond_data["Nominal Value (1 unit)"]
         self.currency = bond_data["Nominal Value Currency"]
         self.coupon_rate = bond_data["Fixed Rate/Spread [%]"]
-        self.emission_date = pd.to_datetime(bond_data["Issue Date"])
-        self.yield_curve_df = yield_curves_df
-        self.trade_date = pd.to_datetime(trade_date)
+        self.emission_date = to_day(bond_data["Issue Date"])
+        # Accepts a YieldCurveStore (preferred when valuing many bonds) or the raw curves DataFrame
+        self.yield_curve_store = YieldCurveStore.of(yield_curves_df)
+        self.trade_date = to_day(trade_date)
         self.currency_code = currency_code
         self.principal_payment_frequency = principal_payment_frequency
         self.coupon_frequency = coupon_frequency
         self.business_day_convention = bond_data["Business Day Convention"]
         self.day_count_convention = bond_data["Day Count Convention"]  # Added Day Count Convention
+        # Holiday calendar used to roll payment dates (weekends only when missing)
+        jurisdiction = bond_data.get("Jurisdiction")
+        self.jurisdiction = jurisdiction if isinstance(jurisdiction, str) else None
         self.number_of_pieces = number_of_pieces
+        self.interpolation = interpolation  # see curves.INTERPOLATION_METHODS
+        self.schedule_terms = ScheduleTerms(
+            self.emission_date,
+            self.maturity_date,
+            float(self.coupon_rate),
+            float(self.nominal_value),
+            coupon_frequency,
+            principal_payment_frequency,
+            self.business_day_convention,
+            self.day_count_convention,
+            self.jurisdiction,
+        )
+        self._yield_solution = None
 
 
     def apply_business_day_convention(self, date, convention="MODFOLLOWING"):
-        if convention == "MODFOLLOWING":
-            return pd.offsets.BusinessDay().rollforward(date)
-        elif convention == "MODPRECEDING":
-            return pd.offsets.BusinessDay().rollback(date)
-        elif convention == "Following":
-            return pd.offsets.BusinessDay().rollforward(date)
-        else:
-            raise ValueError(f"Unsupported convention: {convention}")
+        adjusted = adjust_dates(to_day_array([date]), convention, self.jurisdiction)
+        return pd.Timestamp(adjusted[0])
 
     def generate_dates(self, emission_date, maturity_date, convention="MODFOLLOWING"):
         """Generate a list of payment dates manually, including the maturity date."""
-        payment_dates = []
-        current_date = emission_date
-
-        while current_date < maturity_date:
-            # Generate the next unadjusted payment date based on coupon frequency
-            if self.coupon_frequency == "Annual":
-                next_payment_date = current_date.replace(year=current_date.year + 1)
-            elif self.coupon_frequency == "Semi-Annual":
-                next_payment_date = current_date + pd.DateOffset(months=6)
-            elif self.coupon_frequency == "Quarterly":
-                next_payment_date = current_date + pd.DateOffset(months=3)
-            else:
-                raise ValueError(f"Unsupported coupon frequency: {self.coupon_frequency}")
+        payment_dates, payment_count = build_payment_dates(
+            to_day_array([emission_date]),
+            to_day_array([maturity_date]),
+            np.array([self.coupon_frequency], dtype=object),
+            np.array([convention], dtype=object),
+            np.array([self.jurisdiction], dtype=object),
+        )
+        return [pd.Timestamp(date) for date in payment_dates[0, :payment_count[0]]]
 
-            # If the next payment date exceeds maturity, break the loop
-            if next_payment_date >= maturity_date:
-                break
 
-            # Apply the business day convention to adjust the payment date
-            adjusted_payment_date = self.apply_business_day_convention(next_payment_date, convention)
+    def calculate_days(self, start_date, end_date, convention="ACT/360"):
+        validate([convention])
+        return int(day_counts(to_day_array([start_date]), to_day_array([end_date]), convention)[0])
 
-            # Append the adjusted date to the list
-            payment_dates.append(adjusted_payment_date)
+    def schedule(self):
+        """Curve independent cash flows for one piece, shared through the schedule cache."""
+        return bond_schedule(self.isin, self.schedule_terms, self.trade_date)
 
-            # Move to the next period based on the **unadjusted date**
-            current_date = next_payment_date
-        payment_dates = [date for date in payment_dates if date <= maturity_date]
-        # Always add the maturity date (unaltered by business day convention)
-        if maturity_date not in payment_dates:
-            payment_dates.append(maturity_date)
+    def cash_flow_schedule(self, shift=0):
+        """Valued cash flows for one piece; fixed coupons do not depend on the curve or shift."""
+        return self.schedule()
 
-        return payment_dates
+    def discount_curve(self):
+        """Prebuilt curve of the currency and trade date, shared through the curve store."""
+        return self.yield_curve_store.discount_curve(self.currency_code, self.trade_date, self.interpolation)
 
+    def discounted_cash_flows(self, shift=0):
+        """Return the schedule, the interpolated rates and the discount factors of each cash flow."""
+        schedule = self.cash_flow_schedule(shift)
+        discount_curve = self.discount_curve()
 
-    def calculate_days(self, start_date, end_date, convention="ACT/360"):
-        start_date = pd.to_datetime(start_date)
-        end_date = pd.to_datetime(end_date)
-
-        if convention == "ACT/360":
-            return (end_date - start_date).days
-        
-        elif convention == "30/360":
-            # Adjust the start and end day if they are 31
-            start_day = 30 if start_date.day == 31 else start_date.day
-            end_day = 30 if end_date.day == 31 else end_date.day
-            
-            # Adjust the end month and year if needed
-            if end_day == 30 and start_date.month == 2 and start_date.year != end_date.year:
-                end_day = 30
-            
-            # Calculate difference in years, months, and days
-            year_diff = end_date.year - start_date.year
-            month_diff = end_date.month - start_date.month
-            day_diff = end_day - start_day
-
-            # Convert everything into 360-day year and 30-day month
-            days_30_360 = (year_diff * 360) + (month_diff * 30) + day_diff
-            return days_30_360
-        
-        elif convention == "ACT/365":
-            return (end_date - start_date).days
-        
-        else:
-            raise ValueError(f"Unsupported convention: {convention}")
+        with METRICS.timed("discounting"):
+            rate_interpolated = discount_curve.zero_rates(schedule.time_to_payment)
+            discount_factors = (1 + rate_interpolated + shift / 100) ** schedule.time_to_payment
+        return schedule, rate_interpolated, discount_factors
 
     def cash_flow(self, shift=0):
-        cash_flows = []
-        payment_dates = self.generate_dates(self.emission_date, self.maturity_date, convention=self.business_day_convention)
-        remaining_principal = self.number_of_pieces * self.nominal_value
-        days_from_trade_date = 0
-    
-        # Interpolate the entire yield curve for all tenors
-        yield_curve_data = self.yield_curve_df[["currency", "observation_date", "tenor", "rate"]]
-    
-        # Filter the relevant yield curve for the currency and trade date
-        relevant_curve = yield_curve_data[
-            (yield_curve_data["currency"] == self.currency_code) &
-            (pd.to_datetime(yield_curve_data["observation_date"]) == self.trade_date)
+        schedule, rate_interpolated, discount_factors = self.discounted_cash_flows(shift)
+
+        # Schedule amounts are per piece
+        coupon_payments = schedule.coupon * self.number_of_pieces
+        principal_repayments = schedule.principal * self.number_of_pieces
+        remaining_principal = schedule.remaining_principal * self.number_of_pieces
+
+        cash_flows = [
+            {
+                "Date": pd.Timestamp(schedule.payment_dates[i]),
+                "Coupon Payment": coupon_payments[i],
+                "Principal Repayment": principal_repayments[i],
+                "Length of Period": int(schedule.length_of_period[i]),
+                "Days from trade date": int(schedule.days_from_trade_date[i]),
+                "Remaining Principal": remaining_principal[i],
+                "Interpolated Rate": rate_interpolated[i] + shift/100,
+                "Discounted Interest": coupon_payments[i] / discount_factors[i],
+                "Discounted Principal": principal_repayments[i] / discount_factors[i]
+            }
+            for i in range(len(schedule))
         ]
-        
-        if relevant_curve.empty:
-            raise ValueError(f"No yield curve data available for the selected trade date and currency: {self.currency_code}")
-        
-        # Ensure the yield curve is sorted by tenor
-        relevant_curve = relevant_curve.sort_values(by="tenor")
-    
-        # Extract tenors and rates from the yield curve
-        tenors = relevant_curve["tenor"].values
-        rates = relevant_curve["rate"].values
-    
-        # Interpolate the yield curve using numpy (handling the full curve)
-        def interpolate_rate(length_in_years):
-            return np.interp(length_in_years, tenors, rates, left=rates[0], right=rates[-1])
-    
-        # Define how much principal to pay at each period based on frequency
-        def calculate_principal_payment(payment_date, first_payment_date, last_payment_date):
-            if self.principal_payment_frequency == "Annual":
-                return (self.number_of_pieces*self.nominal_value) / len(payment_dates)  # Equal payment each year
-            elif self.principal_payment_frequency == "Semi-Annual":
-                return (self.number_of_pieces*self.nominal_value) / (len(payment_dates))  # Equal semi-annual payment
-            elif self.principal_payment_frequency == "Quarterly":
-                return (self.number_of_pieces*self.nominal_value) / (len(payment_dates))  # Equal quarterly payment
-            elif self.principal_payment_frequency == "Monthly":
-                return (self.number_of_pieces*self.nominal_value) / (len(payment_dates))  # Equal monthly payment
-            else:
-                raise ValueError(f"Unsupported principal payment frequency: {self.principal_payment_frequency}")
-    
-        for i, date in enumerate(payment_dates):
-            # Skip cash flows before the trade date
-            if date < self.trade_date:
-                continue  # Skip this iteration if the payment date is before the trade date
-            
-            coupon_payment = 0
-            principal_repayment = 0
-    
-            if i == 0:
-                length_of_period = self.calculate_days(self.emission_date, date, convention=self.day_count_convention)
-            else:
-                length_of_period = self.calculate_days(payment_dates[i - 1], date, convention=self.day_count_convention)
-            
-            # Convert length_of_period from days to years based on the day count convention
-            if self.day_count_convention in ["ACT/360", "30/360"]:
-                length_in_years = length_of_period / 360
-            elif self.day_count_convention == "ACT/365":
-                length_in_years = length_of_period / 365
-            else:
-                raise ValueError(f"Unsupported day count convention: {self.day_count_convention}")
-            
-            # Calculate coupon payment based on day count convention
-            if self.day_count_convention in ["30/360", "ACT/360"]:
-                coupon_payment = remaining_principal * (self.coupon_rate / 100) * (length_of_period / 360)
-            else:
-                coupon_payment = remaining_principal * (self.coupon_rate / 100) * (length_of_period / 365)
-            
-            days_from_trade_date = self.calculate_days(self.trade_date, date, convention=self.day_count_convention)
-            
-            # Use the interpolate_rate function to get the interpolated rate for the current period
-            rate_interpolated = interpolate_rate(days_from_trade_date / 360)
     
-            # Calculate the discounted coupon payment and principal repayment
-            time_to_payment = days_from_trade_date / 360  # Time in years (since we've converted length_of_period to years)
-            
-            # Discount the coupon payment
-            coupon_discount = coupon_payment / (1 + (rate_interpolated ) + (shift/100)) ** time_to_payment
-            
-            # Calculate principal repayment
-            if self.principal_payment_frequency != "At Maturity" and (date != self.maturity_date):
-                # If it's not the maturity date, we amortize the principal
-                principal_repayment = calculate_principal_payment(date, payment_dates[0], payment_dates[-1])
-                remaining_principal -= principal_repayment
-            if date == self.maturity_date:
-                # At maturity, the entire remaining principal is repaid
-                principal_repayment = remaining_principal
-                remaining_principal = 0  # Principal is fully paid off at maturity
-            
-            # Discount the principal repayment
-            principal_discount = principal_repayment / (1 + (rate_interpolated ) + (shift/100)) ** time_to_payment
-    
-            # Append the cash flow details with new columns for Interpolated Rate and Discounted Payments
-            cash_flows.append({
-                "Date": date,
-                "Coupon Payment": coupon_payment,
-                "Principal Repayment": principal_repayment,
-                "Length of Period": length_of_period,
-                "Days from trade date": days_from_trade_date,
-                "Remaining Principal": remaining_principal,
-                "Interpolated Rate": rate_interpolated + shift/100,
-                "Discounted Interest": coupon_discount,
-                "Discounted Principal": principal_discount
-            })
-    
-        # Safely print all the cash flows after all have been added
-        for cash_flow in cash_flows:
-            print(cash_flow)
+        if logger.isEnabledFor(logging.DEBUG):
+            for cash_flow in cash_flows:
+                logger.debug("Cash flow of %s: %s", self.isin, cash_flow)
     
         return cash_flows
 
     def npv(self, shift = 0):
-        yield_curve = self.yield_curve_df[ 
-            (self.yield_curve_df["currency"] == self.currency_code) & 
-            (pd.to_datetime(self.yield_curve_df["observation_date"]) == self.trade_date)
-        ]
-        
-        if yield_curve.empty:
-            raise ValueError("No yield curve data available for the selected trade date and currency.")
+        schedule, _, discount_factors = self.discounted_cash_flows(shift)
+        return float(np.sum(schedule.total / discount_factors)) * self.number_of_pieces
+
+    def _periods_per_year(self):
+        # YTM and duration compound semi-annually for semi-annual coupons, annually otherwise
+        return 2 if self.coupon_frequency == "Semi-Annual" else 1
+
+    def yield_analytics(self, price, shift=0):
+        """YTM, durations and convexity from one solve; the last solution is reused."""
+        key = (price, shift)
+        if self._yield_solution is None or self._yield_solution[0] != key:
+            schedule = self.cash_flow_schedule(shift)
+            solution = solve_yields(
+                schedule.total * self.number_of_pieces,
+                schedule.days_from_trade_date,
+                price,
+                periods_per_year=self._periods_per_year(),
+                shift=shift,
+            )
+            if not solution.converged[0]:
+                logger.warning("YTM solve did not converge for %s at price %s", self.isin, price)
+                raise ValueError(f"Failed to converge to a YTM for the bond with price: {price}")
+            self._yield_solution = (key, solution)
+        return self._yield_solution[1]
+
+    def accrued_interest(self):
+        """Interest accrued on the running coupon period at the trade date, for the position."""
+        schedule = self.cash_flow_schedule()
+        if not len(schedule):
+            return 0.0
+        ratio = accrual_ratio(
+            schedule.accrual_start[0], self.trade_date, schedule.payment_dates[0],
+            np.array(self.day_count_convention, dtype=object),
+        )
+        return float(schedule.coupon[0] * ratio) * self.number_of_pieces
+
+    def z_spread(self, price):
+        """
+        Constant spread (in %) over the zero rates of the curve at which the cash flows are
+        worth price, i.e. the shift for which npv(shift) == price.
+        """
+        schedule = self.cash_flow_schedule()
+        rates = self.discount_curve().zero_rates(schedule.time_to_payment)
+        solution = solve_spreads(schedule.total * self.number_of_pieces, schedule.time_to_payment, rates, price)
+        if not solution.converged[0]:
+            raise ValueError(f"Failed to converge to a Z-spread for the bond with price: {price}")
+        return float(solution.z_spread[0])
 
-        cash_flows = self.cash_flow(shift)
-        npv = 0.0
-
-        for cf in cash_flows:
-            
-
-            coupon_discount = cf["Discounted Interest"]
-            principal_discount = cf["Discounted Principal"]
-            npv += coupon_discount + principal_discount
-        
-        return npv
     def macauley_duration(self, price, shift=0):
-        # Get the yield to maturity
-        ytm = self.yield_to_maturity(price, shift) / 100  # Convert YTM to a decimal
-
-        # Get the bond's cash flows
-        cash_flows = self.cash_flow(shift)
+        return float(self.yield_analytics(price, shift).macaulay_duration[0])
 
-        # Adjust YTM for semi-annual frequency if needed
-        if self.coupon_frequency == "Semi-Annual":
-            ytm /= 2  # Semi-annual yield
+    def modified_duration(self, price, shift=0):
+        return float(self.yield_analytics(price, shift).modified_duration[0])
 
-        # Compute Macaulay duration
-        weighted_sum = 0.0
-        total_cash_flow = 0.0
+    def convexity(self, price, shift=0):
+        return float(self.yield_analytics(price, shift).convexity[0])
 
-        for cf in cash_flows:
-            # Adjust time to payment based on frequency
-            if self.coupon_frequency == "Semi-Annual":
-                time_to_payment = cf["Days from trade date"] / 180  # Half-years
-            else:  # Default to annual
-                time_to_payment = cf["Days from trade date"] / 360  # Years
-
-            # Calculate discounted cash flows
-            discounted_cash_flow = (
-                cf["Coupon Payment"] + cf["Principal Repayment"]
-            ) / (1 + ytm) ** time_to_payment
+    def yield_to_maturity(self, price, shift=0):
+        return float(self.yield_analytics(price, shift).ytm[0])
+
+def forward_rates(start_times, end_times, start_rates, end_rates, accrual_fraction):
+    """
+    Simple forward rates over accrual periods implied by zero rates, with the (1 + r) ** t
+    compounding used for discounting. Broadcasts over leading scenario axes. Zero length
+    periods (the maturity stub of some end of month schedules) get a zero rate.
+    """
+    growth = (1 + end_rates) ** end_times / (1 + start_rates) ** start_times
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(accrual_fraction > 0, (growth - 1) / accrual_fraction, 0.0)
+
+
+def fixing_curve_dates(observation_dates, fixing_dates, fallback):
+    """Curve date of each fixing: the latest observation on or before it, else fallback."""
+    if not len(observation_dates):
+        return np.full(np.shape(fixing_dates), fallback)
+    positions = np.searchsorted(observation_dates, fixing_dates, side="right") - 1
+    return np.where(positions >= 0, observation_dates[np.maximum(positions, 0)], fallback)
+
+
+class FloatingBond(FixedBond):
+    """
+    Floating rate note paying the reference rate plus the spread in Fixed Rate/Spread [%].
+
+    Each period's rate is fixed Fixing Lead Time (days) business days before the period
+    starts. Periods fixed before the trade date use the curve observed on the fixing date
+    (the latest one before it when missing); later periods are projected as forwards from
+    the trade date curve, so they move with the shift. First Coupon Rate [%], when set, is
+    the all-in rate of the first period. All periods are projected in one array step on the
+    cached schedule and discount curve of the fixed rate path.
+    """
+
+    def __init__(self, bond_data, yield_curves_df, trade_date, currency_code, principal_payment_frequency="At Maturity", coupon_frequency="Annual", number_of_pieces=1, interpolation="linear"):
+        super().__init__(bond_data, yield_curves_df, trade_date, currency_code, principal_payment_frequency,
+                         coupon_frequency, number_of_pieces, interpolation)
+        self.reference_rate_code = bond_data.get("Reference Rate Code")
+        self.spread = float(self.coupon_rate)
+        fixing_lead_time = bond_data.get("Fixing Lead Time (days)")
+        self.fixing_lead_time = int(fixing_lead_time) if pd.notna(fixing_lead_time) else 0
+        first_coupon_rate = bond_data.get("First Coupon Rate [%]")
+        self.first_coupon_rate = float(first_coupon_rate) if pd.notna(first_coupon_rate) else None
+        self._fixings = None
+
+    def fixings(self):
+        """
+        Fixing dates, projection start times and set rates of the valued periods.
+
+        Start times are in years from the trade date (0 for periods already running) and
+        set rates are the all-in rates of periods fixed before the trade date (NaN for
+        projected periods). They do not depend on the shift, so they are computed once.
+        """
+        if self._fixings is None:
+            schedule = self.schedule()
+            trade_date = self.trade_date
+            fixing_dates = self._fixing_dates(schedule)
+            start_times = np.maximum(
+                day_counts(trade_date, schedule.accrual_start, self.day_count_convention), 0
+            ) / 360
+            set_rates = self._set_rates(schedule, fixing_dates, trade_date)
+            self._fixings = (fixing_dates, start_times, set_rates)
+        return self._fixings
+
+    def past_fixing_dates(self, until):
+        """Distinct fixing dates before until of the periods paid on or after the trade date."""
+        fixing_dates = self._fixing_dates(self.schedule())
+        return np.unique(fixing_dates[fixing_dates < np.datetime64(pd.Timestamp(until), "D")])
+
+    def paid_cash_flows(self, until):
+        """
+        Payment dates, coupons and principal for one piece of the periods paid from the
+        trade date up to (not including) until. Every such period was fixed before it was
+        paid, so its coupon is set from the curve of its fixing date.
+        """
+        until = np.datetime64(pd.Timestamp(until), "D")
+        schedule = self.schedule()
+        paid = schedule.payment_dates < until
+        rates = self._set_rates(schedule, self._fixing_dates(schedule), until)
+        coupons = (schedule.remaining_principal + schedule.principal) * schedule.accrual_fraction * rates
+        return schedule.payment_dates[paid], coupons[paid], schedule.principal[paid]
+
+    def _fixing_dates(self, schedule):
+        return np.busday_offset(
+            schedule.accrual_start, -self.fixing_lead_time, roll="preceding",
+            busdaycal=business_day_calendar(self.jurisdiction),
+        )
+
+    def _fixing_curve_dates(self, fixing_dates):
+        observation_dates = self.yield_curve_store.observation_dates(self.currency_code)
+        return fixing_curve_dates(observation_dates, fixing_dates, self.trade_date)
+
+    def _set_rates(self, schedule, fixing_dates, before):
+        """All-in rates of the periods fixed before `before`, NaN for the other periods."""
+        set_rates = np.full(len(schedule), np.nan)
+        past_fixings = np.unique(fixing_dates[fixing_dates < before])
+        for fixing_date, observed in zip(past_fixings, self._fixing_curve_dates(past_fixings)):
+            periods = fixing_dates == fixing_date
+            curve = self.yield_curve_store.discount_curve(self.currency_code, observed, self.interpolation)
+            # Times from the observation, or from the period start when the curve is later
+            starts = schedule.accrual_start[periods]
+            anchor = np.minimum(observed, starts)
+            times = day_counts(anchor, np.stack([starts, schedule.payment_dates[periods]]), self.day_count_convention) / 360
+            set_rates[periods] = forward_rates(
+                times[0], times[1], curve.zero_rates(times[0]), curve.zero_rates(times[1]),
+                schedule.accrual_fraction[periods],
+            ) + self.spread / 100
+        if self.first_coupon_rate is not None:
+            set_rates[schedule.accrual_start == self.emission_date] = self.first_coupon_rate / 100
+        return set_rates
+
+    def projected_coupons(self, start_rates, end_rates):
+        """
+        Coupon rates and per piece coupons of the valued periods for scenario zero rates at
+        the period starts and ends (shift included); leading axes are scenarios.
+        """
+        schedule = self.schedule()
+        _, start_times, set_rates = self.fixings()
+        forwards = forward_rates(start_times, schedule.time_to_payment, start_rates, end_rates, schedule.accrual_fraction)
+        rates = np.where(np.isnan(set_rates), forwards + self.spread / 100, set_rates)
+        principal_outstanding = schedule.remaining_principal + schedule.principal
+        return rates, principal_outstanding * schedule.accrual_fraction * rates
+
+    def _projection(self, shift=0):
+        schedule = self.schedule()
+        curve = self.discount_curve()
+        _, start_times, _ = self.fixings()
+        with METRICS.timed("forward_projection"):
+            return self.projected_coupons(
+                curve.zero_rates(start_times) + shift / 100, curve.zero_rates(schedule.time_to_payment) + shift / 100
+            )
+
+    def cash_flow_schedule(self, shift=0):
+        """Valued cash flows for one piece, with the coupons projected under shift."""
+        _, coupons = self._projection(shift)
+        return self.schedule().with_coupon(coupons)
 
-            # Accumulate weighted sum and total cash flow
-            weighted_sum += time_to_payment * discounted_cash_flow
-            total_cash_flow += discounted_cash_flow
+    def cash_flow(self, shift=0):
+        cash_flows = super().cash_flow(shift)
+        fixing_dates, _, _ = self.fixings()
+        coupon_rates, _ = self._projection(shift)
+        for cash_flow, fixing_date, coupon_rate in zip(cash_flows, fixing_dates, coupon_rates):
+            cash_flow["Fixing Date"] = pd.Timestamp(fixing_date)
+            cash_flow["Coupon Rate [%]"] = coupon_rate * 100
+        return cash_flows
 
-        # Calculate duration (weighted average time to cash flow)
-        duration = weighted_sum / total_cash_flow
 
-        # Adjust duration to annualized if semi-annual
-        if self.coupon_frequency == "Semi-Annual":
-            duration /= 2
+def bond_class(bond_data):
+    """FloatingBond for bonds with a Reference Rate Code, FixedBond otherwise."""
+    return FloatingBond if isinstance(bond_data.get("Reference Rate Code"), str) else FixedBond
 
-        return duration
-    def yield_to_maturity(self, price, shift=0):
-        def bond_price(rate, cash_flows, target_price):
-            """Calculate the price of the bond given a rate (YTM)."""
-            price = 0.0
-            for cf in cash_flows:
-                if self.coupon_frequency == "Semi-Annual":
-                    # Adjust time to payment and rate for semiannual convention
-                    time_to_payment = cf["Days from trade date"] / 180  # Half-years
-                    discount_rate = (rate/2 + shift) / 100  # Semiannual rate
-                else:
-                    # Default to annual convention
-                    time_to_payment = cf["Days from trade date"] / 360  # Years
-                    discount_rate = (rate + shift) / 100
-            
-                discounted_coupon = cf["Coupon Payment"] / (1 + discount_rate) ** time_to_payment
-                discounted_principal = cf["Principal Repayment"] / (1 + discount_rate) ** time_to_payment
-                price += discounted_coupon + discounted_principal
-
-            return price - target_price  # Return the difference from the target price
-
-        # Get the bond's cash flows
-        cash_flows = self.cash_flow(shift)
-        
-        # The target price should be passed here
-        target_price = price
-        
-        # Use scipy's Newton method to find the YTM (root of the bond price function)
-        try:
-            ytm = opt.newton(bond_price, x0=0.05, args=(cash_flows, target_price))
-        except RuntimeError:
-            raise ValueError(f"Failed to converge to a YTM for the bond with price: {target_price}")
-        
-        
-        return ytm
 
 """
 # Sample bond data for testing